@@ -66,6 +66,9 @@ raw_components = r'''
                 "default": 160},{
                 "name_template": "cloneCount",
                 "type": "number",
+                "default": 0},{
+                "name_template": "queueLength",
+                "type": "number",
                 "default": 0},],
         "property_sets": 2,
         "script": InputConveyor
@@ -0,0 +1,900 @@
+"""
+Headless Visual Components Stand-in Runtime
+==============================================================================
+
+In-process replacement for the parts of the Visual Components Python API that
+the component scripts in Simulation_Source_Script.py use (vcScript, vcMatrix,
+vcVector). The scripts run unchanged on a virtual clock that jumps straight to
+the next wake-up time, so simulated hours complete in seconds on a build host.
+
+Usage from Python:
+
+    runtime = HeadlessRuntime()
+    runtime.load_configuration()
+    runtime.start()
+    runtime.load_layout('MultiAgentSystem', robot_quantity=4)
+    runtime.run(duration=600)
+
+Usage from the command line (simulated seconds, robot quantity):
+
+    python HeadlessRuntime.py 600 4
+
+"""
+
+import sys
+import os
+import re
+import math
+import types
+import heapq
+import threading
+import traceback
+
+
+# Property and behaviour type constants exported by vcScript
+VC_STRING = 'String'
+VC_INTEGER = 'Integer'
+VC_REAL = 'Real'
+VC_BOOLEAN = 'Boolean'
+VC_VEHICLE = 'Vehicle'
+VC_PYTHONSCRIPT = 'PythonScript'
+
+# Component kinds recognised from the .vcmx file name passed to app.load()
+COMPONENT_KINDS = {
+    'Pathway Area': 'pathway',
+    'Idle Location': 'idle',
+    'Conveyor': 'conveyor',
+    'Block Geo': 'block',
+    'Mobile Robot Resource': 'robot',
+}
+
+# Geometry defaults for the stand-in components (millimetres)
+DEFAULT_AREA_LENGTH = 4000.0
+DEFAULT_AREA_WIDTH = 2000.0
+DEFAULT_CONVEYOR_LENGTH = 2000.0
+DEFAULT_CONVEYOR_WIDTH = 600.0
+DEFAULT_CONVEYOR_HEIGHT = 700.0
+
+# Kinematics integration step of the virtual clock (seconds)
+DEFAULT_TIME_STEP = 0.05
+
+# Layout payload files in MultiAgentSystem/ and the template property each one is written to
+LAYOUT_FILES = (
+    ('_Template_Pathway_Area', 'pathwayProperties', 'pathwayProperties.json'),
+    ('_Template_OutputConveyor', 'outputconveyorProperties', 'outputconveyorProperties.json'),
+    ('_Template_InputConveyor', 'inputconveyorProperties', 'inputconveyorProperties.json'),
+    ('_Template_IdleLocation', 'idleProperties', 'idleProperties.json'),
+)
+
+_local = threading.local()
+
+
+class HeadlessError(Exception):
+    """Raised when a script uses the stand-in API in an unsupported way"""
+
+
+class _Stopped(BaseException):
+    """Unwinds suspended OnRun tasks when the runtime shuts down"""
+
+
+# ---------------------------------------------------------------------------
+# vcVector / vcMatrix
+# ---------------------------------------------------------------------------
+
+class Vector(object):
+    """Stand-in for vcVector with X, Y and Z attributes"""
+    __slots__ = ('X', 'Y', 'Z')
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.X = float(x)
+        self.Y = float(y)
+        self.Z = float(z)
+
+    def __repr__(self):
+        return 'vcVector({0:.3f}, {1:.3f}, {2:.3f})'.format(self.X, self.Y, self.Z)
+
+    def __eq__(self, other):
+        return (isinstance(other, Vector) and
+                self.X == other.X and self.Y == other.Y and self.Z == other.Z)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+
+def new_vector(x=0.0, y=0.0, z=0.0):
+    return Vector(x, y, z)
+
+
+class Matrix(object):
+    """Stand-in for vcMatrix: a rigid transform stored as N, O, A axes and P"""
+
+    def __init__(self):
+        self._n = [1.0, 0.0, 0.0]
+        self._o = [0.0, 1.0, 0.0]
+        self._a = [0.0, 0.0, 1.0]
+        self._p = [0.0, 0.0, 0.0]
+
+    def copy(self):
+        m = Matrix()
+        m._n = list(self._n)
+        m._o = list(self._o)
+        m._a = list(self._a)
+        m._p = list(self._p)
+        return m
+
+    def _get(self, axis):
+        return Vector(*axis)
+
+    def _set(self, axis, value):
+        axis[0], axis[1], axis[2] = float(value.X), float(value.Y), float(value.Z)
+
+    N = property(lambda self: self._get(self._n), lambda self, v: self._set(self._n, v))
+    O = property(lambda self: self._get(self._o), lambda self, v: self._set(self._o, v))
+    A = property(lambda self: self._get(self._a), lambda self, v: self._set(self._a, v))
+    P = property(lambda self: self._get(self._p), lambda self, v: self._set(self._p, v))
+
+    def identity(self):
+        self.__init__()
+
+    def translateAbs(self, x, y, z):
+        self._p = [self._p[0] + x, self._p[1] + y, self._p[2] + z]
+
+    def translateRel(self, x, y, z):
+        for i in range(3):
+            self._p[i] += self._n[i] * x + self._o[i] * y + self._a[i] * z
+
+    def rotateAbsZ(self, degrees):
+        c = math.cos(math.radians(degrees))
+        s = math.sin(math.radians(degrees))
+        for axis in (self._n, self._o, self._a, self._p):
+            x, y = axis[0], axis[1]
+            axis[0] = c * x - s * y
+            axis[1] = s * x + c * y
+
+    def rotateRelZ(self, degrees):
+        c = math.cos(math.radians(degrees))
+        s = math.sin(math.radians(degrees))
+        n, o = list(self._n), list(self._o)
+        self._n = [c * n[i] + s * o[i] for i in range(3)]
+        self._o = [-s * n[i] + c * o[i] for i in range(3)]
+
+    def __repr__(self):
+        return 'vcMatrix(P={0}, N={1})'.format(self.P, self.N)
+
+
+def new_matrix(other=None):
+    return other.copy() if other is not None else Matrix()
+
+
+# ---------------------------------------------------------------------------
+# Properties, behaviours and components
+# ---------------------------------------------------------------------------
+
+def _coerce(prop_type, value):
+    if prop_type == VC_INTEGER:
+        return int(value)
+    if prop_type == VC_REAL:
+        return float(value)
+    if prop_type == VC_BOOLEAN:
+        return bool(value)
+    if prop_type == VC_STRING:
+        return '' if value is None else str(value)
+    return value
+
+
+class Property(object):
+    """Stand-in for vcProperty; assigning a new Value fires OnChanged"""
+
+    def __init__(self, runtime, prop_type, name, value=None, on_set=None):
+        self._runtime = runtime
+        self.Type = prop_type
+        self.Name = name
+        self.OnChanged = None
+        self.WritableWhenConnected = True
+        self.WritableWhenDisconnected = True
+        self.WritableWhenSimulating = True
+        self._on_set = on_set
+        self._value = _coerce(prop_type, value) if value is not None else _coerce(prop_type, {
+            VC_STRING: '', VC_INTEGER: 0, VC_REAL: 0.0, VC_BOOLEAN: False}.get(prop_type))
+
+    @property
+    def Value(self):
+        self._runtime.stats['property_reads'] += 1
+        return self._value
+
+    @Value.setter
+    def Value(self, value):
+        self._runtime.stats['property_writes'] += 1
+        self._assign(value, force=False)
+
+    def _assign(self, value, force):
+        value = _coerce(self.Type, value)
+        changed = value != self._value
+        self._value = value
+        if self._on_set:
+            self._on_set(value)
+        if (changed or force) and self.OnChanged:
+            self.OnChanged(self)
+
+
+class Behaviour(object):
+    def __init__(self, runtime, component, behaviour_type, name):
+        self._runtime = runtime
+        self.Component = component
+        self.Type = behaviour_type
+        self.Name = name
+        self._properties = {}
+
+    def getProperty(self, name):
+        return self._properties.get(name)
+
+    def _copy_to(self, component):
+        copy = type(self)(self._runtime, component, self.Type, self.Name)
+        for name, prop in self._properties.items():
+            copy._properties[name] = Property(self._runtime, prop.Type, name, prop._value)
+        return copy
+
+
+class PythonScript(Behaviour):
+    """Script behaviour; its Script property holds the source text"""
+
+    def __init__(self, runtime, component, behaviour_type, name):
+        Behaviour.__init__(self, runtime, component, behaviour_type, name)
+        self._properties['Script'] = Property(runtime, VC_STRING, 'Script', '')
+
+
+class Vehicle(Behaviour):
+    """Path-following vehicle with trapezoidal MaxSpeed/Acceleration kinematics"""
+
+    def __init__(self, runtime, component, behaviour_type, name):
+        Behaviour.__init__(self, runtime, component, behaviour_type, name)
+        self.Acceleration = 300.0
+        self.Deceleration = 300.0
+        self.MaxSpeed = 800.0
+        self.Interpolation = 0.15
+        self._points = []
+        self._speed = 0.0
+
+    def _copy_to(self, component):
+        copy = Behaviour._copy_to(self, component)
+        copy.Acceleration = self.Acceleration
+        copy.Deceleration = self.Deceleration
+        copy.MaxSpeed = self.MaxSpeed
+        copy.Interpolation = self.Interpolation
+        return copy
+
+    def clearMove(self):
+        self._points = []
+        self._speed = 0.0
+
+    def addControlPoint(self, point):
+        if not isinstance(point, Vector):
+            raise HeadlessError('addControlPoint expects a vcVector, got {0!r}'.format(point))
+        self._points.append((point.X, point.Y, point.Z))
+
+    @property
+    def Speed(self):
+        return self._speed
+
+    def _remaining_length(self):
+        p = self.Component._matrix._p
+        x, y, z = p[0], p[1], p[2]
+        total = 0.0
+        for px, py, pz in self._points:
+            total += math.sqrt((px - x) ** 2 + (py - y) ** 2 + (pz - z) ** 2)
+            x, y, z = px, py, pz
+        return total
+
+    @property
+    def TotalTime(self):
+        length = self._remaining_length()
+        v = float(self.MaxSpeed)
+        if length <= 0.0 or v <= 0.0:
+            return 0.0
+        a = max(float(self.Acceleration), 1e-6)
+        d = max(float(self.Deceleration), 1e-6)
+        ramp = v * v / (2.0 * a) + v * v / (2.0 * d)
+        if length >= ramp:
+            return (length - ramp) / v + v / a + v / d
+        peak = math.sqrt(2.0 * length * a * d / (a + d))
+        return peak / a + peak / d
+
+    def _step(self, dt):
+        if not self._points:
+            self._speed = 0.0
+            return
+        matrix = self.Component._matrix
+        pos = matrix._p
+        remaining = self._remaining_length()
+        max_speed = max(0.0, float(self.MaxSpeed))
+        stop_speed = math.sqrt(2.0 * max(float(self.Deceleration), 1e-6) * remaining)
+        desired = min(max_speed, stop_speed)
+        if self._speed < desired:
+            self._speed = min(desired, self._speed + float(self.Acceleration) * dt)
+        else:
+            self._speed = max(desired, self._speed - float(self.Deceleration) * dt)
+        travel = self._speed * dt
+        heading = None
+        while travel > 0.0 and self._points:
+            tx, ty, tz = self._points[0]
+            dx, dy, dz = tx - pos[0], ty - pos[1], tz - pos[2]
+            gap = math.sqrt(dx * dx + dy * dy + dz * dz)
+            if gap > 1e-9:
+                heading = (dx / gap, dy / gap)
+            if gap <= travel:
+                pos[0], pos[1], pos[2] = tx, ty, tz
+                self._points.pop(0)
+                travel -= gap
+            else:
+                pos[0] += dx / gap * travel
+                pos[1] += dy / gap * travel
+                pos[2] += dz / gap * travel
+                travel = 0.0
+        if remaining <= 1e-6:
+            self._points = []
+        if not self._points:
+            self._speed = 0.0
+        if heading:
+            matrix._n = [heading[0], heading[1], 0.0]
+            matrix._o = [-heading[1], heading[0], 0.0]
+            matrix._a = [0.0, 0.0, 1.0]
+
+
+_BEHAVIOUR_CLASSES = {VC_PYTHONSCRIPT: PythonScript, VC_VEHICLE: Vehicle}
+
+
+class Component(object):
+    """Stand-in for vcComponent; properties are also exposed as attributes"""
+
+    def __init__(self, runtime, kind, name):
+        object.__setattr__(self, '_runtime', runtime)
+        object.__setattr__(self, '_kind', kind)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_properties', {})
+        object.__setattr__(self, '_behaviours', [])
+        object.__setattr__(self, '_matrix', Matrix())
+        object.__setattr__(self, '_deleted', False)
+        object.__setattr__(self, 'Visible', True)
+        self._create_kind_properties()
+
+    # Geometry properties that the stand-in keeps in sync the way the
+    # Visual Components models derive Length1/2 and Width1/2 from the area.
+    def _create_kind_properties(self):
+        runtime = self._runtime
+        if self._kind == 'pathway':
+            for name in ('Length1', 'Length2', 'Width1', 'Width2'):
+                self._properties[name] = Property(runtime, VC_REAL, name, 0.0)
+            self._properties['AreaLength'] = Property(
+                runtime, VC_REAL, 'AreaLength', DEFAULT_AREA_LENGTH, on_set=self._sync_area)
+            self._properties['AreaWidth'] = Property(
+                runtime, VC_REAL, 'AreaWidth', DEFAULT_AREA_WIDTH, on_set=self._sync_area)
+            self._sync_area(None)
+        elif self._kind == 'conveyor':
+            self._properties['ConveyorLength'] = Property(runtime, VC_REAL, 'ConveyorLength', DEFAULT_CONVEYOR_LENGTH)
+            self._properties['ConveyorWidth'] = Property(runtime, VC_REAL, 'ConveyorWidth', DEFAULT_CONVEYOR_WIDTH)
+            self._properties['ConveyorHeight'] = Property(runtime, VC_REAL, 'ConveyorHeight', DEFAULT_CONVEYOR_HEIGHT)
+
+    def _sync_area(self, _value):
+        length = self._properties['AreaLength']._value
+        width = self._properties['AreaWidth']._value
+        self._properties['Length1']._value = length / 2.0
+        self._properties['Length2']._value = length / 2.0
+        self._properties['Width1']._value = width
+        self._properties['Width2']._value = width
+
+    # Attribute access mirrors the VC API: comp.Name, comp.AreaLength, ...
+    def __getattr__(self, name):
+        props = object.__getattribute__(self, '_properties')
+        if name in props:
+            return props[name].Value
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name in self._properties:
+            self._properties[name].Value = value
+        else:
+            object.__setattr__(self, name, value)
+
+    @property
+    def Name(self):
+        return self._name
+
+    @Name.setter
+    def Name(self, value):
+        self._runtime._rename(self, value)
+
+    @property
+    def PositionMatrix(self):
+        self._runtime.stats['matrix_reads'] += 1
+        return self._matrix.copy()
+
+    @PositionMatrix.setter
+    def PositionMatrix(self, matrix):
+        self._runtime.stats['matrix_writes'] += 1
+        object.__setattr__(self, '_matrix', matrix.copy())
+
+    WorldPositionMatrix = PositionMatrix
+
+    def getProperty(self, name):
+        self._runtime.stats['get_property'] += 1
+        return self._properties.get(name)
+
+    def createProperty(self, prop_type, name):
+        prop = Property(self._runtime, prop_type, name)
+        self._properties[name] = prop
+        return prop
+
+    @property
+    def Properties(self):
+        return list(self._properties.values())
+
+    def findBehaviour(self, name):
+        for behaviour in self._behaviours:
+            if behaviour.Name == name:
+                return behaviour
+        return None
+
+    def createBehaviour(self, behaviour_type, name):
+        cls = _BEHAVIOUR_CLASSES.get(behaviour_type, Behaviour)
+        behaviour = cls(self._runtime, self, behaviour_type, name)
+        self._behaviours.append(behaviour)
+        return behaviour
+
+    @property
+    def Behaviours(self):
+        return list(self._behaviours)
+
+    def clone(self, shared=1):
+        """Copy properties, behaviours and placement; clones do not run scripts"""
+        runtime = self._runtime
+        runtime.stats['clones'] += 1
+        copy = Component(runtime, self._kind, self._name)
+        for name, prop in self._properties.items():
+            if name not in copy._properties:
+                copy._properties[name] = Property(runtime, prop.Type, name, prop._value)
+            else:
+                copy._properties[name]._value = prop._value
+        for behaviour in self._behaviours:
+            copy._behaviours.append(behaviour._copy_to(copy))
+        object.__setattr__(copy, '_matrix', self._matrix.copy())
+        object.__setattr__(copy, 'Visible', self.Visible)
+        object.__setattr__(copy, '_is_clone', True)
+        runtime._add(copy)
+        return copy
+
+    def delete(self):
+        self._runtime._remove(self)
+
+    def rebuild(self):
+        pass
+
+    def __repr__(self):
+        return '<Component {0!r} ({1})>'.format(self._name, self._kind)
+
+
+class Simulation(object):
+    def __init__(self, runtime):
+        self._runtime = runtime
+
+    @property
+    def SimTime(self):
+        return self._runtime.sim_time
+
+    @property
+    def IsRunning(self):
+        return self._runtime.running
+
+
+class Application(object):
+    def __init__(self, runtime):
+        self._runtime = runtime
+        self.render_count = 0
+
+    @property
+    def Components(self):
+        self._runtime.stats['component_scans'] += 1
+        return list(self._runtime._components)
+
+    def findComponent(self, name):
+        self._runtime.stats['find_component'] += 1
+        matches = self._runtime._by_name.get(name)
+        return matches[0] if matches else None
+
+    def load(self, uri):
+        base = re.split(r'[\\/]', uri)[-1]
+        if base.endswith('.vcmx'):
+            base = base[:-5]
+        kind = COMPONENT_KINDS.get(base, 'block')
+        component = Component(self._runtime, kind, base)
+        self._runtime._add(component)
+        return component
+
+    def render(self):
+        self.render_count += 1
+
+
+# ---------------------------------------------------------------------------
+# Script contexts and the virtual-clock scheduler
+# ---------------------------------------------------------------------------
+
+class ScriptContext(object):
+    """One component script: its owning component and module namespace"""
+
+    def __init__(self, runtime, component, source):
+        self.runtime = runtime
+        self.component = component
+        self.source = source
+        self.namespace = {'__name__': 'ComponentScript_{0}'.format(component.Name)}
+
+    def call(self, name, *args):
+        func = self.namespace.get(name)
+        if not callable(func):
+            return None
+        previous = getattr(_local, 'context', None)
+        _local.context = self
+        try:
+            return func(*args)
+        finally:
+            _local.context = previous
+
+
+class _Task(object):
+    def __init__(self, runtime, context):
+        self.runtime = runtime
+        self.context = context
+        self.wake = threading.Event()
+        self.done = False
+        self.generation = 0  # bumped on every suspension; queue entries of earlier ones are stale
+        self.thread = threading.Thread(target=self._main, name='OnRun:' + context.component.Name)
+        self.thread.daemon = True
+
+    def _main(self):
+        self.wake.wait()
+        self.wake.clear()
+        _local.context = self.context
+        _local.task = self
+        try:
+            if not self.runtime._stopping:
+                self.context.namespace['OnRun']()
+        except _Stopped:
+            pass
+        except Exception:
+            self.runtime.errors.append((self.context.component.Name, traceback.format_exc()))
+        finally:
+            self.done = True
+            self.runtime._yielded.set()
+
+
+class HeadlessRuntime(object):
+    """Owns the scene, the virtual clock and every running component script"""
+
+    def __init__(self, time_step=DEFAULT_TIME_STEP, strict=True):
+        self.time_step = time_step
+        self.strict = strict
+        self.sim_time = 0.0
+        self.running = False
+        self.errors = []
+        self.stats = _Counter()
+        self.app = Application(self)
+        self.sim = Simulation(self)
+        self.contexts = []
+        self._components = []
+        self._by_name = {}
+        self._queue = []
+        self._sequence = 0
+        self._tasks = []
+        self._conditions = []  # (task, generation, predicate) of OnRun tasks suspended in condition()
+        self._yielded = threading.Event()
+        self._stopping = False
+        self.source_namespace = None
+
+    # -- scene bookkeeping ---------------------------------------------------
+    def _add(self, component):
+        self._components.append(component)
+        self._by_name.setdefault(component._name, []).append(component)
+
+    def _remove(self, component):
+        if component._deleted:
+            raise HeadlessError('{0!r} was already deleted'.format(component))
+        self.stats['deletes'] += 1
+        object.__setattr__(component, '_deleted', True)
+        self._components.remove(component)
+        self._by_name[component._name].remove(component)
+
+    def _rename(self, component, name):
+        if not component._deleted:
+            self._by_name[component._name].remove(component)
+            self._by_name.setdefault(name, []).append(component)
+        object.__setattr__(component, '_name', name)
+
+    def find(self, name):
+        return self.app.findComponent(name)
+
+    # -- module installation -------------------------------------------------
+    def install(self):
+        """Register vcScript, vcMatrix and vcVector modules bound to this runtime"""
+        runtime = self
+        vc_script = types.ModuleType('vcScript')
+        for name in ('VC_STRING', 'VC_INTEGER', 'VC_REAL', 'VC_BOOLEAN', 'VC_VEHICLE', 'VC_PYTHONSCRIPT'):
+            setattr(vc_script, name, globals()[name])
+        vc_script.getApplication = lambda: runtime.app
+        vc_script.getSimulation = lambda: runtime.sim
+        vc_script.getComponent = runtime._current_component
+        vc_script.delay = runtime.delay
+        vc_script.condition = runtime.condition
+        vc_script.triggerCondition = runtime.trigger_condition
+        vc_script.__all__ = ['VC_STRING', 'VC_INTEGER', 'VC_REAL', 'VC_BOOLEAN', 'VC_VEHICLE', 'VC_PYTHONSCRIPT',
+                             'getApplication', 'getSimulation', 'getComponent', 'delay', 'condition', 'triggerCondition']
+        vc_matrix = types.ModuleType('vcMatrix')
+        vc_matrix.new = new_matrix
+        vc_vector = types.ModuleType('vcVector')
+        vc_vector.new = new_vector
+        sys.modules['vcScript'] = vc_script
+        sys.modules['vcMatrix'] = vc_matrix
+        sys.modules['vcVector'] = vc_vector
+        # State shared between component scripts belongs to one scene
+        sys.modules.pop('vc_simulation_shared', None)
+        return self
+
+    def _current_component(self):
+        context = getattr(_local, 'context', None)
+        if context is None:
+            raise HeadlessError('getComponent() called outside a component script')
+        return context.component
+
+    # -- configuration -------------------------------------------------------
+    def load_source(self, source_path=None):
+        """Execute Simulation_Source_Script.py and return its namespace"""
+        self.install()
+        if source_path is None:
+            source_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Simulation_Source_Script.py')
+        with open(source_path) as handle:
+            code = compile(handle.read(), source_path, 'exec')
+        namespace = {'__name__': 'Simulation_Source_Script', '__file__': source_path}
+        exec(code, namespace)
+        self.source_namespace = namespace
+        return namespace
+
+    def load_configuration(self, source_path=None, configuration_path=None, quiet=True):
+        """Create every template from ConfigurationScript.py through create_component()"""
+        namespace = self.source_namespace or self.load_source(source_path)
+        if configuration_path is None:
+            configuration_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ConfigurationScript.py')
+        with open(configuration_path) as handle:
+            text = handle.read()
+        match = re.search(r"raw_components\s*=\s*r'''(.*?)'''", text, re.S)
+        if not match:
+            raise HeadlessError('raw_components not found in {0}'.format(configuration_path))
+        scripts = dict((k, v) for k, v in namespace.items() if isinstance(v, str))
+        configs = eval(match.group(1).replace('false', 'False').replace('true', 'True'), {}, scripts)
+        namespace['VISUAL_COMPONENTS_VERSIONS'] = ['headless']
+        namespace['VISUAL_COMPONENTS_PATH'] = ''
+        namespace['os'] = _AlwaysExistsOs()
+        templates = []
+        stdout = sys.stdout
+        if quiet:
+            sys.stdout = open(os.devnull, 'w')
+        try:
+            for config in configs:
+                component = namespace['create_component'](self.app, config)
+                if component is None:
+                    raise HeadlessError('create_component failed for {0}'.format(config['name']))
+                templates.append(component)
+        finally:
+            if quiet:
+                sys.stdout.close()
+                sys.stdout = stdout
+        return templates
+
+    # -- simulation control --------------------------------------------------
+    def start(self):
+        """Load every script behaviour, call OnStart and queue each OnRun"""
+        self._stopping = False
+        self.running = True
+        self.contexts = []
+        for component in list(self._components):
+            if getattr(component, '_is_clone', False):
+                continue
+            for behaviour in component._behaviours:
+                if isinstance(behaviour, PythonScript) and behaviour.getProperty('Script')._value:
+                    context = ScriptContext(self, component, behaviour.getProperty('Script')._value)
+                    previous = getattr(_local, 'context', None)
+                    _local.context = context
+                    try:
+                        exec(compile(context.source, 'ComponentScript:' + component.Name, 'exec'), context.namespace)
+                    finally:
+                        _local.context = previous
+                    self.contexts.append(context)
+        for context in self.contexts:
+            self._guard(context.call, 'OnStart')
+        for context in self.contexts:
+            if callable(context.namespace.get('OnRun')):
+                task = _Task(self, context)
+                self._tasks.append(task)
+                task.thread.start()
+                self._schedule(task, self.sim_time)
+        self._check_errors()
+
+    def run(self, until=None, duration=None):
+        """Advance the virtual clock to `until` (or by `duration`) seconds"""
+        if until is None:
+            until = self.sim_time + (duration or 0.0)
+        while self._queue and self._queue[0][0] <= until:
+            wake_time, _, task, generation = heapq.heappop(self._queue)
+            if generation != task.generation:
+                continue
+            self._advance_to(wake_time)
+            self._resume(task)
+            self._check_errors()
+        self._advance_to(until)
+        self._check_errors()
+
+    def run_until(self, predicate, timeout, poll=0.1):
+        """Run until predicate() holds or `timeout` simulated seconds pass"""
+        deadline = self.sim_time + timeout
+        while self.sim_time < deadline:
+            if predicate():
+                return True
+            self.run(until=min(deadline, self.sim_time + poll))
+        return predicate()
+
+    def stop(self):
+        """Unwind all suspended OnRun tasks"""
+        self._stopping = True
+        for task in self._tasks:
+            if not task.done:
+                self._yielded.clear()
+                task.wake.set()
+                self._yielded.wait(5.0)
+        self._tasks = []
+        self._queue = []
+        self._conditions = []
+        self.running = False
+
+    def reset(self):
+        """Stop the simulation, call OnReset and rewind the clock"""
+        self.stop()
+        for context in self.contexts:
+            self._guard(context.call, 'OnReset')
+        self.sim_time = 0.0
+        self._check_errors()
+
+    def write(self, component_name, prop_name, value, force=True):
+        """Emulate an OPC UA server write; fires OnChanged like the connectivity add-on"""
+        component = self.find(component_name)
+        if component is None:
+            raise HeadlessError('Unknown component {0!r}'.format(component_name))
+        prop = component.getProperty(prop_name)
+        if prop is None:
+            raise HeadlessError('{0!r} has no property {1!r}'.format(component_name, prop_name))
+        self._guard(prop._assign, value, force)
+        self._check_errors()
+
+    def read(self, component_name, prop_name):
+        component = self.find(component_name)
+        prop = component.getProperty(prop_name) if component else None
+        return prop._value if prop is not None else None
+
+    def load_layout(self, directory, robot_quantity=0):
+        """Write the MultiAgentSystem layout payloads and RobotQuantity like the OPC UA server does"""
+        for component_name, prop_name, file_name in LAYOUT_FILES:
+            with open(os.path.join(directory, file_name)) as handle:
+                self.write(component_name, prop_name, handle.read())
+        if robot_quantity:
+            self.write('_Template_Mobile_Robot_Resource', 'RobotQuantity', robot_quantity)
+
+    # -- scheduler internals -------------------------------------------------
+    def delay(self, seconds):
+        task = self._current_task('delay')
+        task.generation += 1
+        self._schedule(task, self.sim_time + max(0.0, float(seconds)))
+        self._suspend(task)
+
+    def condition(self, predicate, timeout=0.0):
+        """Sleep until triggerCondition() finds predicate() true, or timeout seconds pass when timeout > 0"""
+        task = self._current_task('condition')
+        if predicate():
+            return True
+        task.generation += 1
+        self._conditions.append((task, task.generation, predicate))
+        if timeout > 0:
+            self._schedule(task, self.sim_time + float(timeout))
+        try:
+            self._suspend(task)
+        finally:
+            self._conditions = [waiter for waiter in self._conditions if waiter[0] is not task]
+        return bool(predicate())
+
+    def trigger_condition(self):
+        """Re-evaluate the predicates of suspended condition() calls and wake the tasks whose predicate holds"""
+        for task, generation, predicate in list(self._conditions):
+            if generation == task.generation and predicate():
+                self._conditions.remove((task, generation, predicate))
+                self._schedule(task, self.sim_time)
+
+    def _current_task(self, name):
+        task = getattr(_local, 'task', None)
+        if task is None:
+            raise HeadlessError('{0}() is only supported inside OnRun'.format(name))
+        return task
+
+    def _suspend(self, task):
+        self._yielded.set()
+        task.wake.wait()
+        task.wake.clear()
+        if self._stopping:
+            raise _Stopped()
+
+    def _schedule(self, task, wake_time):
+        self._sequence += 1
+        heapq.heappush(self._queue, (wake_time, self._sequence, task, task.generation))
+
+    def _resume(self, task):
+        if task.done:
+            return
+        self._yielded.clear()
+        task.wake.set()
+        self._yielded.wait()
+
+    def _advance_to(self, target):
+        while self.sim_time < target - 1e-9:
+            dt = min(self.time_step, target - self.sim_time)
+            for component in self._components:
+                for behaviour in component._behaviours:
+                    if isinstance(behaviour, Vehicle):
+                        behaviour._step(dt)
+            self.sim_time = min(target, self.sim_time + dt)
+            for context in self.contexts:
+                if 'OnSimulationUpdate' in context.namespace:
+                    self._guard(context.call, 'OnSimulationUpdate', self.sim_time)
+        self.sim_time = max(self.sim_time, target)
+
+    def _guard(self, func, *args):
+        try:
+            return func(*args)
+        except Exception:
+            self.errors.append(('<callback>', traceback.format_exc()))
+
+    def _check_errors(self):
+        if self.errors and self.strict:
+            name, trace = self.errors[0]
+            raise HeadlessError('Script error in {0}:\n{1}'.format(name, trace))
+
+
+class _Counter(dict):
+    def __missing__(self, key):
+        return 0
+
+
+class _AlwaysExistsOs(object):
+    """os proxy for create_component(): every .vcmx path resolves to a stand-in model"""
+
+    class path(object):
+        @staticmethod
+        def exists(_path):
+            return True
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+
+def main(argv):
+    duration = float(argv[1]) if len(argv) > 1 else 600.0
+    robot_quantity = int(argv[2]) if len(argv) > 2 else 4
+    here = os.path.dirname(os.path.abspath(__file__))
+    runtime = HeadlessRuntime()
+    runtime.load_configuration()
+    runtime.start()
+    runtime.load_layout(os.path.join(here, os.pardir, 'MultiAgentSystem'), robot_quantity)
+    runtime.run(duration=duration)
+    runtime.stop()
+    print('Simulated {0:.0f} s with {1} robots, {2} components'.format(
+        runtime.sim_time, robot_quantity, len(runtime.app.Components)))
+    for name in sorted(runtime.stats):
+        print('  {0}: {1}'.format(name, runtime.stats[name]))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,497 @@
+"""
+Pathfinding Benchmark
+==============================================================================
+
+Drives the Robot script's planner (find_shortest_path_with_reservations,
+reserve_planned_path, release_completed_reservations) inside HeadlessRuntime
+on synthetic warehouse layouts. Each case sweeps one of pathway count, robot
+count and reservation load around a base case and reports planning latency
+(p50/p99) and A* node expansions over all queries and over the successful
+ones, route cache hit rate and the memory blocks each query leaves allocated.
+With --batch, every robot gets a new goal at once and the batch is planned
+one by one in robot order and with Conflict-Based Search (solve_batch_routes),
+comparing sum-of-costs, makespan and planning time.
+
+Usage from the command line:
+
+    python PathfindingBenchmark.py
+    python PathfindingBenchmark.py --pathways 100 1000 --robots 10 --loads 0.0 0.2 --grid
+    python PathfindingBenchmark.py --destinations 6 --route-cache 64
+    python PathfindingBenchmark.py --batch 20 --pathways 100 --robots 8 --destinations 4
+    python PathfindingBenchmark.py --generate 500 --output pathwayProperties.json
+
+"""
+
+import sys
+import re
+import json
+import math
+import random
+import argparse
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter
+
+from HeadlessRuntime import HeadlessRuntime
+
+
+# Centre spacing of generated pathways: grid neighbours lie within the planner's
+# 12000 connection distance, diagonal ones (14142) outside it
+PATHWAY_PITCH = 10000.0
+PATHWAY_AREA_LENGTH = 10000
+PATHWAY_AREA_WIDTH = 5000
+
+# Every other grid row is a horizontal aisle; cross aisles join them every N columns
+CROSS_AISLE_EVERY = 4
+
+# Sweep values and the base case the other dimensions are held at
+DEFAULT_PATHWAY_COUNTS = (10, 100, 1000, 5000)
+DEFAULT_ROBOT_COUNTS = (1, 10, 50, 200)
+DEFAULT_RESERVATION_LOADS = (0.0, 0.1, 0.3)
+BASE_PATHWAY_COUNT = 1000
+BASE_ROBOT_COUNT = 10
+BASE_RESERVATION_LOAD = 0.0
+
+DEFAULT_QUERIES = 50
+DEFAULT_ALLOCATION_QUERIES = 10
+
+# Goals are any pathway by default; a few fixed destinations model repeated conveyor/idle trips
+DEFAULT_DESTINATIONS = 0
+
+# Simulated seconds between queries, so robot reservations expire as they do in a run
+QUERY_INTERVAL = 1.0
+
+# Batches planned per case with --batch
+DEFAULT_BATCH_ROUNDS = 20
+
+# Robot index that holds the background reservations of the reservation load
+BACKGROUND_ROBOT_INDEX = 100000
+BACKGROUND_RESERVATION_TIME = 1.0e9
+
+ROBOT_TEMPLATE_NAME = '_Template_Mobile_Robot_Resource'
+PATHWAY_TEMPLATE_NAME = '_Template_Pathway_Area'
+
+
+def generate_layout(pathway_count, pitch=PATHWAY_PITCH):
+    """pathwayProperties-shaped list of connected grid aisle pathways"""
+    if pathway_count <= 0:
+        return []
+    # Roughly 5/8 of the grid cells are aisles; keep the layout close to square
+    columns = max(CROSS_AISLE_EVERY, int(math.ceil(math.sqrt(pathway_count / 0.625))))
+    layout = []
+    row = 0
+    while len(layout) < pathway_count:
+        for column in range(columns):
+            horizontal = row % 2 == 0
+            if not horizontal and column % CROSS_AISLE_EVERY != 0:
+                continue
+            name = 'Pathway Area' if not layout else 'Pathway Area #{0}'.format(len(layout) + 1)
+            layout.append({
+                "Name": name,
+                "X": column * pitch,
+                "Y": row * pitch,
+                "Rz": 0 if horizontal else 90,
+                "AreaLength": PATHWAY_AREA_LENGTH,
+                "AreaWidth": PATHWAY_AREA_WIDTH
+            })
+            if len(layout) == pathway_count:
+                break
+        row += 1
+    return layout
+
+
+def write_layout(path, pathway_count):
+    """Write a generated layout in the format of MultiAgentSystem/pathwayProperties.json"""
+    with open(path, 'w') as handle:
+        json.dump(generate_layout(pathway_count), handle, indent=4)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(math.ceil(fraction * len(ordered))) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+def mean(values):
+    """Average of a list of numbers, 0.0 when empty"""
+    return sum(values) / float(len(values)) if values else 0.0
+
+
+def count_new_blocks(before, after):
+    """Memory blocks allocated between two tracemalloc snapshots and still held, tracemalloc's own left out"""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    after = after.filter_traces(ignore)
+    return sum(stat.count_diff for stat in after.compare_to(before.filter_traces(ignore), 'filename'))
+
+
+def add_robot_property_sets(template, robot_count):
+    """Create numbered robot properties beyond the configured property sets"""
+    numbered = [prop for prop in template.Properties
+                if re.match(r'^\D+1$', prop.Name) and template.getProperty(prop.Name[:-1] + '2')]
+    for prop in numbered:
+        base = prop.Name[:-1]
+        for robot_index in range(2, robot_count + 1):
+            if not template.getProperty('{0}{1}'.format(base, robot_index)):
+                template.createProperty(prop.Type, '{0}{1}'.format(base, robot_index))
+
+
+class BenchmarkScene(object):
+    """HeadlessRuntime scene with a generated layout and robots parked on random pathways"""
+
+    def __init__(self, pathway_count, robot_count, reservation_load, seed=0, destinations=DEFAULT_DESTINATIONS,
+                 route_cache_size=None):
+        self.random = random.Random(seed)
+        self.runtime = HeadlessRuntime()
+        self.runtime.load_configuration()
+        template = self.runtime.find(ROBOT_TEMPLATE_NAME)
+        add_robot_property_sets(template, robot_count)
+        self.runtime.start()
+        self.robot_script = [c for c in self.runtime.contexts if c.component is template][0].namespace
+        self.robot_script['MAX_ROBOTS'] = max(self.robot_script['MAX_ROBOTS'], robot_count)
+        if route_cache_size is not None:
+            self.robot_script['ROUTE_CACHE_SIZE'] = route_cache_size
+
+        self.runtime.write(PATHWAY_TEMPLATE_NAME, 'pathwayProperties', json.dumps(generate_layout(pathway_count)))
+        self.runtime.write(ROBOT_TEMPLATE_NAME, 'RobotQuantity', robot_count)
+        script = self.robot_script
+        self.pathways = script['discover_pathways']()
+        script['build_pathway_graph'](self.pathways, script['get_layout_version']())
+        self.pathways_by_name = dict((p['Name'], p) for p in self.pathways)
+        self.robot_count = robot_count
+        self.destinations = self.pathways
+        if 1 < destinations < len(self.pathways):
+            self.destinations = self.random.sample(self.pathways, destinations)
+        # Fixed destinations are the goal set robots park on; their reservations there are dropped after each query
+        self.goal_names = set(p['Name'] for p in self.destinations) if self.destinations is not self.pathways else set()
+
+        for robot_index in range(1, robot_count + 1):
+            self.park_robot(robot_index, self.random.choice(self.destinations))
+
+        # Background load: pathways held by a robot outside the fleet for the whole benchmark
+        names = sorted(self.pathways_by_name)
+        for name in self.random.sample(names, int(reservation_load * len(names))):
+            script['reserve_pathway'](name, BACKGROUND_ROBOT_INDEX, BACKGROUND_RESERVATION_TIME)
+
+    def park_robot(self, robot_index, pathway):
+        """Move a robot to a pathway centre and set its Location"""
+        script = self.robot_script
+        m = script['mat'].new()
+        m.translateAbs(pathway['X'], pathway['Y'], 0.0)
+        script['find_robot_by_index'](robot_index).PositionMatrix = m
+        script['set_robot_property']('Location', pathway['Name'], robot_index)
+        script['invalidate_robot_spatial_index']()
+
+    def query(self, robot_index):
+        """Plan, reserve and half-complete one route; returns (seconds, expansions, found)"""
+        script = self.robot_script
+        start = self.pathways_by_name[script['get_robot_property_value']('Location', robot_index)]
+        # A goal another robot holds cannot be reached and says nothing about the planner
+        goals = [p for p in self.destinations if p is not start and not self.is_held(p['Name'], robot_index)]
+        goal = self.random.choice(goals) if goals else start
+
+        expansions = script['planner_stats']['expansions']
+        started = perf_counter()
+        path = script['find_shortest_path_with_reservations'](start, goal, self.pathways, robot_index)
+        elapsed = perf_counter() - started
+        expansions = script['planner_stats']['expansions'] - expansions
+
+        if path:
+            # Reserve the route components after the start pathway like OnRun does
+            route = [script['find_component'](p['Name']) for p in path[1:]]
+            script['reserve_planned_path'](robot_index, route)
+            script['set_robot_property']('Location', route[len(route) // 2].Name, robot_index)
+            script['release_completed_reservations'](robot_index)
+            self.park_robot(robot_index, goal)
+            self.release_goals(robot_index, goal)
+        self.runtime.sim_time += QUERY_INTERVAL
+        return elapsed, expansions, bool(path)
+
+    def is_held(self, pathway_name, robot_index):
+        """Another robot, of the fleet or the background load, has the pathway reserved now"""
+        now = self.runtime.sim_time
+        return any(holder != robot_index and start <= now < end
+                   for start, end, holder in self.robot_script['pathway_reservations'].get(pathway_name, ()))
+
+    def release_goals(self, robot_index, goal):
+        """Drop a parked robot's reservations and planned path on the goal set, which the next queries aim for"""
+        script = self.robot_script
+        goal_names = self.goal_names | set([goal['Name']])
+        for name in goal_names:
+            script['release_pathway_reservation'](name, robot_index)
+        planned_path = script['robot_planned_paths'].get(robot_index)
+        if planned_path:
+            script['robot_planned_paths'][robot_index] = [pathway for pathway in planned_path
+                                                          if getattr(pathway, 'Name', pathway) not in goal_names]
+
+    def clear_fleet_reservations(self):
+        """Drop the fleet's reservations and keep the background load"""
+        reservations = self.robot_script['pathway_reservations']
+        for name in list(reservations):
+            reservations[name] = [interval for interval in reservations[name] if interval[2] == BACKGROUND_ROBOT_INDEX]
+
+    def new_batch(self):
+        """Park every robot on a random pathway with a new goal; returns robot_index -> (start, goal, pathways)"""
+        requests = {}
+        for robot_index in range(1, self.robot_count + 1):
+            start = self.random.choice(self.pathways)
+            goal = start
+            while goal is start and len(self.destinations) > 1:
+                goal = self.random.choice(self.destinations)
+            self.park_robot(robot_index, start)
+            requests[robot_index] = (start, goal, self.pathways)
+        return requests
+
+    def reserve(self, robot_index, path, timed):
+        """Reserve a space-time plan like OnRun does; returns whether the reservation held"""
+        script = self.robot_script
+        script['planned_entry_times'][robot_index] = timed
+        return script['reserve_planned_path'](robot_index, [script['find_component'](p['Name']) for p in path[1:]])
+
+    def plan_greedy(self, requests):
+        """Plan and reserve each robot in turn; returns robot_index -> entry times of its plan"""
+        script = self.robot_script
+        plans = {}
+        for robot_index in sorted(requests):
+            start, goal, pathways = requests[robot_index]
+            path = script['find_shortest_path_with_reservations'](start, goal, pathways, robot_index)
+            timed = script['planned_entry_times'].get(robot_index, {})
+            if path and self.reserve(robot_index, path, timed):
+                plans[robot_index] = timed
+        return plans
+
+    def plan_joint(self, requests):
+        """Plan like plan_batch_routes: CBS batches of CBS_MAX_ROBOTS, the rest one by one; returns (plans, fallbacks)"""
+        script = self.robot_script
+        plans = {}
+        fallbacks = 0
+        robot_indices = sorted(requests)
+        batch_size = max(script['CBS_MAX_ROBOTS'], 1)
+        for first in range(0, len(robot_indices), batch_size):
+            batch = dict((robot_index, requests[robot_index]) for robot_index in robot_indices[first:first + batch_size])
+            solutions = script['solve_batch_routes'](batch) if len(batch) > 1 else {}
+            if solutions is None:
+                fallbacks += 1
+                solutions = {}
+            for robot_index in sorted(solutions):
+                if self.reserve(robot_index, solutions[robot_index]['path'], solutions[robot_index]['timed']):
+                    plans[robot_index] = solutions[robot_index]['timed']
+            plans.update(self.plan_greedy(dict((robot_index, batch[robot_index]) for robot_index in batch
+                                               if robot_index not in solutions)))
+        return plans, fallbacks
+
+    def close(self):
+        self.runtime.stop()
+
+
+def run_case(pathway_count, robot_count, reservation_load, queries=DEFAULT_QUERIES,
+             allocation_queries=DEFAULT_ALLOCATION_QUERIES, seed=0, destinations=DEFAULT_DESTINATIONS,
+             route_cache_size=None):
+    """Benchmark one layout size, fleet size and reservation load"""
+    scene = BenchmarkScene(pathway_count, robot_count, reservation_load, seed, destinations, route_cache_size)
+    try:
+        planner_stats = scene.robot_script['planner_stats']
+        lookups = planner_stats['cache_hits'] + planner_stats['cache_misses']
+        hits = planner_stats['cache_hits']
+        latencies = []
+        expansions = []
+        found_latencies = []
+        found_expansions = []
+        for number in range(queries):
+            elapsed, expanded, success = scene.query(number % robot_count + 1)
+            latencies.append(elapsed)
+            expansions.append(expanded)
+            # A failed query ends when the search runs out of free pathways, so it is timed apart
+            if success:
+                found_latencies.append(elapsed)
+                found_expansions.append(expanded)
+        lookups = planner_stats['cache_hits'] + planner_stats['cache_misses'] - lookups
+        hits = planner_stats['cache_hits'] - hits
+
+        # Allocation pass runs separately because tracing slows every allocation down
+        allocations = []
+        if tracemalloc is not None and allocation_queries:
+            tracemalloc.start()
+            try:
+                for number in range(allocation_queries):
+                    before = tracemalloc.take_snapshot()
+                    scene.query(number % robot_count + 1)
+                    after = tracemalloc.take_snapshot()
+                    allocations.append(count_new_blocks(before, after))
+            finally:
+                tracemalloc.stop()
+    finally:
+        scene.close()
+
+    return {
+        'pathways': pathway_count,
+        'robots': robot_count,
+        'reservation_load': reservation_load,
+        'queries': queries,
+        'found': len(found_latencies),
+        'p50_ms': percentile(latencies, 0.50) * 1000.0,
+        'p99_ms': percentile(latencies, 0.99) * 1000.0,
+        'expansions': mean(expansions),
+        'found_p50_ms': percentile(found_latencies, 0.50) * 1000.0,
+        'found_p99_ms': percentile(found_latencies, 0.99) * 1000.0,
+        'found_expansions': mean(found_expansions),
+        'cache_hit_rate': hits / float(lookups) if lookups else 0.0,
+        'alloc_blocks': mean(allocations) if allocations else None,
+    }
+
+
+def batch_costs(requests, plans, now):
+    """(sum-of-costs, makespan) in seconds to reach the goals of the planned robots"""
+    costs = []
+    for robot_index, timed in plans.items():
+        goal_name = requests[robot_index][1]['Name']
+        costs.append(timed[goal_name][0] - now if goal_name in timed else 0.0)
+    return sum(costs), max(costs) if costs else 0.0
+
+
+def run_batch_case(pathway_count, robot_count, reservation_load, rounds=DEFAULT_BATCH_ROUNDS, seed=0,
+                   destinations=DEFAULT_DESTINATIONS, route_cache_size=None):
+    """Plan the same simultaneous requests one by one and with CBS, and compare the plans"""
+    scene = BenchmarkScene(pathway_count, robot_count, reservation_load, seed, destinations, route_cache_size)
+    script = scene.robot_script
+    # Batch planning finds conflicts from entry times, so both ways plan in space-time
+    script['SPACE_TIME_PLANNING'] = True
+    totals = {'greedy': [0, 0.0, 0.0, []], 'cbs': [0, 0.0, 0.0, []]}  # found, sum-of-costs, makespan, seconds
+    fallbacks = 0
+    nodes = script['planner_stats']['batch_nodes']
+    try:
+        for number in range(rounds):
+            requests = scene.new_batch()
+            # Alternate which planner goes first so neither always meets a warm route cache
+            order = ('greedy', 'cbs') if number % 2 == 0 else ('cbs', 'greedy')
+            for mode in order:
+                scene.clear_fleet_reservations()
+                started = perf_counter()
+                if mode == 'greedy':
+                    plans = scene.plan_greedy(requests)
+                else:
+                    plans, failed = scene.plan_joint(requests)
+                    fallbacks += failed
+                elapsed = perf_counter() - started
+                sum_of_costs, makespan = batch_costs(requests, plans, scene.runtime.sim_time)
+                total = totals[mode]
+                total[0] += len(plans)
+                total[1] += sum_of_costs
+                total[2] += makespan
+                total[3].append(elapsed)
+            scene.runtime.sim_time += QUERY_INTERVAL
+    finally:
+        scene.close()
+
+    result = {
+        'pathways': pathway_count,
+        'robots': robot_count,
+        'reservation_load': reservation_load,
+        'rounds': rounds,
+        'cbs_fallbacks': fallbacks,
+        'cbs_nodes': script['planner_stats']['batch_nodes'] - nodes,
+    }
+    for mode, (found, sum_of_costs, makespan, seconds) in totals.items():
+        result[mode + '_found'] = found
+        result[mode + '_sum_of_costs'] = sum_of_costs / float(rounds) if rounds else 0.0
+        result[mode + '_makespan'] = makespan / float(rounds) if rounds else 0.0
+        result[mode + '_ms'] = sum(seconds) * 1000.0 / len(seconds) if seconds else 0.0
+    return result
+
+
+def sweep_cases(pathway_counts, robot_counts, loads, grid=False):
+    """(pathways, robots, load) cases: the full grid, or one dimension at a time around the base case"""
+    if grid:
+        return [(p, r, l) for p in pathway_counts for r in robot_counts for l in loads]
+    cases = []
+    for case in ([(p, BASE_ROBOT_COUNT, BASE_RESERVATION_LOAD) for p in pathway_counts] +
+                 [(BASE_PATHWAY_COUNT, r, BASE_RESERVATION_LOAD) for r in robot_counts] +
+                 [(BASE_PATHWAY_COUNT, BASE_ROBOT_COUNT, l) for l in loads]):
+        if case not in cases:
+            cases.append(case)
+    return cases
+
+
+def format_result(result):
+    alloc = '{0:10.1f}'.format(result['alloc_blocks']) if result['alloc_blocks'] is not None else '{0:>10}'.format('n/a')
+    return ('{0:>8} {1:>6} {2:>5.2f} {3:>5}/{4:<5} {5:>9.3f} {6:>9.3f} {7:>10.1f} | {8:>9.3f} {9:>9.3f} {10:>10.1f} | '
+            '{11:>6.1f} {12}').format(
+        result['pathways'], result['robots'], result['reservation_load'], result['found'], result['queries'],
+        result['p50_ms'], result['p99_ms'], result['expansions'],
+        result['found_p50_ms'], result['found_p99_ms'], result['found_expansions'],
+        result['cache_hit_rate'] * 100.0, alloc)
+
+
+def format_batch_result(result):
+    columns = [result['pathways'], result['robots'], result['reservation_load']]
+    for mode in ('greedy', 'cbs'):
+        columns += [result[mode + '_found'], result[mode + '_sum_of_costs'], result[mode + '_makespan'], result[mode + '_ms']]
+    columns.append(result['cbs_fallbacks'])
+    return ('{0:>8} {1:>6} {2:>5.2f} | {3:>7} {4:>9.1f} {5:>9.1f} {6:>8.2f} | {7:>7} {8:>9.1f} {9:>9.1f} {10:>8.2f} '
+            '{11:>9}').format(*columns)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the robot path planner on synthetic layouts')
+    parser.add_argument('--pathways', type=int, nargs='+', default=list(DEFAULT_PATHWAY_COUNTS))
+    parser.add_argument('--robots', type=int, nargs='+', default=list(DEFAULT_ROBOT_COUNTS))
+    parser.add_argument('--loads', type=float, nargs='+', default=list(DEFAULT_RESERVATION_LOADS),
+                        help='fraction of pathways reserved by robots outside the fleet')
+    parser.add_argument('--grid', action='store_true', help='run every combination instead of one dimension at a time')
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES)
+    parser.add_argument('--allocation-queries', type=int, default=DEFAULT_ALLOCATION_QUERIES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--destinations', type=int, default=DEFAULT_DESTINATIONS,
+                        help='pick goals from this many fixed pathways instead of any pathway')
+    parser.add_argument('--route-cache', type=int, metavar='SIZE',
+                        help="plan with this ROUTE_CACHE_SIZE instead of the Robot script's default")
+    parser.add_argument('--batch', type=int, nargs='?', const=DEFAULT_BATCH_ROUNDS, metavar='ROUNDS',
+                        help='compare one-by-one and CBS planning of simultaneous requests over this many batches')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--generate', type=int, metavar='PATHWAYS', help='only write a generated layout')
+    parser.add_argument('--output', default='pathwayProperties.json', help='file for --generate')
+    args = parser.parse_args(argv[1:])
+
+    if args.generate:
+        write_layout(args.output, args.generate)
+        print('Wrote {0} pathways to {1}'.format(args.generate, args.output))
+        return
+
+    if args.batch:
+        print('{0:>8} {1:>6} {2:>5} | {3:>7} {4:>9} {5:>9} {6:>8} | {7:>7} {8:>9} {9:>9} {10:>8} {11:>9}'.format(
+            'pathways', 'robots', 'load', 'found', 'sum s', 'makespan', 'ms', 'found', 'sum s', 'makespan', 'ms',
+            'fallbacks'))
+    else:
+        # Latency and expansions over all queries, then over the queries that found a route
+        print('{0:>8} {1:>6} {2:>5} {3:>11} {4:>9} {5:>9} {6:>10} | {7:>9} {8:>9} {9:>10} | {10:>6} {11:>10}'.format(
+            'pathways', 'robots', 'load', 'found', 'p50 ms', 'p99 ms', 'expansions', 'p50 ms', 'p99 ms', 'expansions',
+            'hit %', 'blocks/q'))
+    results = []
+    for pathway_count, robot_count, load in sweep_cases(args.pathways, args.robots, args.loads, args.grid):
+        if args.batch:
+            result = run_batch_case(pathway_count, robot_count, load, args.batch, args.seed, args.destinations,
+                                    args.route_cache)
+            print(format_batch_result(result))
+        else:
+            result = run_case(pathway_count, robot_count, load, args.queries, args.allocation_queries, args.seed,
+                              args.destinations, args.route_cache)
+            print(format_result(result))
+        results.append(result)
+        sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=4)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
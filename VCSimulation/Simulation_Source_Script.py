@@ -19,6 +19,7 @@ def convert_to_camel_case(name):
         "ProductType": "productType", 
         "CloneTimeInterval": "clonetimeInterval",
         "CloneCount": "cloneCount",
+        "QueueLength": "queueLength",
         "Produced": "produced",
         "Target": "target",
         "Stop": "stop",
@@ -76,6 +77,7 @@ def convert_from_camel_case_to_original(name):
         "productType": "ProductType", 
         "clonetimeInterval": "CloneTimeInterval",
         "cloneCount": "CloneCount",
+        "queueLength": "QueueLength",
         "produced": "Produced",
         "target": "Target",
         "stop": "Stop",
@@ -287,13 +289,314 @@ def create_component(app, config):
         return None
 
 
+# Shared runtime fragment, prepended to every component script below
+SharedRuntime = '''import sys
+import types
+import time
+import json
+import re
+import ast
+import hashlib
+from collections import deque, OrderedDict
+from vcScript import getApplication, getSimulation, condition, triggerCondition
+
+# All component scripts run in one interpreter, so cross-script state lives in a shared module
+shared = sys.modules.get('vc_simulation_shared')
+if shared is None:
+    shared = types.ModuleType('vc_simulation_shared')
+    sys.modules['vc_simulation_shared'] = shared
+
+# Component registry maintained on clone/delete so scripts never scan app.Components
+if not hasattr(shared, 'component_registry'):
+    shared.component_registry = {
+        'by_kind': {},          # kind -> [components in registration order]
+        'by_name': {},          # name -> (kind, component, product_type)
+        'by_product_type': {}   # product_type -> [components]
+    }
+
+def register_component(component, kind, product_type=None):
+    """Register a cloned component under its kind, name and optional ProductType"""
+    unregister_component(component.Name)
+    registry = shared.component_registry
+    registry['by_kind'].setdefault(kind, []).append(component)
+    registry['by_name'][component.Name] = (kind, component, product_type)
+    if product_type is not None:
+        registry['by_product_type'].setdefault(product_type, []).append(component)
+
+def unregister_component(name):
+    """Drop a component from the registry; call before deleting it"""
+    registry = shared.component_registry
+    entry = registry['by_name'].pop(name, None)
+    if entry is None:
+        return
+    kind, component, product_type = entry
+    for key, index in ((kind, registry['by_kind']), (product_type, registry['by_product_type'])):
+        members = index.get(key)
+        if members and component in members:
+            members.remove(component)
+
+def unregister_components(kind):
+    """Drop every component of one kind from the registry"""
+    for component in list(shared.component_registry['by_kind'].get(kind, ())):
+        unregister_component(component.Name)
+
+def get_registered_components(kind):
+    return list(shared.component_registry['by_kind'].get(kind, ()))
+
+def find_registered_component(name):
+    entry = shared.component_registry['by_name'].get(name)
+    return entry[1] if entry else None
+
+def get_components_by_product_type(product_type):
+    return list(shared.component_registry['by_product_type'].get(product_type, ()))
+
+# Parsed property payloads by content hash, shared by all scripts, least recently used first
+if not isinstance(getattr(shared, 'payload_cache', None), OrderedDict):
+    shared.payload_cache = OrderedDict()
+
+# TEMPLATE: Replace hardcoded PAYLOAD_CACHE_SIZE '32' with Simulation.payloadCacheSize attribute from metamodel
+# Distinct payloads kept; the least recently used one is evicted beyond this
+PAYLOAD_CACHE_SIZE = 32
+
+TRAILING_COMMA = re.compile(r',\\s*([\\]}])')
+
+def parse_payload(text):
+    """JSON, then JSON with trailing commas removed, then Python literals; None if none of them parse"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(TRAILING_COMMA.sub(r'\\1', text))
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return None
+
+def copy_payload(value):
+    """Copy of the dicts and lists of a parsed payload; the scalars in it are immutable and shared"""
+    if isinstance(value, dict):
+        return dict((key, copy_payload(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [copy_payload(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(copy_payload(item) for item in value)
+    return value
+
+def decode_payload(text):
+    """Parsed structure of a property payload, decoded once per distinct content; each caller gets its own copy"""
+    if not text:
+        return None
+    data = text if isinstance(text, bytes) else text.encode('utf-8')
+    key = hashlib.sha1(data).hexdigest()
+    cache = shared.payload_cache
+    parsed = cache.pop(key, None) if key in cache else parse_payload(text)
+    cache[key] = parsed
+    while len(cache) > PAYLOAD_CACHE_SIZE:
+        cache.popitem(last=False)
+    return copy_payload(parsed)
+
+# Layout kinds that make up a complete layout; each script marks its kind once its clones are built
+SCENE_LAYOUT_KINDS = ('pathway', 'idle', 'input_conveyor', 'output_conveyor')
+LAYOUT_KINDS = SCENE_LAYOUT_KINDS + ('robot',)
+
+if not hasattr(shared, 'layout_built'):
+    shared.layout_built = set()
+
+def mark_layout_built(kind):
+    shared.layout_built.add(kind)
+    # Wake scripts waiting at the readiness barrier
+    triggerCondition()
+    flush_render()
+
+def clear_layout_built(kind):
+    shared.layout_built.discard(kind)
+
+def is_layout_complete(kinds=LAYOUT_KINDS):
+    for kind in kinds:
+        if kind not in shared.layout_built:
+            return False
+    return True
+
+def wait_for_layout(timeout, kinds=SCENE_LAYOUT_KINDS):
+    """Readiness barrier: sleep until every given layout kind is built; False if timeout simulated seconds pass first"""
+    if not is_layout_complete(kinds):
+        # mark_layout_built triggers the condition, so nothing polls while the layout is built
+        condition(lambda: is_layout_complete(kinds), timeout)
+    return is_layout_complete(kinds)
+
+# TEMPLATE: Replace hardcoded RENDER_FRAME_INTERVAL '0.1' with Simulation.renderFrameInterval attribute from metamodel
+# Minimum wall-clock seconds between two scene renders
+RENDER_FRAME_INTERVAL = 0.1
+
+# TEMPLATE: Replace hardcoded RENDER_UNTIL_LAYOUT_COMPLETE 'True' with Simulation.renderUntilLayoutComplete attribute from metamodel
+# Hold renders until every layout kind is built, or until RENDER_HOLD_TIMEOUT simulated seconds have passed
+RENDER_UNTIL_LAYOUT_COMPLETE = True
+RENDER_HOLD_TIMEOUT = 10.0
+
+# Frame-coalesced rendering: scripts request a render, at most one happens per frame interval
+# 'flush_loop' is set while the Robot OnRun is left to flush a held or throttled render later
+if not hasattr(shared, 'render_state'):
+    shared.render_state = {'dirty': False, 'last_render': None, 'flush_loop': False}
+
+def request_render():
+    shared.render_state['dirty'] = True
+    flush_render()
+
+def set_render_flush_loop(active):
+    """Mark whether a running loop will flush pending renders again; without one they are rendered at once"""
+    shared.render_state['flush_loop'] = active
+    if not active:
+        flush_render()
+
+def flush_render():
+    """Render if one was requested; hold it for the layout or the frame interval only while a later flush is certain"""
+    state = shared.render_state
+    if not state['dirty']:
+        return
+    now = time.time()
+    if state.get('flush_loop') and getSimulation().IsRunning:
+        if RENDER_UNTIL_LAYOUT_COMPLETE and not is_layout_complete() and getSimulation().SimTime < RENDER_HOLD_TIMEOUT:
+            return
+        if state['last_render'] is not None and now - state['last_render'] < RENDER_FRAME_INTERVAL:
+            return
+    state['dirty'] = False
+    state['last_render'] = now
+    getApplication().render()
+
+# Per input conveyor FIFO of spawned products waiting for pickup
+if not hasattr(shared, 'product_queues'):
+    shared.product_queues = {}  # conveyor name -> {'products': deque, 'length_props': [QueueLength properties]}
+
+def create_product_queue(conveyor_name, length_props):
+    """Start a product queue for a conveyor, or keep its products, published through the given QueueLength properties"""
+    queue = shared.product_queues.get(conveyor_name)
+    products = queue['products'] if queue else deque()
+    shared.product_queues[conveyor_name] = {'products': products, 'length_props': [p for p in length_props if p]}
+    publish_queue_length(conveyor_name)
+
+def remove_product_queue(conveyor_name):
+    queue = shared.product_queues.pop(conveyor_name, None)
+    if queue:
+        queue['products'].clear()
+        publish_queue_length(conveyor_name, queue)
+
+def has_product_queue(conveyor_name):
+    return conveyor_name in shared.product_queues
+
+def publish_queue_length(conveyor_name, queue=None):
+    queue = queue or shared.product_queues.get(conveyor_name)
+    if not queue:
+        return
+    length = len(queue['products'])
+    for prop in queue['length_props']:
+        if prop.Value != length:
+            prop.Value = length
+
+def push_product(conveyor_name, product):
+    queue = shared.product_queues.get(conveyor_name)
+    if queue:
+        queue['products'].append(product)
+        publish_queue_length(conveyor_name)
+
+def is_product_waiting(product):
+    """A queued product is still waiting while it is registered and not attached to a robot"""
+    if find_registered_component(product.Name) is not product:
+        return False
+    attached_to_prop = product.getProperty('AttachedToRobot')
+    return not (attached_to_prop and attached_to_prop.Value and attached_to_prop.Value.strip() != '')
+
+def peek_product(conveyor_name):
+    """Oldest product still waiting on a conveyor, dropping any that were picked up or deleted"""
+    queue = shared.product_queues.get(conveyor_name)
+    if not queue:
+        return None
+    products = queue['products']
+    dropped = False
+    while products and not is_product_waiting(products[0]):
+        products.popleft()
+        dropped = True
+    if dropped:
+        publish_queue_length(conveyor_name)
+    return products[0] if products else None
+
+def pop_product(conveyor_name, product):
+    """Remove a picked up product from its conveyor queue"""
+    queue = shared.product_queues.get(conveyor_name)
+    if not queue:
+        return
+    products = queue['products']
+    if products and products[0] is product:
+        products.popleft()
+    elif product in products:
+        products.remove(product)
+    else:
+        return
+    publish_queue_length(conveyor_name)
+
+# Delivered products the input conveyors may recycle, in the order they become ready
+if not hasattr(shared, 'product_pool'):
+    shared.product_pool = deque()  # (ready_time, product)
+
+def retire_product(product, ready_time):
+    """Hand a delivered product to the pool so an input conveyor can reuse it from ready_time on"""
+    if find_registered_component(product.Name) is product:
+        shared.product_pool.append((ready_time, product))
+
+def take_retired_product(current_time):
+    """Oldest pooled product that is ready for reuse, or None"""
+    pool = shared.product_pool
+    while pool and pool[0][0] <= current_time:
+        product = pool.popleft()[1]
+        if find_registered_component(product.Name) is product:
+            return product
+    return None
+
+def evict_retired_products(cap):
+    """Remove and return the oldest delivered products beyond the pool cap"""
+    pool = shared.product_pool
+    evicted = []
+    while len(pool) > cap:
+        evicted.append(pool.popleft()[1])
+    return evicted
+
+def clear_product_pool():
+    shared.product_pool.clear()
+
+# Output conveyors in sink mode collect their deliveries here until they consume them
+if not hasattr(shared, 'output_sinks'):
+    shared.output_sinks = {}  # conveyor name -> deque of (delivery_time, product)
+
+def create_output_sink(conveyor_name):
+    shared.output_sinks[conveyor_name] = deque()
+
+def remove_output_sink(conveyor_name):
+    shared.output_sinks.pop(conveyor_name, None)
+
+def get_output_sink(conveyor_name):
+    return shared.output_sinks.get(conveyor_name)
+
+def deliver_product(conveyor_name, product, delivery_time):
+    """Hand a product dropped on an output conveyor to its sink, or straight to the product pool"""
+    sink = get_output_sink(conveyor_name)
+    if sink is not None:
+        sink.append((delivery_time, product))
+    else:
+        retire_product(product, delivery_time + getattr(shared, 'product_retire_delay', 0.0))
+
+'''
+
+
 # Pathway Area script
-PathwayArea = '''from vcScript import *
+PathwayArea = SharedRuntime + '''from vcScript import *
 import vcMatrix as mat 
 
 comp = getComponent()
 app = getApplication()
 pathways = []
+applied_pathway_props = {}  # pathway name -> layout entry last applied to its clone
 
 def OnStart():
     # TEMPLATE: Replace hardcoded property name 'pathwayProperties' with PathwayArea.opcuaPropertyName attribute from metamodel
@@ -305,67 +608,112 @@ def create_pathways(prop):
     global pathways
     
     if not prop.Value or prop.Value == "[]":
+        # Nothing to build; an empty layout kind must not hold the readiness barrier
+        mark_layout_built('pathway')
         return
     
-    # Clean up existing
-    for p in pathways:
-        try: p.delete()
-        except: pass
-    pathways = []
-    
-    # Parse and create
-    try:
-        properties = eval(prop.Value)
-    except:
+    # Parse
+    properties = decode_payload(prop.Value)
+    if properties is None:
         return
     
+    # Diff by Name: keep unchanged pathways, update moved or resized ones, clone or delete only the rest
+    existing = dict((p.Name, p) for p in pathways)
+    updated_pathways = []
+    changed = False
     for props in properties:
-        new_pathway = comp.clone()
-        if new_pathway:
+        new_pathway = existing.pop(props['Name'], None)
+        if new_pathway is None:
+            new_pathway = comp.clone()
+            if not new_pathway:
+                continue
             new_pathway.Name = props['Name']
             new_pathway.Visible = True  # Make clone visible
-            
-            mtx = mat.new()
-            mtx.rotateAbsZ(props.get('Rz', 0))
-            mtx.translateAbs(props.get('X', 0), props.get('Y', 0), props.get('Z', 0))
-            new_pathway.PositionMatrix = mtx
-            
-            if 'AreaLength' in props:
-                new_pathway.AreaLength = props['AreaLength']
-            if 'AreaWidth' in props:
-                new_pathway.AreaWidth = props['AreaWidth']
-            
-            pathways.append(new_pathway)
-    
-    app.render()
+            register_component(new_pathway, 'pathway')
+        
+        if applied_pathway_props.get(props['Name']) != props:
+            apply_pathway_properties(new_pathway, props)
+            changed = True
+        updated_pathways.append(new_pathway)
+    
+    # Remove pathways that are no longer in the layout
+    for name, p in existing.items():
+        applied_pathway_props.pop(name, None)
+        unregister_component(name)
+        try: p.delete()
+        except: pass
+        changed = True
+    pathways = updated_pathways
+    
+    if changed:
+        bump_layout_version()
+        request_render()
+    mark_layout_built('pathway')
+
+def apply_pathway_properties(pathway, props):
+    mtx = mat.new()
+    mtx.rotateAbsZ(props.get('Rz', 0))
+    mtx.translateAbs(props.get('X', 0), props.get('Y', 0), props.get('Z', 0))
+    pathway.PositionMatrix = mtx
+    
+    if 'AreaLength' in props:
+        pathway.AreaLength = props['AreaLength']
+    if 'AreaWidth' in props:
+        pathway.AreaWidth = props['AreaWidth']
+    
+    applied_pathway_props[props['Name']] = props
+
+def bump_layout_version():
+    # TEMPLATE: Replace hardcoded property name 'LayoutVersion' with PathwayArea.layoutVersionPropertyName attribute from metamodel
+    # Publish a new layout version so the Robot script rebuilds its pathway graph
+    version_prop = comp.getProperty('LayoutVersion')
+    if not version_prop:
+        version_prop = comp.createProperty(VC_INTEGER, 'LayoutVersion')
+    version_prop.Value += 1
 
 def OnRun():
-    # TEMPLATE: Replace hardcoded wait time '50' with PathwayArea.opcuaWaitCycles attribute from metamodel
-    # Wait for OPC-UA data
-    for i in range(50):  # 5 seconds max
-        # TEMPLATE: Replace hardcoded property name 'PathwayProperties' with PathwayArea.opcuaPropertyName attribute from metamodel
-        pathway_prop = comp.getProperty('pathwayProperties')
-        if pathway_prop and pathway_prop.Value and pathway_prop.Value != "[]":
-            create_pathways(pathway_prop)
-            break
-        delay(0.1)
+    # Build from data that arrived before the run; later OPC-UA updates arrive through OnChanged
+    # TEMPLATE: Replace hardcoded property name 'PathwayProperties' with PathwayArea.opcuaPropertyName attribute from metamodel
+    pathway_prop = comp.getProperty('pathwayProperties')
+    if pathway_prop and pathway_prop.Value and pathway_prop.Value != "[]":
+        create_pathways(pathway_prop)
+    else:
+        mark_layout_built('pathway')
 
 def OnReset():
     global pathways
     for p in pathways:
+        unregister_component(p.Name)
         try: p.delete()
         except: pass
     pathways = []
+    applied_pathway_props.clear()
+    clear_layout_built('pathway')
+    bump_layout_version()
 '''
 
 
 # Conveyor script
-OutputConveyor = '''from vcScript import *
+OutputConveyor = SharedRuntime + '''from vcScript import *
 import vcMatrix as mat
 
 comp = getComponent()
 app = getApplication()
+sim = getSimulation()
 output_conveyors = []
+applied_conveyor_props = {}  # conveyor name -> layout entry last applied to its clone
+
+# TEMPLATE: Replace hardcoded OUTPUT_SINK_ENABLED 'False' with OutputConveyor.sinkEnabled attribute from metamodel
+# Consume delivered products, count them and hand them back to the product pool; when off, delivered
+# products stay visible and are recycled after PRODUCT_RETIRE_DELAY as before
+OUTPUT_SINK_ENABLED = False
+
+# TEMPLATE: Replace hardcoded OUTPUT_SINK_DWELL_TIME '60.0' with OutputConveyor.sinkDwellTime attribute from metamodel
+# Seconds a delivered product stays on the output conveyor before the sink consumes it
+OUTPUT_SINK_DWELL_TIME = 60.0
+
+# Names of the delivery counter properties created on the template, reset in OnReset
+delivery_counter_names = set()
 
 def OnStart():
     # TEMPLATE: Replace hardcoded property name 'output_conveyor_Properties' with OutputConveyor.opcuaPropertyName attribute from metamodel
@@ -377,67 +725,169 @@ def create_conveyors(prop):
     global output_conveyors
     
     if not prop.Value or prop.Value == "[]":
+        # Nothing to build; an empty layout kind must not hold the readiness barrier
+        mark_layout_built('output_conveyor')
         return
     
-    # Clean up existing
-    for c in output_conveyors:
-        try: c.delete()
-        except: pass
-    output_conveyors = []
-    
-    # Parse and create
-    try:
-        output_conveyor_properties = eval(prop.Value)
-    except:
+    # Parse
+    output_conveyor_properties = decode_payload(prop.Value)
+    if output_conveyor_properties is None:
         return
     
+    # Diff by Name: keep unchanged conveyors, move changed ones, clone or delete only the rest
+    existing = dict((c.Name, c) for c in output_conveyors)
+    updated_conveyors = []
+    changed = False
     for props in output_conveyor_properties:
-        new_conveyor = comp.clone()
-        if new_conveyor:
+        new_conveyor = existing.pop(props['Name'], None)
+        if new_conveyor is None:
+            new_conveyor = comp.clone()
+            if not new_conveyor:
+                continue
             new_conveyor.Name = props['Name']
             new_conveyor.Visible = True  # Make clone visible
-            
-            # Create a new matrix
-            mtx = mat.new()
-            
-            # First, apply rotation around Z-axis
-            mtx.rotateAbsZ(props.get('Rz', 0))
-            
-            # Then, apply translation
-            mtx.translateAbs(props.get('X', 0), props.get('Y', 0), props.get('Z', 0))
-            
-            # Set the PositionMatrix of the cloned conveyor
-            new_conveyor.PositionMatrix = mtx
-            
-            output_conveyors.append(new_conveyor)
+            register_component(new_conveyor, 'output_conveyor')
+            if OUTPUT_SINK_ENABLED:
+                create_output_sink(new_conveyor.Name)
+        
+        if applied_conveyor_props.get(props['Name']) != props:
+            apply_conveyor_properties(new_conveyor, props)
+            changed = True
+        updated_conveyors.append(new_conveyor)
+    
+    # Remove conveyors that are no longer in the layout
+    for name, c in existing.items():
+        applied_conveyor_props.pop(name, None)
+        remove_output_sink(name)
+        unregister_component(name)
+        try: c.delete()
+        except: pass
+        changed = True
+    output_conveyors = updated_conveyors
     
-    app.render()
+    if changed:
+        bump_layout_version()
+        request_render()
+    mark_layout_built('output_conveyor')
 
-def OnRun():
-    # TEMPLATE: Replace hardcoded delay time '1' with OutputConveyor.opcuaDelayTime attribute from metamodel
-    # Wait for OPC-UA data
-    delay(1)
+def apply_conveyor_properties(conveyor, props):
+    # Create a new matrix
+    mtx = mat.new()
+    
+    # First, apply rotation around Z-axis
+    mtx.rotateAbsZ(props.get('Rz', 0))
+    
+    # Then, apply translation
+    mtx.translateAbs(props.get('X', 0), props.get('Y', 0), props.get('Z', 0))
+    
+    # Set the PositionMatrix of the cloned conveyor
+    conveyor.PositionMatrix = mtx
     
+    applied_conveyor_props[props['Name']] = props
+
+def bump_layout_version():
+    # TEMPLATE: Replace hardcoded property name 'LayoutVersion' with OutputConveyor.layoutVersionPropertyName attribute from metamodel
+    # Publish a new layout version so the Robot script refreshes its conveyor lookup
+    version_prop = comp.getProperty('LayoutVersion')
+    if not version_prop:
+        version_prop = comp.createProperty(VC_INTEGER, 'LayoutVersion')
+    version_prop.Value += 1
+
+def OnRun():
     # TEMPLATE: Replace hardcoded property name 'output_conveyor_Properties' with OutputConveyor.opcuaPropertyName attribute from metamodel
-    # Read the properties from OPC-UA
+    # Build from data that arrived before the run; later OPC-UA updates arrive through OnChanged
     conveyor_prop = comp.getProperty('outputconveyorProperties')
     if conveyor_prop and conveyor_prop.Value and conveyor_prop.Value != "[]":
         create_conveyors(conveyor_prop)
+    else:
+        mark_layout_built('output_conveyor')
+    
+    # Output sink: sleep until the oldest delivery has dwelled long enough, then consume it
+    while OUTPUT_SINK_ENABLED:
+        flush_render()
+        next_due_time = consume_delivered_products()
+        if next_due_time is None:
+            delay(1)  # Nothing delivered yet
+        else:
+            delay(max(next_due_time - sim.SimTime, 0.01))
+
+def consume_delivered_products():
+    """Consume every delivered product past its dwell time and return the next due time, or None"""
+    current_time = sim.SimTime
+    next_due_time = None
+    for conveyor in output_conveyors:
+        sink = get_output_sink(conveyor.Name)
+        while sink:
+            delivery_time, product = sink[0]
+            due_time = delivery_time + OUTPUT_SINK_DWELL_TIME
+            if due_time > current_time:
+                if next_due_time is None or due_time < next_due_time:
+                    next_due_time = due_time
+                break
+            sink.popleft()
+            consume_product(conveyor, product, current_time)
+    return next_due_time
+
+def consume_product(conveyor, product, current_time):
+    # Skip products that were already recycled or deleted
+    if find_registered_component(product.Name) is not product:
+        return
+    
+    product_type_prop = product.getProperty('ProductType')
+    product_type = product_type_prop.Value.replace(' ', '') if product_type_prop and product_type_prop.Value else ''
+    
+    # Per conveyor counters on the clone, totals over all output conveyors on the template
+    count_delivery(conveyor, product_type, current_time)
+    count_delivery(comp, product_type, current_time)
+    
+    product.Visible = False
+    retire_product(product, current_time)
+
+def count_delivery(component, product_type, current_time):
+    names = ['DeliveredCount', 'ThroughputPerHour']
+    if product_type:
+        names += ['Delivered' + product_type, 'ThroughputPerHour' + product_type]
+    for i in range(0, len(names), 2):
+        count_prop = get_counter_property(component, names[i], VC_INTEGER)
+        count_prop.Value += 1
+        throughput_prop = get_counter_property(component, names[i + 1], VC_REAL)
+        if current_time > 0:
+            throughput_prop.Value = count_prop.Value * 3600.0 / current_time
+
+def get_counter_property(component, name, prop_type):
+    prop = component.getProperty(name)
+    if not prop:
+        prop = component.createProperty(prop_type, name)
+    if component == comp:
+        delivery_counter_names.add(name)
+    return prop
 
 def OnReset():
     global output_conveyors
     for output_conveyor in output_conveyors:
+        remove_output_sink(output_conveyor.Name)
+        unregister_component(output_conveyor.Name)
         try:
             output_conveyor.delete()
         except:
             pass
     output_conveyors = []
+    applied_conveyor_props.clear()
+    clear_layout_built('output_conveyor')
+    bump_layout_version()
+
+    # Reset delivery counters
+    for name in delivery_counter_names:
+        prop = comp.getProperty(name)
+        if prop:
+            prop.Value = 0
 '''
 
 
 # Input Conveyor script
-InputConveyor = '''from vcScript import *
+InputConveyor = SharedRuntime + '''from vcScript import *
 import vcMatrix
+import heapq
 
 app = getApplication()
 sim = getSimulation()
@@ -446,11 +896,28 @@ comp = getComponent()
 # Global lists to keep track of cloned conveyors and components
 cloned_conveyors = []
 cloned_components = []
+applied_conveyor_props = {}  # conveyor name -> (index, layout entry) last applied to its clone
 
 # TEMPLATE: Replace hardcoded MAX_CONVEYORS '10' with InputConveyor.maxInstances attribute from metamodel
 # Maximum supported conveyors (should match the number of pre-created properties)
 MAX_CONVEYORS = 10
 
+# Next-due production schedule: heap of (due_time, conveyor index, conveyor), rebuilt when conveyors change
+production_schedule = []
+production_schedule_dirty = True
+
+# TEMPLATE: Replace hardcoded PRODUCT_POOL_CAP '50' with InputConveyor.productPoolCap attribute from metamodel
+# Delivered products kept in the scene for recycling; the oldest beyond this are deleted
+PRODUCT_POOL_CAP = 50
+
+# TEMPLATE: Replace hardcoded PRODUCT_RETIRE_DELAY '60.0' with InputConveyor.productRetireDelay attribute from metamodel
+# Seconds a delivered product stays on its output conveyor before it may be recycled (without an output sink)
+PRODUCT_RETIRE_DELAY = 60.0
+shared.product_retire_delay = PRODUCT_RETIRE_DELAY
+
+# Cached product template handle
+product_template = None
+
 def OnStart():
     # TEMPLATE: Replace hardcoded property name 'Input_Conveyor_Location' with InputConveyor.locationPropertyName attribute from metamodel
     # Setup property change handler
@@ -459,26 +926,19 @@ def OnStart():
         input_location_prop.OnChanged = lambda prop: clone_conveyors()
 
 def clone_conveyors():
-    global cloned_conveyors
-
-    # Clean up existing clones
-    for conveyor in cloned_conveyors:
-        try: conveyor.delete()
-        except: pass
-    cloned_conveyors = []
+    global cloned_conveyors, production_schedule_dirty
 
     # TEMPLATE: Replace hardcoded property name 'Input_Conveyor_Location' with InputConveyor.locationPropertyName attribute from metamodel
     # Get the Input_Conveyor_Location property
     location_prop = comp.getProperty('inputconveyorProperties')
     if not location_prop or not location_prop.Value or location_prop.Value == "[]":
-        return
-    
-    # Parse location data using eval (like other components)
-    try:
-        conveyor_locations = eval(location_prop.Value)
-    except:
-        print("Error parsing Input_Conveyor_Location data")
-        return
+        conveyor_locations = []
+    else:
+        # Parse location data with the shared payload decoder (like other components)
+        conveyor_locations = decode_payload(location_prop.Value)
+        if conveyor_locations is None:
+            print("Error parsing Input_Conveyor_Location data")
+            return
     
     # Determine quantity from location data
     conveyor_quantity = min(len(conveyor_locations), MAX_CONVEYORS)
@@ -522,36 +982,69 @@ def clone_conveyors():
         prop = comp.getProperty('Produced{}'.format(i + 1))
         produced_props.append(prop)
 
-    # Clone and position conveyors
+    # Diff by Name: keep unchanged conveyors with their products and schedule, update changed ones in place
+    existing = dict((c.Name, c) for c in cloned_conveyors)
+    updated_conveyors = []
+    changed = False
     for i in range(conveyor_quantity):
-        conveyor = comp.clone()
-        
         # Use 'Name' from location data if available, otherwise use default naming
         location = conveyor_locations[i]
         if 'Name' in location and location['Name']:
-            conveyor.Name = location['Name']
+            name = location['Name']
         else:
-            conveyor.Name = 'InputConveyor #{}'.format(i + 1)
-            
-        conveyor.Visible = True
-        cloned_conveyors.append(conveyor)
+            name = 'InputConveyor #{}'.format(i + 1)
         
-        # Position the conveyor
-        x = location.get('X', 0)
-        y = location.get('Y', 0)
-        rz = location.get('Rz', 0)
+        conveyor = existing.pop(name, None)
+        if conveyor is None:
+            conveyor = comp.clone()
+            conveyor.Name = name
+            conveyor.Visible = True
+            set_conveyor_properties(conveyor, i + 1, product_types[i], clone_time_intervals[i], clone_counts[i], produced_props[i])
+            register_component(conveyor, 'input_conveyor')
+        elif applied_conveyor_props.get(name) != (i + 1, location):
+            update_conveyor_properties(conveyor, i + 1, product_types[i], clone_time_intervals[i])
+        updated_conveyors.append(conveyor)
         
-        mtx = vcMatrix.new()
-        mtx.rotateAbsZ(rz)
-        mtx.translateAbs(x, y, 0)
-        conveyor.PositionMatrix = mtx
-
-        # Set properties
-        set_conveyor_properties(conveyor, i + 1, product_types[i], clone_time_intervals[i], clone_counts[i], produced_props[i])
-    
-    app.render()
-
-def set_conveyor_properties(conveyor, index, product_type, clone_time_interval, clone_count_prop, produced_prop):
+        if applied_conveyor_props.get(name) != (i + 1, location):
+            # Position the conveyor
+            x = location.get('X', 0)
+            y = location.get('Y', 0)
+            rz = location.get('Rz', 0)
+            
+            mtx = vcMatrix.new()
+            mtx.rotateAbsZ(rz)
+            mtx.translateAbs(x, y, 0)
+            conveyor.PositionMatrix = mtx
+            
+            create_product_queue(conveyor.Name, [conveyor.getProperty('QueueLength'), comp.getProperty('QueueLength{}'.format(i + 1))])
+            applied_conveyor_props[name] = (i + 1, location)
+            changed = True
+    
+    # Remove conveyors that are no longer in the layout
+    for name, conveyor in existing.items():
+        applied_conveyor_props.pop(name, None)
+        remove_product_queue(name)
+        unregister_component(name)
+        try: conveyor.delete()
+        except: pass
+        changed = True
+    cloned_conveyors = updated_conveyors
+    
+    if changed:
+        production_schedule_dirty = True
+        bump_layout_version()
+        request_render()
+    mark_layout_built('input_conveyor')
+
+def bump_layout_version():
+    # TEMPLATE: Replace hardcoded property name 'LayoutVersion' with InputConveyor.layoutVersionPropertyName attribute from metamodel
+    # Publish a new layout version so the Robot script refreshes its conveyor lookup
+    version_prop = comp.getProperty('LayoutVersion')
+    if not version_prop:
+        version_prop = comp.createProperty(VC_INTEGER, 'LayoutVersion')
+    version_prop.Value += 1
+
+def update_conveyor_properties(conveyor, index, product_type, clone_time_interval):
     # ProductType (from location data)
     prop = conveyor.getProperty('ProductType')
     if not prop:
@@ -564,6 +1057,16 @@ def set_conveyor_properties(conveyor, index, product_type, clone_time_interval,
         prop = conveyor.createProperty(VC_REAL, 'CloneTimeInterval')
     prop.Value = clone_time_interval
 
+    # Index
+    prop = conveyor.getProperty('Index')
+    if not prop:
+        prop = conveyor.createProperty(VC_INTEGER, 'Index')
+    prop.Value = index
+
+def set_conveyor_properties(conveyor, index, product_type, clone_time_interval, clone_count_prop, produced_prop):
+    # Layout-derived properties
+    update_conveyor_properties(conveyor, index, product_type, clone_time_interval)
+
     # Produced (linked to template property for OPC-UA communication)
     prop = conveyor.getProperty('Produced')
     if not prop:
@@ -582,50 +1085,107 @@ def set_conveyor_properties(conveyor, index, product_type, clone_time_interval,
         prop = conveyor.createProperty(VC_INTEGER, 'CloneCount')
     prop.Value = clone_count_prop.Value if clone_count_prop else 0
 
-    # Index
-    prop = conveyor.getProperty('Index')
+    # QueueLength (products waiting for pickup, mirrored to the template's QueueLength#)
+    prop = conveyor.getProperty('QueueLength')
     if not prop:
-        prop = conveyor.createProperty(VC_INTEGER, 'Index')
-    prop.Value = index
+        prop = conveyor.createProperty(VC_INTEGER, 'QueueLength')
+    prop.Value = 0
 
 def OnRun():
-    # TEMPLATE: Replace hardcoded wait time '50' with InputConveyor.opcuaWaitCycles attribute from metamodel
-    # Wait for OPC-UA data with delay loop (following pattern from other components)
-    for i in range(50):  # 5 seconds max
-        # TEMPLATE: Replace hardcoded property name 'Input_Conveyor_Location' with InputConveyor.locationPropertyName attribute from metamodel
-        input_location_prop = comp.getProperty('inputconveyorProperties')
-        if input_location_prop and input_location_prop.Value and input_location_prop.Value != "[]":
-            clone_conveyors()
-            break
-        delay(0.1)
+    # Build from data that arrived before the run; later OPC-UA updates arrive through OnChanged
+    # TEMPLATE: Replace hardcoded property name 'Input_Conveyor_Location' with InputConveyor.locationPropertyName attribute from metamodel
+    input_location_prop = comp.getProperty('inputconveyorProperties')
+    if input_location_prop and input_location_prop.Value and input_location_prop.Value != "[]":
+        clone_conveyors()
+    else:
+        mark_layout_built('input_conveyor')
     
-    # Main run loop
+    # Main run loop: sleep until the earliest conveyor is due, then spawn on it
     while True:
-        for conveyor in cloned_conveyors:
-            process_conveyor(conveyor)
-        delay(1)
-
-def process_conveyor(conveyor):
+        if production_schedule_dirty:
+            build_production_schedule()
+        if not production_schedule:
+            delay(1)  # No conveyors yet
+            continue
+
+        due_time, index, conveyor = production_schedule[0]
+        wait_time = due_time - sim.SimTime
+        if wait_time > 1e-9:
+            delay(wait_time)
+            continue  # Conveyors may have been recreated while sleeping
+
+        heapq.heappop(production_schedule)
+        process_conveyor(conveyor, index, due_time)
+        flush_render()
+
+def get_clone_time_interval(conveyor):
     clone_time_interval = conveyor.getProperty('CloneTimeInterval').Value
-    last_clone_time = conveyor.getProperty('LastCloneTime').Value
+    # A non-positive interval falls back to one spawn per second
+    return clone_time_interval if clone_time_interval > 0 else 1.0
+
+def build_production_schedule():
+    """Heap of next spawn times (LastCloneTime + CloneTimeInterval) for all cloned conveyors"""
+    global production_schedule, production_schedule_dirty
+    production_schedule = []
+    for i, conveyor in enumerate(cloned_conveyors):
+        due_time = conveyor.getProperty('LastCloneTime').Value + get_clone_time_interval(conveyor)
+        production_schedule.append((due_time, i, conveyor))
+    heapq.heapify(production_schedule)
+    production_schedule_dirty = False
+
+def process_conveyor(conveyor, index, due_time):
+    clone_time_interval = get_clone_time_interval(conveyor)
     current_time = sim.SimTime
 
-    if current_time - last_clone_time >= clone_time_interval:
-        clone_component(conveyor)
-        conveyor.getProperty('LastCloneTime').Value = current_time
+    clone_component(conveyor)
+
+    # Keep the exact cadence; resynchronise only if we fell more than a whole interval behind
+    last_clone_time = due_time if current_time - due_time < clone_time_interval else current_time
+    conveyor.getProperty('LastCloneTime').Value = last_clone_time
+    heapq.heappush(production_schedule, (last_clone_time + clone_time_interval, index, conveyor))
+
+def get_product_template():
+    """Product template component, looked up once - try both possible names"""
+    global product_template
+    if not product_template:
+        product_template = app.findComponent('Component1')
+        if not product_template:
+            product_template = app.findComponent('Component_1')
+    return product_template
+
+def evict_products():
+    """Delete delivered products beyond the pool cap"""
+    for product in evict_retired_products(PRODUCT_POOL_CAP):
+        unregister_component(product.Name)
+        if product in cloned_components:
+            cloned_components.remove(product)
+        try: product.delete()
+        except: pass
+
+def recycle_product():
+    """Take back a delivered product that is ready for reuse, or None"""
+    product = take_retired_product(sim.SimTime)
+    if product:
+        unregister_component(product.Name)
+        attached_to_prop = product.getProperty('AttachedToRobot')
+        if attached_to_prop:
+            attached_to_prop.Value = ''
+        product.Visible = True
+    return product
 
 def clone_component(conveyor):
     global cloned_components
     
-    # Find original component to clone - try both possible names
-    original_component = app.findComponent('Component1')
-    if not original_component:
-        original_component = app.findComponent('Component_1')
+    evict_products()
+    cloned_component = recycle_product()
+    if not cloned_component:
+        original_component = get_product_template()
+        if original_component:
+            # Clone with unique geometry (shared=0) to avoid attachment conflicts
+            cloned_component = original_component.clone(0)
+            cloned_components.append(cloned_component)
     
-    if original_component:
-        # Clone with unique geometry (shared=0) to avoid attachment conflicts
-        cloned_component = original_component.clone(0)
-
+    if cloned_component:
         product_type = conveyor.getProperty('ProductType').Value
         
         clone_count_prop = conveyor.getProperty('CloneCount')
@@ -665,22 +1225,33 @@ def clone_component(conveyor):
         if produced_prop_template:
             produced_prop_template.Value = True
 
-        cloned_components.append(cloned_component)
+        register_component(cloned_component, 'product', product_type)
+        push_product(conveyor.Name, cloned_component)
 
 def OnReset():
-    global cloned_conveyors, cloned_components
+    global cloned_conveyors, cloned_components, production_schedule, production_schedule_dirty, product_template
 
     # Delete cloned conveyors
     for conveyor in cloned_conveyors:
+        remove_product_queue(conveyor.Name)
+        unregister_component(conveyor.Name)
         try: conveyor.delete()
         except: pass
     cloned_conveyors = []
+    applied_conveyor_props.clear()
+    clear_layout_built('input_conveyor')
+    production_schedule = []
+    production_schedule_dirty = True
+    bump_layout_version()
 
     # Delete cloned components
     for component in cloned_components:
+        unregister_component(component.Name)
         try: component.delete()
         except: pass
     cloned_components = []
+    clear_product_pool()
+    product_template = None
 
     # Reset properties
     quantity_prop = comp.getProperty('InputConveyorQuantity')
@@ -695,11 +1266,16 @@ def OnReset():
             prop = comp.getProperty('CloneCount{}'.format(i))
             if prop:
                 prop.Value = 0
+
+            # Reset QueueLength#
+            prop = comp.getProperty('QueueLength{}'.format(i))
+            if prop:
+                prop.Value = 0
 '''
 
 
 # Idle Location script
-IdleLocation = '''from vcScript import *
+IdleLocation = SharedRuntime + '''from vcScript import *
 import vcMatrix as mat 
 import vcVector
 import math
@@ -707,6 +1283,7 @@ import math
 comp = getComponent()
 app = getApplication()
 idles = []
+applied_idle_props = {}  # idle location name -> layout entry last applied to its clone
 
 def OnStart():
     # TEMPLATE: Replace hardcoded property name 'IdleProperties' with IdleLocation.opcuaPropertyName attribute from metamodel
@@ -718,62 +1295,92 @@ def create_idles(prop):
     global idles
     
     if not prop.Value or prop.Value == "[]":
+        # Nothing to build; an empty layout kind must not hold the readiness barrier
+        mark_layout_built('idle')
         return
     
-    # Clean up existing
-    for idle in idles:
-        try: idle.delete()
-        except: pass
-    idles = []
-    
-    # Parse and create
-    try:
-        idle_properties = eval(prop.Value)
-    except:
+    # Parse
+    idle_properties = decode_payload(prop.Value)
+    if idle_properties is None:
         return
     
-    # Process all idle properties starting from the first element
+    # Diff by Name: keep unchanged idle locations, move changed ones, clone or delete only the rest
+    existing = dict((idle.Name, idle) for idle in idles)
+    updated_idles = []
+    changed = False
     for props in idle_properties:
-        new_idle = comp.clone()
-        if new_idle:
+        new_idle = existing.pop(props['Name'], None)
+        if new_idle is None:
+            new_idle = comp.clone()
+            if not new_idle:
+                continue
             new_idle.Name = props['Name']
             new_idle.Visible = True  # Make clone visible
-            
-            # Create a new matrix
-            mtx = mat.new()
-            
-            # First, apply rotation around Z-axis
-            mtx.rotateAbsZ(props.get('Rz', 0))
-            
-            # Then, apply translation
-            mtx.translateAbs(props.get('X', 0), props.get('Y', 0), 0)
-            
-            # Set the PositionMatrix of the cloned idle
-            new_idle.PositionMatrix = mtx
-            
-            idles.append(new_idle)
+            register_component(new_idle, 'idle')
+        
+        if applied_idle_props.get(props['Name']) != props:
+            apply_idle_properties(new_idle, props)
+            changed = True
+        updated_idles.append(new_idle)
+    
+    # Remove idle locations that are no longer in the layout
+    for name, idle in existing.items():
+        applied_idle_props.pop(name, None)
+        unregister_component(name)
+        try: idle.delete()
+        except: pass
+        changed = True
+    idles = updated_idles
     
-    app.render()
+    if changed:
+        bump_layout_version()
+        request_render()
+    mark_layout_built('idle')
+
+def apply_idle_properties(idle, props):
+    # Create a new matrix
+    mtx = mat.new()
+    
+    # First, apply rotation around Z-axis
+    mtx.rotateAbsZ(props.get('Rz', 0))
+    
+    # Then, apply translation
+    mtx.translateAbs(props.get('X', 0), props.get('Y', 0), 0)
+    
+    # Set the PositionMatrix of the cloned idle
+    idle.PositionMatrix = mtx
+    
+    applied_idle_props[props['Name']] = props
+
+def bump_layout_version():
+    # TEMPLATE: Replace hardcoded property name 'LayoutVersion' with IdleLocation.layoutVersionPropertyName attribute from metamodel
+    # Publish a new layout version so the Robot script rebuilds its pathway graph
+    version_prop = comp.getProperty('LayoutVersion')
+    if not version_prop:
+        version_prop = comp.createProperty(VC_INTEGER, 'LayoutVersion')
+    version_prop.Value += 1
 
 def OnRun():
-    # TEMPLATE: Replace hardcoded wait time '50' with IdleLocation.opcuaWaitCycles attribute from metamodel
-    # Wait for OPC-UA data
-    for i in range(50):  # 5 seconds max
-        # TEMPLATE: Replace hardcoded property name 'idleProperties' with IdleLocation.opcuaPropertyName attribute from metamodel
-        idle_prop = comp.getProperty('idleProperties')
-        if idle_prop and idle_prop.Value and idle_prop.Value != "[]":
-            create_idles(idle_prop)
-            break
-        delay(0.1)
+    # Build from data that arrived before the run; later OPC-UA updates arrive through OnChanged
+    # TEMPLATE: Replace hardcoded property name 'idleProperties' with IdleLocation.opcuaPropertyName attribute from metamodel
+    idle_prop = comp.getProperty('idleProperties')
+    if idle_prop and idle_prop.Value and idle_prop.Value != "[]":
+        create_idles(idle_prop)
+    else:
+        mark_layout_built('idle')
 
 def OnReset():
     global idles
     for idle in idles:
+        unregister_component(idle.Name)
         try:
             idle.delete()
         except:
             pass
     idles = []
+    applied_idle_props.clear()
+    clear_layout_built('idle')
+    bump_layout_version()
 
 def OnSignal( signal ):
     pass
@@ -781,17 +1388,31 @@ def OnSignal( signal ):
 
 
 # Mobile Robot Resource script
-Robot = '''from vcScript import *
+Robot = SharedRuntime + '''from vcScript import *
 import vcMatrix as mat
 import vcVector
 import math
 import heapq
+import itertools
+import bisect
+from collections import OrderedDict
+
+# NumPy is optional; without it the fleet queries below use the scalar path
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Initialize global variables
 comp = getComponent()
 app = getApplication()
 sim = getSimulation()
 
+# Helper function to look up a component by name
+def find_component(name):
+    """Registered component by name, falling back to app.findComponent for unregistered ones"""
+    return find_registered_component(name) or app.findComponent(name)
+
 # Helper function to check if a component is a conveyor
 def is_conveyor(component_name):
     """Check if a component name indicates it's a conveyor by looking for 'conveyor' in the name (case-insensitive)"""
@@ -815,10 +1436,177 @@ cloned_robots = []
 # Maximum supported robots
 MAX_ROBOTS = 15
 
+# TEMPLATE: Replace hardcoded READINESS_TIMEOUT '30.0' with Robot.readinessTimeout attribute from metamodel
+# Longest the robots wait at the readiness barrier before planning with whatever layout exists
+READINESS_TIMEOUT = 30.0
+
+# TEMPLATE: Replace hardcoded ROBOT_QUANTITY_TIMEOUT '5.0' with Robot.robotQuantityTimeout attribute from metamodel
+# Longest the robots wait after the layout barrier for RobotQuantity before the run goes on without them
+ROBOT_QUANTITY_TIMEOUT = 5.0
+
+# Startup metrics: simulation times of OnRun, of passing the readiness barrier and of the first robot move
+readiness_metrics = {'run_start': None, 'layout_ready': None, 'first_move': None}
+
 # Global reservation system for conflict-free pathfinding
-pathway_reservations = {}  # pathway_name -> {robot_index: reservation_time}
+pathway_reservations = {}  # pathway_name -> [(start_time, end_time, robot_index)] sorted by start_time
 robot_planned_paths = {}   # robot_index -> [pathway_names_in_order]
+planned_entry_times = {}   # robot_index -> {pathway_name: (entry_time, exit_time, hold_until)} of the last space-time plan
 coordination_lock = False  # Prevents simultaneous path planning
+INTERVAL_TOLERANCE = 1e-6  # seconds kept between planned intervals so rounding of planned times never overlaps them
+
+# TEMPLATE: Replace hardcoded PATHWAY_CONNECTION_DISTANCE '12000' with Robot.pathwayConnectionDistance attribute from metamodel
+# Pathways whose centres are within this distance are connected in the pathway graph
+PATHWAY_CONNECTION_DISTANCE = 12000
+
+# Precomputed pathway adjacency graph, rebuilt only when the layout version changes
+pathway_neighbors = {}         # pathway_name -> [pathway dicts within connection distance]
+pathway_grid = {}              # (cell_x, cell_y) -> [pathway dicts], cell size = connection distance
+pathway_order = {}             # pathway_name -> position in the discovered layout
+pathway_graph_version = None   # layout version the graph was built for
+
+# Planner counters: A* queries and node expansions, route cache hits and misses, cached routes repaired
+# around blocked pathways, routes that fell back to a full search, waits in space-time plans, and batches
+# planned with Conflict-Based Search, their constraint tree nodes and batches planned one by one instead, since the last reset
+planner_stats = {'queries': 0, 'expansions': 0, 'cache_hits': 0, 'cache_misses': 0, 'route_repairs': 0, 'route_fallbacks': 0,
+                 'planned_waits': 0, 'batches': 0, 'batch_nodes': 0, 'batch_fallbacks': 0}
+
+# TEMPLATE: Replace hardcoded ROUTE_CACHE_SIZE '0' with Robot.routeCacheSize attribute from metamodel
+# Static-cost routes kept per (start pathway, goal), least recently used evicted first; 0 disables the cache
+ROUTE_CACHE_SIZE = 0
+
+# TEMPLATE: Replace hardcoded ROUTE_REPAIR_LIMIT '3' with Robot.routeRepairLimit attribute from metamodel
+# Blocked stretches of a cached route repaired with local detours before planning the whole route again
+ROUTE_REPAIR_LIMIT = 3
+
+route_cache = OrderedDict()    # (start pathway name, goal name) -> [pathway names from start pathway to goal]
+
+# TEMPLATE: Replace hardcoded SPACE_TIME_PLANNING 'False' with Robot.spaceTimePlanning attribute from metamodel
+# Plan entry times against the reservation table and wait for busy pathways instead of avoiding or failing on them
+SPACE_TIME_PLANNING = False
+
+# TEMPLATE: Replace hardcoded space-time planning values with Robot.planningSpeed, Robot.reservationMargin, Robot.maxWaitTime and Robot.goalHoldTime attributes from metamodel
+PLANNING_SPEED = 800.0         # average speed (mm/s) used to predict pathway entry times
+RESERVATION_MARGIN = 1.0       # seconds reserved before entering and after leaving a pathway
+MAX_WAIT_TIME = 30.0           # longest planned wait before entering a pathway
+GOAL_HOLD_TIME = 5.0           # seconds the goal pathway stays reserved after arrival
+
+# TEMPLATE: Replace hardcoded CBS_PLANNING 'False' with Robot.cbsPlanning attribute from metamodel
+# Plan robots queued in the same tick together with Conflict-Based Search instead of one by one in queue order
+CBS_PLANNING = False
+
+# TEMPLATE: Replace hardcoded batch planning limits with Robot.cbsMaxRobots, Robot.cbsMaxNodes and Robot.cbsTimeLimit attributes from metamodel
+CBS_MAX_ROBOTS = 8             # robots planned together; the rest of the queue plans one by one
+CBS_MAX_NODES = 64             # constraint tree nodes expanded before the batch is planned one by one
+CBS_TIME_LIMIT = 0.05          # wall-clock seconds a batch may search before it is planned one by one
+pathway_nodes = {}             # pathway_name -> pathway dict of the graph
+
+# TEMPLATE: Replace hardcoded template names with the layout component names from metamodel
+# Layout templates that publish a LayoutVersion counter after rebuilding their clones
+layout_template_names = [
+    '_Template_Pathway_Area',
+    '_Template_IdleLocation',
+    '_Template_InputConveyor',
+    '_Template_OutputConveyor'
+]
+layout_version_props = {}      # template_name -> LayoutVersion property
+
+# TEMPLATE: Replace hardcoded EARLY_DETECTION_ZONE '5000' with Robot.earlyDetectionZone attribute from metamodel
+# Outermost robot-to-robot detection range; also the cell size of the robot spatial index
+EARLY_DETECTION_ZONE = 5000
+
+# Spatial hash of robot positions, rebuilt once per simulation tick
+robot_spatial_index = {
+    'time': None,       # SimTime the index was built at
+    'cells': {},        # (cell_x, cell_y) -> [(order, robot, robot_index, position)]
+    'by_location': None # Location property value -> [robot_index], built on first use per tick
+}
+
+# TEMPLATE: Replace hardcoded FLEET_MATRIX_MIN_ROBOTS '8' with Robot.fleetMatrixMinRobots attribute from metamodel
+# Smallest fleet for which the NumPy pairwise matrices pay off over per-pair scalar math
+FLEET_MATRIX_MIN_ROBOTS = 8
+
+# TEMPLATE: Replace hardcoded SIM_OWNED_ROBOT_PROPERTIES with the Simulation-to-Server variables of CommunicationServer from metamodel
+# Numbered robot properties that only this script writes, so the last written value is known without a read
+SIM_OWNED_ROBOT_PROPERTIES = ('Location', 'NextLocation', 'CarriedProduct', 'MaxSpeed')
+
+robot_property_handles = {}   # (prop_name, robot_index) -> numbered property of this component
+robot_last_written = {}       # (prop_name, robot_index) -> last value written to a sim-owned property
+robot_index_registry = {}     # id(robot component) -> robot_index for the components in robots
+robots_by_index = {}          # robot_index -> robot component
+robot_index_by_name = {}      # robot name -> robot_index parsed from it
+
+# Robot property values read once per simulation tick (sense) and writes applied at tick end (act)
+robot_snapshot = {
+    'time': None,       # SimTime the values were read at
+    'values': {},       # (prop_name, robot_index) -> value, including this tick's own writes
+    'writes': {},       # (prop_name, robot_index) -> value waiting to be written to the host
+    'write_order': []   # keys of 'writes' in the order they were first written
+}
+
+# Robot positions and movement directions, read once per simulation tick
+fleet_state = {
+    'time': None,       # SimTime the positions were read at
+    'rows': {},         # robot_index -> row in the lists below
+    'names': {},        # robot name -> row
+    'robots': [],       # robot components in robots list order
+    'positions': [],    # robot positions
+    'directions': None, # movement direction per row (None if not moving), built on first use
+    'matrices': None    # NumPy pairwise matrices, built on first use
+}
+
+# Geometry records of pathway, idle location and conveyor components, keyed by component name
+pathway_geometry_cache = {}
+
+# TEMPLATE: Replace hardcoded PRECOMPUTE_TRANSITIONS 'False' with Robot.precomputeTransitions attribute from metamodel
+# Fill the transition table for every connected pathway pair whenever the pathway graph is built; off, pairs are memoized on first use
+PRECOMPUTE_TRANSITIONS = False
+
+# (current_name, next_name) -> (current geometry, next geometry, (exit_point, entry_point))
+transition_table = {}
+
+# TEMPLATE: Replace hardcoded PROFILING_ENABLED 'False' with Robot.profilingEnabled attribute from metamodel
+# Time the hot paths and publish the aggregates as Profile* properties; when off nothing is wrapped
+PROFILING_ENABLED = False
+
+# TEMPLATE: Replace hardcoded PROFILE_PUBLISH_INTERVAL '5.0' with Robot.profilePublishInterval attribute from metamodel
+# Simulated seconds between publications of the Profile* properties
+PROFILE_PUBLISH_INTERVAL = 5.0
+
+# Upper bounds (milliseconds) of the latency histogram buckets; a last bucket counts slower calls
+PROFILE_HISTOGRAM_BOUNDS = (0.1, 1.0, 10.0, 100.0)
+
+# Functions timed when profiling is enabled -> name used in their Profile* properties
+PROFILED_FUNCTIONS = {
+    'move_robot_incremental': 'MoveRobot',
+    'check_proximity': 'CheckProximity',
+    'check_velocity_obstacle_collision': 'VelocityObstacle',
+    'find_shortest_path_with_reservations': 'PathPlanning',
+    'handle_conveyor_interaction': 'PickupDropoff'
+}
+PROFILE_TICK_NAME = 'Tick'
+
+profile_stats = {}         # profile name -> {'calls', 'total', 'max', 'histogram'} with times in milliseconds
+profile_published = {'time': None}
+
+# TEMPLATE: Replace hardcoded TICK_INTERVAL '0.1' with Robot.controlCycle attribute from metamodel
+# Simulated seconds between two passes of the robot control loop
+TICK_INTERVAL = 0.1
+
+# TEMPLATE: Replace hardcoded PLANNING_TICK_BUDGET '0.05' with Robot.planningTickBudget attribute from metamodel
+# Wall-clock seconds into a tick after which no further route is planned; the rest wait for the next tick
+PLANNING_TICK_BUDGET = 0.05
+
+# Robots waiting for route planning, in round-robin order
+planning_queue = deque()
+planning_queued = set()
+planning_deferred = set()  # queued robots already counted as deferred past a tick budget
+
+# Control loop counters: ticks, ticks longer than TICK_INTERVAL, plans deferred to a later tick, longest tick
+scheduler_stats = {'ticks': 0, 'overruns': 0, 'deferred_plans': 0, 'max_tick_ms': 0.0}
+SCHEDULER_PROPERTY_NAMES = ('TickOverruns', 'DeferredPlans', 'PlanningQueueLength', 'MaxTickMs', 'RouteCacheHitRate')
+
+wall_clock = getattr(time, 'perf_counter', time.time)
+metric_properties = {}     # read-only metric property name -> property of this component
 
 # TEMPLATE: Replace hardcoded property names list with Robot.opcuaProperties attribute names from metamodel instances
 # List of property names to create for each robot
@@ -836,6 +1624,9 @@ property_names = [
 
 def OnStart():
     global comp
+    # OnRun flushes pending renders at its barrier and in every tick
+    set_render_flush_loop(True)
+    
     # TEMPLATE: Replace hardcoded property names 'RobotQuantity' and 'InitialPositions' with Robot.quantityPropertyName and Robot.positionsPropertyName attributes from metamodel
     # Setup property change handlers
     robot_quantity_prop = comp.getProperty('RobotQuantity')
@@ -845,16 +1636,135 @@ def OnStart():
     positions_prop = comp.getProperty('InitialPositions')
     if positions_prop:
         positions_prop.OnChanged = lambda prop: update_robot_positions()
+    
+    if PROFILING_ENABLED:
+        enable_profiling()
 
 # Function to get the robot's index based on its name
 def get_robot_index(robot_name):
-    if robot_name == 'Mobile Robot Resource':
-        return 1
-    else:
-        return int(robot_name.split('#')[-1])
+    robot_index = robot_index_by_name.get(robot_name)
+    if robot_index is None:
+        if robot_name == 'Mobile Robot Resource':
+            robot_index = 1
+        else:
+            robot_index = int(robot_name.split('#')[-1])
+        robot_index_by_name[robot_name] = robot_index
+    return robot_index
+
+def record_profile_sample(name, seconds):
+    """Add one timing to the call count, total, maximum and histogram of a profiled hot path"""
+    stats = profile_stats.get(name)
+    if stats is None:
+        stats = {'calls': 0, 'total': 0.0, 'max': 0.0, 'histogram': [0] * (len(PROFILE_HISTOGRAM_BOUNDS) + 1)}
+        profile_stats[name] = stats
+    milliseconds = seconds * 1000.0
+    stats['calls'] += 1
+    stats['total'] += milliseconds
+    if milliseconds > stats['max']:
+        stats['max'] = milliseconds
+    stats['histogram'][bisect.bisect_left(PROFILE_HISTOGRAM_BOUNDS, milliseconds)] += 1
+
+def profile_function(name, func):
+    """Wrap a function so every call is timed under the given profile name"""
+    def profiled(*args, **kwargs):
+        started = wall_clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_profile_sample(name, wall_clock() - started)
+    profiled.profiled_function = func
+    return profiled
+
+def enable_profiling():
+    """Rebind the profiled functions to timed wrappers; calls in this script look them up as globals"""
+    namespace = globals()
+    for function_name, name in PROFILED_FUNCTIONS.items():
+        if not hasattr(namespace[function_name], 'profiled_function'):
+            namespace[function_name] = profile_function(name, namespace[function_name])
+
+def set_metric_property(prop_type, prop_name, value):
+    """Write a read-only metric property of this component, creating it on first use"""
+    prop = metric_properties.get(prop_name)
+    if prop is None:
+        prop = comp.getProperty(prop_name)
+        if not prop:
+            prop = comp.createProperty(prop_type, prop_name)
+            # Published for monitoring only, the server and the user can not write them
+            prop.WritableWhenConnected = False
+            prop.WritableWhenDisconnected = False
+        metric_properties[prop_name] = prop
+    if prop.Value != value:
+        prop.Value = value
+
+def publish_profile_stats():
+    """Publish the profiling aggregates once per PROFILE_PUBLISH_INTERVAL of simulated time"""
+    now = sim.SimTime
+    if profile_published['time'] is not None and now - profile_published['time'] < PROFILE_PUBLISH_INTERVAL:
+        return
+    profile_published['time'] = now
+    for name, stats in profile_stats.items():
+        set_metric_property(VC_INTEGER, 'Profile{0}Calls'.format(name), stats['calls'])
+        set_metric_property(VC_REAL, 'Profile{0}TotalMs'.format(name), stats['total'])
+        set_metric_property(VC_REAL, 'Profile{0}MaxMs'.format(name), stats['max'])
+        set_metric_property(VC_STRING, 'Profile{0}Histogram'.format(name), ','.join(str(count) for count in stats['histogram']))
+
+def reset_profile_stats():
+    """Forget all timings and zero the published Profile* properties"""
+    profile_stats.clear()
+    profile_published['time'] = None
+    for prop_name, prop in metric_properties.items():
+        if prop_name.startswith('Profile'):
+            prop.Value = '' if prop.Type == VC_STRING else 0
+
+def record_readiness_metric(name, prop_name):
+    """Record a startup milestone once per run and publish its seconds since OnRun as a template property"""
+    if readiness_metrics[name] is not None or readiness_metrics['run_start'] is None:
+        return
+    readiness_metrics[name] = sim.SimTime
+    prop = comp.getProperty(prop_name)
+    if not prop:
+        prop = comp.createProperty(VC_REAL, prop_name)
+    prop.Value = readiness_metrics[name] - readiness_metrics['run_start']
+
+def register_robots():
+    """Rebuild the robot component <-> index registry from the robots list"""
+    robot_index_registry.clear()
+    robots_by_index.clear()
+    unregister_components('robot')
+    for robot in robots:
+        robot_index = get_robot_index(robot.Name)
+        robot_index_registry[id(robot)] = robot_index
+        robots_by_index[robot_index] = robot
+        register_component(robot, 'robot')
+
+def get_index_of_robot(robot):
+    """Robot index of a robot component without reading and parsing its name"""
+    robot_index = robot_index_registry.get(id(robot))
+    if robot_index is None:
+        robot_index = get_robot_index(robot.Name)
+    return robot_index
+
+def find_robot_by_index(robot_index):
+    return robots_by_index.get(robot_index)
 
 # Function to parse the InitialPositions string
 def parse_initial_positions(positions_str):
+    # Well-formed payloads go through the shared decoder; X, Y and Rz are returned as floats
+    decoded = decode_payload(positions_str)
+    if isinstance(decoded, list) and all(isinstance(entry, dict) for entry in decoded):
+        positions_list = []
+        for entry in decoded:
+            position_data = dict(entry)
+            for key in ['X', 'Y', 'Rz']:
+                if key in position_data:
+                    try:
+                        position_data[key] = float(position_data[key])
+                    except (TypeError, ValueError):
+                        position_data[key] = 0.0
+            positions_list.append(position_data)
+        return positions_list
+
+    # Otherwise split the string by hand
     positions_list = []
 
     # Remove newlines and spaces
@@ -909,18 +1819,17 @@ def clone_robots():
         except: pass
     cloned_robots = []
     robots = []
+    register_robots()
+    invalidate_robot_spatial_index()
 
     # Try to get positions from IdleProperties
-    idle_location_template = app.findComponent('_Template_IdleLocation')
+    idle_location_template = find_component('_Template_IdleLocation')
     positions_list = []
     
     if idle_location_template:
         idle_prop = idle_location_template.getProperty('idleProperties')
         if idle_prop and idle_prop.Value and idle_prop.Value != "[]":
-            try:
-                positions_list = eval(idle_prop.Value)
-            except:
-                pass
+            positions_list = decode_payload(idle_prop.Value) or []
     
     # If no positions from IdleProperties, use InitialPositions
     if not positions_list:
@@ -972,7 +1881,9 @@ def clone_robots():
             m.translateAbs(offset, 0, 0)
             robot.PositionMatrix = m
 
-    app.render()
+    register_robots()
+    request_render()
+    mark_layout_built('robot')
 
 def update_robot_positions():
     """Update robot positions when InitialPositions property changes"""
@@ -997,323 +1908,572 @@ def update_robot_positions():
             m.translateAbs(X, Y, 0.0)
             m.rotateRelZ(math.radians(Rz))
             robot.PositionMatrix = m
+    
+    invalidate_robot_spatial_index()
 
 # Helper functions
 def get_robot_property(prop_name, robot_index):
     global comp
-    unique_prop_name = '{0}{1}'.format(prop_name, robot_index)
-    prop = comp.getProperty(unique_prop_name)
+    key = (prop_name, robot_index)
+    prop = robot_property_handles.get(key)
+    if prop is None:
+        unique_prop_name = '{0}{1}'.format(prop_name, robot_index)
+        prop = comp.getProperty(unique_prop_name)
+        if prop:
+            robot_property_handles[key] = prop
     return prop
 
+def refresh_robot_snapshot():
+    """Start a new snapshot when the simulation time advanced, flushing the previous tick's writes first"""
+    current_time = sim.SimTime
+    if robot_snapshot['time'] == current_time:
+        return
+    flush_robot_writes()
+    robot_snapshot['values'] = {}
+    robot_snapshot['time'] = current_time
+
+def reset_robot_snapshot():
+    """Discard snapshot values, pending writes and last written values without applying them"""
+    robot_snapshot['time'] = None
+    robot_snapshot['values'] = {}
+    robot_snapshot['writes'] = {}
+    robot_snapshot['write_order'] = []
+    robot_last_written.clear()
+
+def flush_robot_writes():
+    """Write buffered robot property values to the host in the order they were first set, skipping unchanged values"""
+    writes = robot_snapshot['writes']
+    if not writes:
+        return
+    for key in robot_snapshot['write_order']:
+        value = writes[key]
+        if key[0] in SIM_OWNED_ROBOT_PROPERTIES:
+            if key in robot_last_written and robot_last_written[key] == value:
+                continue
+        prop = get_robot_property(key[0], key[1])
+        if not prop:
+            continue
+        # The server may have changed properties it shares with the simulation, so compare those live
+        if key[0] not in SIM_OWNED_ROBOT_PROPERTIES and prop.Value == value:
+            continue
+        prop.Value = value
+        if key[0] in SIM_OWNED_ROBOT_PROPERTIES:
+            robot_last_written[key] = value
+    robot_snapshot['writes'] = {}
+    robot_snapshot['write_order'] = []
+
 def set_robot_property(prop_name, value, robot_index):
     prop = get_robot_property(prop_name, robot_index)
     if prop:
-        prop.Value = value
+        # Buffer the write until the end of the tick; reads in this tick already see the new value
+        refresh_robot_snapshot()
+        key = (prop_name, robot_index)
+        if key not in robot_snapshot['writes']:
+            robot_snapshot['write_order'].append(key)
+        robot_snapshot['writes'][key] = value
+        robot_snapshot['values'][key] = value
+        if prop_name == 'Location':
+            update_robot_location_index(robot_index, value)
+        elif prop_name == 'NextLocation':
+            invalidate_fleet_directions()
 
 def get_robot_property_value(prop_name, robot_index):
+    refresh_robot_snapshot()
+    key = (prop_name, robot_index)
+    values = robot_snapshot['values']
+    if key in values:
+        return values[key]
+    
     prop = get_robot_property(prop_name, robot_index)
-    if prop:
-        return prop.Value
-    return None
+    value = prop.Value if prop else None
+    values[key] = value
+    return value
 
-def getRobotPosition(robot):
+def read_robot_position(robot):
     m = robot.WorldPositionMatrix
     return m.P
 
+def getRobotPosition(robot):
+    refresh_fleet_state()
+    row = fleet_state['names'].get(robot.Name)
+    if row is not None:
+        return fleet_state['positions'][row]
+    return read_robot_position(robot)
+
+def get_robot_grid_cell(x, y):
+    """Spatial index cell of a position; cells are one early detection zone wide"""
+    return (int(math.floor(x / EARLY_DETECTION_ZONE)), int(math.floor(y / EARLY_DETECTION_ZONE)))
+
+def invalidate_robot_spatial_index():
+    """Force the robot spatial index and fleet state to be rebuilt on their next query"""
+    robot_spatial_index['time'] = None
+    fleet_state['time'] = None
+
+def refresh_fleet_state():
+    """Read every robot position once per simulation tick"""
+    current_time = sim.SimTime
+    if fleet_state['time'] == current_time:
+        return
+    
+    rows = {}
+    names = {}
+    positions = []
+    for order, robot in enumerate(robots):
+        robot_name = robot.Name
+        rows[get_robot_index(robot_name)] = order
+        names[robot_name] = order
+        positions.append(read_robot_position(robot))
+    
+    fleet_state['rows'] = rows
+    fleet_state['names'] = names
+    fleet_state['robots'] = list(robots)
+    fleet_state['positions'] = positions
+    fleet_state['directions'] = None
+    fleet_state['matrices'] = None
+    fleet_state['time'] = current_time
+
+def invalidate_fleet_directions():
+    """Drop cached movement directions after a robot's NextLocation changed mid-tick"""
+    fleet_state['directions'] = None
+    fleet_state['matrices'] = None
+
+def get_fleet_directions():
+    """Movement direction of every robot in fleet row order"""
+    refresh_fleet_state()
+    directions = fleet_state['directions']
+    if directions is None:
+        directions = []
+        for robot, robot_pos in zip(fleet_state['robots'], fleet_state['positions']):
+            directions.append(calculate_movement_direction(robot_pos, get_index_of_robot(robot)))
+        fleet_state['directions'] = directions
+    return directions
+
+def get_fleet_matrices():
+    """NumPy pairwise distance, approach and heading matrices, or None when the scalar path is used"""
+    refresh_fleet_state()
+    if numpy is None or len(fleet_state['positions']) < FLEET_MATRIX_MIN_ROBOTS:
+        return None
+    
+    matrices = fleet_state['matrices']
+    if matrices is None:
+        positions = numpy.array([(p.X, p.Y, p.Z) for p in fleet_state['positions']], dtype=float)
+        directions = numpy.array([(d.X, d.Y, d.Z) if d else (0.0, 0.0, 0.0) for d in get_fleet_directions()], dtype=float)
+        
+        # offsets[i, j] is the vector from robot i to robot j
+        offsets = positions[numpy.newaxis, :, :] - positions[:, numpy.newaxis, :]
+        direction_x = directions[:, 0]
+        direction_y = directions[:, 1]
+        
+        matrices = {
+            'positions': positions,
+            'directions': directions,
+            # Euclidean distance between robots i and j
+            'distance': numpy.sqrt((offsets * offsets).sum(axis=2)),
+            # Projection of the offset to robot j on the movement direction of robot i
+            'approach': offsets[:, :, 0] * direction_x[:, numpy.newaxis] + offsets[:, :, 1] * direction_y[:, numpy.newaxis],
+            # Dot product of the movement directions of robots i and j
+            'heading': direction_x[:, numpy.newaxis] * direction_x[numpy.newaxis, :] + direction_y[:, numpy.newaxis] * direction_y[numpy.newaxis, :],
+            'future_distance': {}   # lookahead distance -> matrix
+        }
+        fleet_state['matrices'] = matrices
+    return matrices
+
+def get_robot_distance(robot_index, other_robot_index):
+    """Distance between two robots from this tick's fleet state"""
+    matrices = get_fleet_matrices()
+    rows = fleet_state['rows']
+    i = rows[robot_index]
+    j = rows[other_robot_index]
+    if matrices is not None:
+        return float(matrices['distance'][i, j])
+    positions = fleet_state['positions']
+    return vector_distance(positions[i], positions[j])
+
+def is_robot_approaching(robot_index, other_robot_index):
+    """True if robot_index is moving toward other_robot_index; False if it is not moving"""
+    matrices = get_fleet_matrices()
+    rows = fleet_state['rows']
+    i = rows[robot_index]
+    j = rows[other_robot_index]
+    if matrices is not None:
+        return bool(matrices['approach'][i, j] > 0)
+    direction = get_fleet_directions()[i]
+    if not direction:
+        return False
+    positions = fleet_state['positions']
+    return ((positions[j].X - positions[i].X) * direction.X + (positions[j].Y - positions[i].Y) * direction.Y) > 0
+
+def get_heading_dot(robot_index, other_robot_index):
+    """Dot product of two robots' movement directions; 0 if either is not moving"""
+    matrices = get_fleet_matrices()
+    rows = fleet_state['rows']
+    i = rows[robot_index]
+    j = rows[other_robot_index]
+    if matrices is not None:
+        return float(matrices['heading'][i, j])
+    directions = get_fleet_directions()
+    if not directions[i] or not directions[j]:
+        return 0
+    return directions[i].X * directions[j].X + directions[i].Y * directions[j].Y
+
+def get_future_robot_distance(robot_index, other_robot_index, lookahead):
+    """Distance between two robots after each travels lookahead units along its movement direction"""
+    matrices = get_fleet_matrices()
+    rows = fleet_state['rows']
+    i = rows[robot_index]
+    j = rows[other_robot_index]
+    if matrices is not None:
+        future_distance = matrices['future_distance'].get(lookahead)
+        if future_distance is None:
+            # Robots travel along their full 3-D direction, as vector_add does in the scalar path
+            future = matrices['positions'] + matrices['directions'] * lookahead
+            offsets = future[numpy.newaxis, :, :] - future[:, numpy.newaxis, :]
+            future_distance = numpy.sqrt((offsets * offsets).sum(axis=2))
+            matrices['future_distance'][lookahead] = future_distance
+        return float(future_distance[i, j])
+    positions = fleet_state['positions']
+    directions = get_fleet_directions()
+    self_future_pos = vector_add(positions[i], vector_multiply(directions[i], lookahead)) if directions[i] else positions[i]
+    other_future_pos = vector_add(positions[j], vector_multiply(directions[j], lookahead)) if directions[j] else positions[j]
+    return vector_distance(self_future_pos, other_future_pos)
+
+def count_robots_near_point(x, y, radius):
+    """Number of robots whose XY position lies strictly within radius of (x, y)"""
+    matrices = get_fleet_matrices()
+    if matrices is not None:
+        positions = matrices['positions']
+        planar_distance = numpy.sqrt((positions[:, 0] - x) ** 2 + (positions[:, 1] - y) ** 2)
+        return int(numpy.count_nonzero(planar_distance < radius))
+    count = 0
+    for robot_pos in fleet_state['positions']:
+        if ((robot_pos.X - x) ** 2 + (robot_pos.Y - y) ** 2) ** 0.5 < radius:
+            count += 1
+    return count
+
+def refresh_robot_spatial_index():
+    """Rebuild the robot spatial hash once per simulation tick"""
+    current_time = sim.SimTime
+    if robot_spatial_index['time'] == current_time:
+        return
+    
+    refresh_fleet_state()
+    cells = {}
+    for order, robot in enumerate(fleet_state['robots']):
+        robot_index = get_index_of_robot(robot)
+        robot_pos = fleet_state['positions'][order]
+        cells.setdefault(get_robot_grid_cell(robot_pos.X, robot_pos.Y), []).append((order, robot, robot_index, robot_pos))
+    
+    robot_spatial_index['cells'] = cells
+    robot_spatial_index['by_location'] = None
+    robot_spatial_index['time'] = current_time
+
+def update_robot_location_index(robot_index, location):
+    """Keep the per-location buckets current when a robot's Location is written mid-tick"""
+    by_location = robot_spatial_index['by_location']
+    if by_location is None:
+        return
+    for indices in by_location.values():
+        if robot_index in indices:
+            indices.remove(robot_index)
+            break
+    by_location.setdefault(location, []).append(robot_index)
+
+def find_robots_near(position, radius):
+    """Return (robot, robot_index, position) for robots within radius of position, in robots list order"""
+    refresh_robot_spatial_index()
+    cells = robot_spatial_index['cells']
+    cell_x, cell_y = get_robot_grid_cell(position.X, position.Y)
+    span = int(math.ceil(radius / float(EARLY_DETECTION_ZONE)))
+    radius_squared = radius * radius
+    
+    nearby = []
+    for dx in range(-span, span + 1):
+        for dy in range(-span, span + 1):
+            for entry in cells.get((cell_x + dx, cell_y + dy), ()):
+                other_pos = entry[3]
+                if (other_pos.X - position.X) ** 2 + (other_pos.Y - position.Y) ** 2 <= radius_squared:
+                    nearby.append(entry)
+    nearby.sort(key=lambda entry: entry[0])
+    return [(robot, robot_index, robot_pos) for _, robot, robot_index, robot_pos in nearby]
+
+def find_robots_at_location(location):
+    """Return indices of robots whose Location property equals location"""
+    refresh_robot_spatial_index()
+    by_location = robot_spatial_index['by_location']
+    if by_location is None:
+        by_location = {}
+        for robot in robots:
+            robot_index = get_index_of_robot(robot)
+            by_location.setdefault(get_robot_property_value('Location', robot_index), []).append(robot_index)
+        robot_spatial_index['by_location'] = by_location
+    return list(by_location.get(location, ()))
+
+class Vec3(object):
+    """Script-side vector; only converted to a vcVector where a position is handed to the VC API"""
+    __slots__ = ('X', 'Y', 'Z')
+    
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.X = x
+        self.Y = y
+        self.Z = z
+
+def to_vc_vector(v):
+    """Convert any vector with X, Y and Z to a vcVector"""
+    return vcVector.new(v.X, v.Y, v.Z)
+
 def normalize_vector(v):
-    length = math.sqrt(v.X**2 + v.Y**2 + v.Z**2)
+    length = math.sqrt(v.X * v.X + v.Y * v.Y + v.Z * v.Z)
     if length == 0:
-        return vcVector.new(0, 0, 0)
-    return vcVector.new(v.X / length, v.Y / length, v.Z / length)
+        return Vec3(0, 0, 0)
+    return Vec3(v.X / length, v.Y / length, v.Z / length)
 
 def vector_add(v1, v2):
-    return vcVector.new(v1.X + v2.X, v1.Y + v2.Y, v1.Z + v2.Z)
+    return Vec3(v1.X + v2.X, v1.Y + v2.Y, v1.Z + v2.Z)
 
 def vector_subtract(v1, v2):
-    return vcVector.new(v1.X - v2.X, v1.Y - v2.Y, v1.Z - v2.Z)
+    return Vec3(v1.X - v2.X, v1.Y - v2.Y, v1.Z - v2.Z)
 
 def vector_multiply(v, scalar):
-    return vcVector.new(v.X * scalar, v.Y * scalar, v.Z * scalar)
+    return Vec3(v.X * scalar, v.Y * scalar, v.Z * scalar)
 
 def vector_length(v):
-    return math.sqrt(v.X**2 + v.Y**2 + v.Z**2)
+    return math.sqrt(v.X * v.X + v.Y * v.Y + v.Z * v.Z)
+
+def vector_distance_squared(v1, v2):
+    """Squared distance between two points, without building the difference vector"""
+    dx = v1.X - v2.X
+    dy = v1.Y - v2.Y
+    dz = v1.Z - v2.Z
+    return dx * dx + dy * dy + dz * dz
+
+def vector_distance(v1, v2):
+    return math.sqrt(vector_distance_squared(v1, v2))
+
+def vector_lerp(v1, v2, t):
+    """Point at fraction t of the way from v1 to v2"""
+    return Vec3(v1.X + (v2.X - v1.X) * t, v1.Y + (v2.Y - v1.Y) * t, v1.Z + (v2.Z - v1.Z) * t)
+
+def get_matrix_key(m):
+    """Comparable snapshot of a position matrix origin and direction"""
+    return (m.P.X, m.P.Y, m.P.Z, m.N.X, m.N.Y, m.N.Z)
+
+def build_pathway_geometry(component, m):
+    """Read position and size of a pathway, idle location or conveyor into a geometry record"""
+    length1 = component.getProperty('Length1').Value if component.getProperty('Length1') else 0
+    length2 = component.getProperty('Length2').Value if component.getProperty('Length2') else 0
+    width1 = component.getProperty('Width1').Value if component.getProperty('Width1') else 0
+    width2 = component.getProperty('Width2').Value if component.getProperty('Width2') else 0
+    
+    if is_conveyor(component.Name):
+        conveyor_length = component.getProperty('ConveyorLength').Value if component.getProperty('ConveyorLength') else 0
+        conveyor_width = component.getProperty('ConveyorWidth').Value if component.getProperty('ConveyorWidth') else 0
+        length1 = length2 = conveyor_length / 2
+        width1 = width2 = conveyor_width
+    
+    center = m.P
+    direction = normalize_vector(m.N)
+    perpendicular = Vec3(-direction.Y, direction.X, 0)
+    start_center = vector_subtract(center, vector_multiply(direction, length1))
+    end_center = vector_add(center, vector_multiply(direction, length2))
+    max_width = max(width1, width2) if width1 and width2 else 1000
+    half_width = max_width / 2
+    side_offset = vector_multiply(perpendicular, half_width)
+    # start-left, end-left, end-right, start-right
+    corners = [
+        vector_add(start_center, side_offset),
+        vector_add(end_center, side_offset),
+        vector_subtract(end_center, side_offset),
+        vector_subtract(start_center, side_offset)
+    ]
+    
+    return {
+        'matrix': get_matrix_key(m),
+        'version': pathway_graph_version,
+        'checked': sim.SimTime,
+        'center': center,
+        'direction': direction,
+        'perpendicular': perpendicular,
+        'length1': length1,
+        'length2': length2,
+        'width1': width1,
+        'width2': width2,
+        'start_center': start_center,
+        'end_center': end_center,
+        'half_width': half_width,
+        'corners': corners,
+        'edges': [(corners[i], corners[(i + 1) % 4]) for i in range(4)]
+    }
+
+def get_pathway_geometry(component):
+    """Return the geometry record of a component, rebuilding it when it moved or the layout version changed"""
+    record = pathway_geometry_cache.get(component.Name)
+    current_time = sim.SimTime
+    if record and record['version'] == pathway_graph_version:
+        # Size properties only change through the layout scripts, which publish a new LayoutVersion
+        if record['checked'] == current_time:
+            return record
+        m = component.WorldPositionMatrix
+        if record['matrix'] == get_matrix_key(m):
+            record['checked'] = current_time
+            return record
+    else:
+        m = component.WorldPositionMatrix
+    
+    record = build_pathway_geometry(component, m)
+    pathway_geometry_cache[component.Name] = record
+    return record
+
+def get_segment_parameter(point, a, b):
+    """Parameter in [0, 1] of the point on segment a-b closest to point, in the XY plane"""
+    dx = b.X - a.X
+    dy = b.Y - a.Y
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return 0.0
+    t = ((point.X - a.X) * dx + (point.Y - a.Y) * dy) / float(length_squared)
+    return min(1.0, max(0.0, t))
+
+def get_closest_segment_parameters(a, b, c, d):
+    """Parameters (s, t) of the closest points between segments a-b and c-d in the XY plane"""
+    rx = b.X - a.X
+    ry = b.Y - a.Y
+    qx = d.X - c.X
+    qy = d.Y - c.Y
+    denominator = rx * qy - ry * qx
+    if denominator != 0:
+        # Segments that cross touch at their intersection point
+        s = ((c.X - a.X) * qy - (c.Y - a.Y) * qx) / float(denominator)
+        t = ((c.X - a.X) * ry - (c.Y - a.Y) * rx) / float(denominator)
+        if 0 <= s <= 1 and 0 <= t <= 1:
+            return s, t
+    
+    # Otherwise the closest pair always involves an endpoint of one of the segments
+    candidates = [
+        (0.0, get_segment_parameter(a, c, d)),
+        (1.0, get_segment_parameter(b, c, d)),
+        (get_segment_parameter(c, a, b), 0.0),
+        (get_segment_parameter(d, a, b), 1.0)
+    ]
+    
+    def squared_gap(parameters):
+        s, t = parameters
+        gap_x = (a.X + rx * s) - (c.X + qx * t)
+        gap_y = (a.Y + ry * s) - (c.Y + qy * t)
+        return gap_x * gap_x + gap_y * gap_y
+    
+    return min(candidates, key=squared_gap)
+
+def find_closest_boundary_point(geometry, point):
+    """Exact closest point on the footprint boundary of a pathway or conveyor to a given point"""
+    best_distance = None
+    best_edge = None
+    best_t = 0.0
+    for edge in geometry['edges']:
+        t = get_segment_parameter(point, edge[0], edge[1])
+        x = edge[0].X + (edge[1].X - edge[0].X) * t
+        y = edge[0].Y + (edge[1].Y - edge[0].Y) * t
+        distance_squared = (x - point.X) ** 2 + (y - point.Y) ** 2
+        if best_distance is None or distance_squared < best_distance:
+            best_distance = distance_squared
+            best_edge = edge
+            best_t = t
+    return vector_lerp(best_edge[0], best_edge[1], best_t)
+
+def find_closest_boundary_points(geometry, other_geometry, reference_point):
+    """Exact closest pair of points between the footprint boundaries of two oriented rectangles
+    
+    Overlapping footprints touch at several boundary crossings; the one nearest reference_point is used.
+    """
+    tolerance = 1e-6
+    best = None
+    for a, b in geometry['edges']:
+        for c, d in other_geometry['edges']:
+            s, t = get_closest_segment_parameters(a, b, c, d)
+            x = a.X + (b.X - a.X) * s
+            y = a.Y + (b.Y - a.Y) * s
+            gap_x = x - (c.X + (d.X - c.X) * t)
+            gap_y = y - (c.Y + (d.Y - c.Y) * t)
+            gap = gap_x * gap_x + gap_y * gap_y
+            reference_distance = (x - reference_point.X) ** 2 + (y - reference_point.Y) ** 2
+            if best is None or gap < best[0] - tolerance or (gap <= best[0] + tolerance and reference_distance < best[1]):
+                best = (gap, reference_distance, a, b, s, c, d, t)
+    
+    _, _, a, b, s, c, d, t = best
+    return vector_lerp(a, b, s), vector_lerp(c, d, t)
 
 def find_shortest_transition_point(robot_pos, current_pathway, next_pathway):
-    """Find the shortest transition point between current pathway and next pathway/destination - optimized for performance"""
+    """Find the shortest transition point between current pathway and next pathway/destination"""
     # Get current pathway geometry
-    curr_pos = current_pathway.WorldPositionMatrix.P
-    curr_length1 = current_pathway.getProperty('Length1').Value if current_pathway.getProperty('Length1') else 0
-    curr_length2 = current_pathway.getProperty('Length2').Value if current_pathway.getProperty('Length2') else 0
-    curr_width1 = current_pathway.getProperty('Width1').Value if current_pathway.getProperty('Width1') else 0
-    curr_width2 = current_pathway.getProperty('Width2').Value if current_pathway.getProperty('Width2') else 0
-    
-    if is_conveyor(current_pathway.Name):
-        conveyor_length = current_pathway.getProperty('ConveyorLength').Value if current_pathway.getProperty('ConveyorLength') else 0
-        conveyor_width = current_pathway.getProperty('ConveyorWidth').Value if current_pathway.getProperty('ConveyorWidth') else 0
-        curr_length1 = curr_length2 = conveyor_length / 2
-        curr_width1 = curr_width2 = conveyor_width
-
-    curr_N = current_pathway.WorldPositionMatrix.N
-    curr_direction = normalize_vector(curr_N)
-    curr_perpendicular = vcVector.new(-curr_direction.Y, curr_direction.X, 0)
-    
-    # Calculate current pathway boundary points
-    curr_start_center = vector_subtract(curr_pos, vector_multiply(curr_direction, curr_length1))
-    curr_end_center = vector_add(curr_pos, vector_multiply(curr_direction, curr_length2))
-    curr_max_width = max(curr_width1, curr_width2) if curr_width1 and curr_width2 else 1000
-    curr_half_width = curr_max_width / 2
-    
-    # OPTIMIZED: Reduced points for better performance - only essential boundary points
-    current_boundary_points = []
-    
-    # Long sides (left and right edges) - reduced from 11 to 6 points
-    for i in range(6):  # 6 points along each long side
-        t = i / 5.0
-        # Left edge
-        left_point = vector_add(
-            vector_add(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width)),
-            vector_multiply(vector_subtract(
-                vector_add(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                vector_add(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width))
-            ), t)
-        )
-        current_boundary_points.append(left_point)
-        
-        # Right edge
-        right_point = vector_add(
-            vector_subtract(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width)),
-            vector_multiply(vector_subtract(
-                vector_subtract(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                vector_subtract(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width))
-            ), t)
-        )
-        current_boundary_points.append(right_point)
-    
-    # Short sides (start and end edges) - reduced from 7 to 4 points
-    for i in range(4):  # 4 points along each short side
-        t = i / 3.0
-        # Start edge (short side)
-        start_point = vector_add(
-            vector_add(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width)),
-            vector_multiply(vector_subtract(
-                vector_subtract(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                vector_add(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width))
-            ), t)
-        )
-        current_boundary_points.append(start_point)
-        
-        # End edge (short side)
-        end_point = vector_add(
-            vector_add(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width)),
-            vector_multiply(vector_subtract(
-                vector_subtract(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                vector_add(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width))
-            ), t)
-        )
-        current_boundary_points.append(end_point)
+    curr_geometry = get_pathway_geometry(current_pathway)
+    curr_pos = curr_geometry['center']
     
     # Get next pathway/destination position
     if next_pathway:
-        next_pos = next_pathway.WorldPositionMatrix.P
-        
-        # If next is also a pathway (not conveyor), find closest boundary-to-boundary distance
-        if next_pathway.Name.startswith('Pathway Area') or next_pathway.Name.startswith('Idle Location'):
-            # Get next pathway geometry
-            next_length1 = next_pathway.getProperty('Length1').Value if next_pathway.getProperty('Length1') else 0
-            next_length2 = next_pathway.getProperty('Length2').Value if next_pathway.getProperty('Length2') else 0
-            next_width1 = next_pathway.getProperty('Width1').Value if next_pathway.getProperty('Width1') else 0
-            next_width2 = next_pathway.getProperty('Width2').Value if next_pathway.getProperty('Width2') else 0
-            
-            next_N = next_pathway.WorldPositionMatrix.N
-            next_direction = normalize_vector(next_N)
-            next_perpendicular = vcVector.new(-next_direction.Y, next_direction.X, 0)
-            
-            next_start_center = vector_subtract(next_pos, vector_multiply(next_direction, next_length1))
-            next_end_center = vector_add(next_pos, vector_multiply(next_direction, next_length2))
-            next_max_width = max(next_width1, next_width2) if next_width1 and next_width2 else 1000
-            next_half_width = next_max_width / 2
-            
-            # Create boundary points for next pathway - OPTIMIZED
-            next_boundary_points = []
-            
-            # Long sides of next pathway - reduced from 11 to 6 points
-            for i in range(6):
-                t = i / 5.0
-                # Left edge
-                left_point = vector_add(
-                    vector_add(next_start_center, vector_multiply(next_perpendicular, next_half_width)),
-                    vector_multiply(vector_subtract(
-                        vector_add(next_end_center, vector_multiply(next_perpendicular, next_half_width)),
-                        vector_add(next_start_center, vector_multiply(next_perpendicular, next_half_width))
-                    ), t)
-                )
-                next_boundary_points.append(left_point)
-                
-                # Right edge
-                right_point = vector_add(
-                    vector_subtract(next_start_center, vector_multiply(next_perpendicular, next_half_width)),
-                    vector_multiply(vector_subtract(
-                        vector_subtract(next_end_center, vector_multiply(next_perpendicular, next_half_width)),
-                        vector_subtract(next_start_center, vector_multiply(next_perpendicular, next_half_width))
-                    ), t)
-                )
-                next_boundary_points.append(right_point)
-            
-            # Short sides of next pathway - reduced from 7 to 4 points
-            for i in range(4):
-                t = i / 3.0
-                # Start edge
-                start_point = vector_add(
-                    vector_add(next_start_center, vector_multiply(next_perpendicular, next_half_width)),
-                    vector_multiply(vector_subtract(
-                        vector_subtract(next_start_center, vector_multiply(next_perpendicular, next_half_width)),
-                        vector_add(next_start_center, vector_multiply(next_perpendicular, next_half_width))
-                    ), t * 3.0 / 3.0)
-                )
-                next_boundary_points.append(start_point)
-                
-                end_point = vector_add(
-                    vector_add(next_end_center, vector_multiply(next_perpendicular, next_half_width)),
-                    vector_multiply(vector_subtract(
-                        vector_subtract(next_end_center, vector_multiply(next_perpendicular, next_half_width)),
-                        vector_add(next_end_center, vector_multiply(next_perpendicular, next_half_width))
-                    ), t * 3.0 / 3.0)
-                )
-                next_boundary_points.append(end_point)
-            
-            # Find the shortest distance between any two boundary points
-            min_distance = float('inf')
-            best_current_point = None
-            best_next_point = None
-            
-            for curr_point in current_boundary_points:
-                for next_point in next_boundary_points:
-                    distance = vector_length(vector_subtract(next_point, curr_point))
-                    if distance < min_distance:
-                        min_distance = distance
-                        best_current_point = curr_point
-                        best_next_point = next_point
-            
-            return best_current_point, best_next_point
+        next_geometry = get_pathway_geometry(next_pathway)
         
-        else:
-            # Next is a conveyor - find closest point on current pathway to conveyor center
-            best_exit_point = min(current_boundary_points, 
-                                key=lambda p: vector_length(vector_subtract(next_pos, p)))
-            return best_exit_point, next_pos
+        # The result only depends on the two footprints, so reuse it while neither record was rebuilt
+        key = (current_pathway.Name, next_pathway.Name)
+        entry = transition_table.get(key)
+        if entry and entry[0] is curr_geometry and entry[1] is next_geometry:
+            return entry[2]
+        
+        transition = calculate_transition_points(curr_geometry, next_geometry, next_pathway.Name)
+        transition_table[key] = (curr_geometry, next_geometry, transition)
+        return transition
     
     else:
         # No next pathway - use pathway center as default
         return curr_pos, curr_pos
 
+def calculate_transition_points(curr_geometry, next_geometry, next_name):
+    """Exit point on the current footprint and entry point on the next pathway or conveyor"""
+    next_pos = next_geometry['center']
+    
+    # If next is also a pathway (not conveyor), find closest boundary-to-boundary points
+    if next_name.startswith('Pathway Area') or next_name.startswith('Idle Location'):
+        # Overlapping footprints are resolved toward the midpoint of both centers
+        midpoint = vector_lerp(curr_geometry['center'], next_pos, 0.5)
+        return find_closest_boundary_points(curr_geometry, next_geometry, midpoint)
+    
+    else:
+        # Next is a conveyor - find closest point on current pathway to conveyor center
+        return find_closest_boundary_point(curr_geometry, next_pos), next_pos
+
+def precompute_transition_table():
+    """Compute transition points for every connected pathway pair of the current pathway graph"""
+    components = {}
+    for name in pathway_neighbors:
+        components[name] = find_component(name)
+    
+    for name, neighbors in pathway_neighbors.items():
+        if not components[name]:
+            continue
+        for neighbor in neighbors:
+            next_component = components.get(neighbor['Name'])
+            if next_component:
+                find_shortest_transition_point(None, components[name], next_component)
+
 def calculate_smart_entry_exit_points(robot_pos, current_pathway, next_pathway=None, previous_pathway=None):
     """Calculate smart entry and exit points focusing on shortest transitions"""
+    curr_geometry = get_pathway_geometry(current_pathway)
     
     # Find the optimal transition point to next pathway
     if next_pathway:
         exit_point, next_entry_point = find_shortest_transition_point(robot_pos, current_pathway, next_pathway)
     else:
         # No next pathway - just find closest boundary point to robot
-        curr_pos = current_pathway.WorldPositionMatrix.P
-        exit_point = curr_pos  # Default to center
+        exit_point = curr_geometry['center']  # Default to center
     
     # For entry point, find the closest accessible point on current pathway boundary
     # (This will be used when robot is outside the pathway)
-    curr_pos = current_pathway.WorldPositionMatrix.P
-    curr_length1 = current_pathway.getProperty('Length1').Value if current_pathway.getProperty('Length1') else 0
-    curr_length2 = current_pathway.getProperty('Length2').Value if current_pathway.getProperty('Length2') else 0
-    curr_width1 = current_pathway.getProperty('Width1').Value if current_pathway.getProperty('Width1') else 0
-    curr_width2 = current_pathway.getProperty('Width2').Value if current_pathway.getProperty('Width2') else 0
-    
-    if is_conveyor(current_pathway.Name):
-        conveyor_length = current_pathway.getProperty('ConveyorLength').Value if current_pathway.getProperty('ConveyorLength') else 0
-        conveyor_width = current_pathway.getProperty('ConveyorWidth').Value if current_pathway.getProperty('ConveyorWidth') else 0
-        curr_length1 = curr_length2 = conveyor_length / 2
-        curr_width1 = curr_width2 = conveyor_width
-
-    curr_N = current_pathway.WorldPositionMatrix.N
-    curr_direction = normalize_vector(curr_N)
-    curr_perpendicular = vcVector.new(-curr_direction.Y, curr_direction.X, 0)
-    
-    curr_start_center = vector_subtract(curr_pos, vector_multiply(curr_direction, curr_length1))
-    curr_end_center = vector_add(curr_pos, vector_multiply(curr_direction, curr_length2))
-    curr_max_width = max(curr_width1, curr_width2) if curr_width1 and curr_width2 else 1000
-    curr_half_width = curr_max_width / 2
-    
-    # Create all boundary points for entry consideration
-    entry_candidate_points = []
-    
-    # Add points along all edges - OPTIMIZED for performance
-    for i in range(5):  # Reduced from 8 to 5 points along each edge
-        t = i / 4.0
-        
-        # Long sides
-        left_point = vector_add(
-            vector_add(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width)),
-            vector_multiply(vector_subtract(
-                vector_add(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                vector_add(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width))
-            ), t)
-        )
-        entry_candidate_points.append(left_point)
-        
-        right_point = vector_add(
-            vector_subtract(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width)),
-            vector_multiply(vector_subtract(
-                vector_subtract(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                vector_subtract(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width))
-            ), t)
-        )
-        entry_candidate_points.append(right_point)
-        
-        # Short sides - fewer points
-        if i < 3:  # Reduced from 5 to 3 points on short sides
-            start_point = vector_add(
-                vector_add(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                vector_multiply(vector_subtract(
-                    vector_subtract(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                    vector_add(curr_start_center, vector_multiply(curr_perpendicular, curr_half_width))
-                ), t * 2.0 / 2.0)
-            )
-            entry_candidate_points.append(start_point)
-            
-            end_point = vector_add(
-                vector_add(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                vector_multiply(vector_subtract(
-                    vector_subtract(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width)),
-                    vector_add(curr_end_center, vector_multiply(curr_perpendicular, curr_half_width))
-                ), t * 2.0 / 2.0)
-            )
-            entry_candidate_points.append(end_point)
-    
-    # Find best entry point (closest to robot)
-    entry_point = min(entry_candidate_points, key=lambda p: vector_length(vector_subtract(p, robot_pos)))
+    entry_point = find_closest_boundary_point(curr_geometry, robot_pos)
     
     return entry_point, exit_point
 
 def calculate_intelligent_pathway_points(robot_pos, current_pathway, next_pathway=None, previous_pathway=None):
     """Calculate intelligent turning and transition points within pathways for optimal movement"""
-    pos = current_pathway.WorldPositionMatrix.P
-    length1 = current_pathway.getProperty('Length1').Value if current_pathway.getProperty('Length1') else 0
-    length2 = current_pathway.getProperty('Length2').Value if current_pathway.getProperty('Length2') else 0
-    width1 = current_pathway.getProperty('Width1').Value if current_pathway.getProperty('Width1') else 0
-    width2 = current_pathway.getProperty('Width2').Value if current_pathway.getProperty('Width2') else 0
-    
-    if is_conveyor(current_pathway.Name):
-        conveyor_length = current_pathway.getProperty('ConveyorLength').Value if current_pathway.getProperty('ConveyorLength') else 0
-        conveyor_width = current_pathway.getProperty('ConveyorWidth').Value if current_pathway.getProperty('ConveyorWidth') else 0
-        length1 = length2 = conveyor_length / 2
-        width1 = width2 = conveyor_width
-
-    N = current_pathway.WorldPositionMatrix.N
-    direction_vector = normalize_vector(N)
-    perpendicular_vector = vcVector.new(-direction_vector.Y, direction_vector.X, 0)
-    
-    # Calculate pathway boundaries
-    start_center = vector_subtract(pos, vector_multiply(direction_vector, length1))
-    end_center = vector_add(pos, vector_multiply(direction_vector, length2))
-    max_width = max(width1, width2) if width1 and width2 else 1000
-    half_width = max_width / 2
+    geometry = get_pathway_geometry(current_pathway)
+    pos = geometry['center']
     
     # Use the improved shortest transition point calculation
     if next_pathway:
@@ -1323,61 +2483,14 @@ def calculate_intelligent_pathway_points(robot_pos, current_pathway, next_pathwa
         # Default to pathway center if no next pathway
         exit_point = pos
     
-    # Find optimal entry point from available boundary points
-    entry_candidates = []
-    
-    # Create boundary points for entry consideration (optimized coverage)
-    for i in range(6):  # Reduced from 10 to 6 points along each edge
-        t = i / 5.0  # 0 to 1
-        
-        # Long edges (left and right sides)
-        left_point = vector_add(
-            vector_add(start_center, vector_multiply(perpendicular_vector, half_width)),
-            vector_multiply(vector_subtract(
-                vector_add(end_center, vector_multiply(perpendicular_vector, half_width)),
-                vector_add(start_center, vector_multiply(perpendicular_vector, half_width))
-            ), t)
-        )
-        entry_candidates.append(left_point)
-        
-        right_point = vector_add(
-            vector_subtract(start_center, vector_multiply(perpendicular_vector, half_width)),
-            vector_multiply(vector_subtract(
-                vector_subtract(end_center, vector_multiply(perpendicular_vector, half_width)),
-                vector_subtract(start_center, vector_multiply(perpendicular_vector, half_width))
-            ), t)
-        )
-        entry_candidates.append(right_point)
-        
-        # Short edges (start and end sides) - fewer points
-        if i < 4:  # Reduced from 6 to 4 points along short edges
-            t_short = i / 3.0
-            start_edge_point = vector_add(
-                vector_add(start_center, vector_multiply(perpendicular_vector, half_width)),
-                vector_multiply(vector_subtract(
-                    vector_subtract(start_center, vector_multiply(perpendicular_vector, half_width)),
-                    vector_add(start_center, vector_multiply(perpendicular_vector, half_width))
-                ), t_short)
-            )
-            entry_candidates.append(start_edge_point)
-            
-            end_edge_point = vector_add(
-                vector_add(end_center, vector_multiply(perpendicular_vector, half_width)),
-                vector_multiply(vector_subtract(
-                    vector_subtract(end_center, vector_multiply(perpendicular_vector, half_width)),
-                    vector_add(end_center, vector_multiply(perpendicular_vector, half_width))
-                ), t_short)
-            )
-            entry_candidates.append(end_edge_point)
-    
-    # Find best entry point (closest to robot)
-    entry_point = min(entry_candidates, key=lambda p: vector_length(vector_subtract(p, robot_pos)))
+    # Find best entry point (closest point on the pathway boundary to the robot)
+    entry_point = find_closest_boundary_point(geometry, robot_pos)
     
     # Calculate intermediate points for smooth navigation
     intermediate_points = []
     
     # Calculate distance between entry and exit
-    entry_to_exit_distance = vector_length(vector_subtract(exit_point, entry_point))
+    entry_to_exit_distance = vector_distance(exit_point, entry_point)
     
     # Only add intermediate points if the path is long enough to benefit from them
     if entry_to_exit_distance > 2000:  # If path is longer than 2000 units
@@ -1396,7 +2509,7 @@ def calculate_intelligent_pathway_points(robot_pos, current_pathway, next_pathwa
             if dot_product < 0.6:
                 # Add strategic intermediate point for smoother turning
                 # Position it 30% along the path and slightly toward center
-                intermediate = vector_add(entry_point, vector_multiply(vector_subtract(exit_point, entry_point), 0.3))
+                intermediate = vector_lerp(entry_point, exit_point, 0.3)
                 
                 # Adjust toward pathway center for smoother navigation
                 direction_to_center = vector_subtract(pos, intermediate)
@@ -1426,32 +2539,16 @@ def get_optimal_pathway_direction(robot, robot_index, current_pathway, pathways,
 def find_pathway_intersection_point(current_pathway, next_pathway):
     """Find the optimal intersection point between two pathways for smooth transitions"""
     # Get current pathway geometry
-    current_pos = current_pathway.WorldPositionMatrix.P
-    current_length1 = current_pathway.getProperty('Length1').Value if current_pathway.getProperty('Length1') else 0
-    current_length2 = current_pathway.getProperty('Length2').Value if current_pathway.getProperty('Length2') else 0
-    
-    if is_conveyor(current_pathway.Name):
-        conveyor_length = current_pathway.getProperty('ConveyorLength').Value if current_pathway.getProperty('ConveyorLength') else 0
-        current_length1 = current_length2 = conveyor_length / 2
-
-    current_N = current_pathway.WorldPositionMatrix.N
-    current_direction = normalize_vector(current_N)
-    current_start = vector_subtract(current_pos, vector_multiply(current_direction, current_length1))
-    current_end = vector_add(current_pos, vector_multiply(current_direction, current_length2))
+    current_geometry = get_pathway_geometry(current_pathway)
+    current_pos = current_geometry['center']
+    current_start = current_geometry['start_center']
+    current_end = current_geometry['end_center']
     
     # Get next pathway geometry
-    next_pos = next_pathway.WorldPositionMatrix.P
-    next_length1 = next_pathway.getProperty('Length1').Value if next_pathway.getProperty('Length1') else 0
-    next_length2 = next_pathway.getProperty('Length2').Value if next_pathway.getProperty('Length2') else 0
-    
-    if is_conveyor(next_pathway.Name):
-        conveyor_length = next_pathway.getProperty('ConveyorLength').Value if next_pathway.getProperty('ConveyorLength') else 0
-        next_length1 = next_length2 = conveyor_length / 2
-
-    next_N = next_pathway.WorldPositionMatrix.N
-    next_direction = normalize_vector(next_N)
-    next_start = vector_subtract(next_pos, vector_multiply(next_direction, next_length1))
-    next_end = vector_add(next_pos, vector_multiply(next_direction, next_length2))
+    next_geometry = get_pathway_geometry(next_pathway)
+    next_pos = next_geometry['center']
+    next_start = next_geometry['start_center']
+    next_end = next_geometry['end_center']
     
     # Find the closest points between the two pathways
     potential_intersections = [
@@ -1467,7 +2564,7 @@ def find_pathway_intersection_point(current_pathway, next_pathway):
     best_intersection = None
     
     for current_point, next_point in potential_intersections:
-        distance = vector_length(vector_subtract(current_point, next_point))
+        distance = vector_distance(current_point, next_point)
         if distance < min_distance:
             min_distance = distance
             best_intersection = (current_point, next_point)
@@ -1475,16 +2572,16 @@ def find_pathway_intersection_point(current_pathway, next_pathway):
     # Return the midpoint of the best intersection
     if best_intersection:
         current_point, next_point = best_intersection
-        midpoint = vector_add(current_point, vector_multiply(vector_subtract(next_point, current_point), 0.5))
+        midpoint = vector_lerp(current_point, next_point, 0.5)
         return midpoint
     
     # Fallback to pathway centers
-    return vector_add(current_pos, vector_multiply(vector_subtract(next_pos, current_pos), 0.5))
+    return vector_lerp(current_pos, next_pos, 0.5)
 
 def can_transition_directly(robot_pos, current_pathway, next_pathway, transition_threshold=1500):
     """Check if robot can transition directly between pathways without going to endpoints"""
     intersection_point = find_pathway_intersection_point(current_pathway, next_pathway)
-    distance_to_intersection = vector_length(vector_subtract(robot_pos, intersection_point))
+    distance_to_intersection = vector_distance(robot_pos, intersection_point)
     
     return distance_to_intersection < transition_threshold
 
@@ -1495,33 +2592,25 @@ def calculate_side_by_side_offset(robot, robot_index, pathway):
     
     # Only apply if robot is not in coordination mode
     if robot_index in robot_states and robot_states[robot_index].get('in_coordination', False):
-        return vcVector.new(0, 0, 0)
+        return Vec3(0, 0, 0)
     
     # Get pathway direction and perpendicular vector
     pathway_pos = pathway.WorldPositionMatrix.P
     pathway_N = pathway.WorldPositionMatrix.N
     direction = normalize_vector(pathway_N)
-    perpendicular = vcVector.new(-direction.Y, direction.X, 0)
+    perpendicular = Vec3(-direction.Y, direction.X, 0)
     
     # Find robots ACTUALLY in the same pathway (not approaching)
     robots_in_pathway = []
-    robot_positions = {}
-    robot_pos = getRobotPosition(robot)
     
-    for other_robot in robots:
-        other_robot_index = get_robot_index(other_robot.Name)
-        other_location = get_robot_property_value('Location', other_robot_index)
-        
-        # Only include robots actually in the same pathway
-        if other_location == pathway.Name:
-            # Also check if they're not in coordination mode
-            if not (other_robot_index in robot_states and robot_states[other_robot_index].get('in_coordination', False)):
-                robots_in_pathway.append(other_robot_index)
-                robot_positions[other_robot_index] = getRobotPosition(other_robot)
+    for other_robot_index in find_robots_at_location(pathway.Name):
+        # Skip robots in coordination mode
+        if not (other_robot_index in robot_states and robot_states[other_robot_index].get('in_coordination', False)):
+            robots_in_pathway.append(other_robot_index)
     
     # If only one robot or no other robots, no offset needed
     if len(robots_in_pathway) <= 1:
-        return vcVector.new(0, 0, 0)
+        return Vec3(0, 0, 0)
     
     # Sort robots deterministically for consistent lane assignment
     def sort_key(robot_idx):
@@ -1548,20 +2637,17 @@ def calculate_side_by_side_offset(robot, robot_index, pathway):
         return offset
         
     except ValueError:
-        return vcVector.new(0, 0, 0)
+        return Vec3(0, 0, 0)
 
 def calculate_avoidance_offset(robot, robot_index):
     """Calculate smooth avoidance offset for path planning only - no real-time position changes"""
     robot_pos = getRobotPosition(robot)
-    avoidance_offset = vcVector.new(0, 0, 0)
+    avoidance_offset = Vec3(0, 0, 0)
     robot_radius = 400  # Reduced from 600 for more accurate collision boundaries
     safe_distance = 1000  # Safe separation distance
     
-    for other_robot in robots:
+    for other_robot, other_robot_index, other_pos in find_robots_near(robot_pos, safe_distance):
         if other_robot != robot:
-            other_robot_index = get_robot_index(other_robot.Name)
-            other_pos = getRobotPosition(other_robot)
-            
             # Calculate distance and direction between robots
             distance_vector = vector_subtract(robot_pos, other_pos)
             distance = vector_length(distance_vector)
@@ -1595,18 +2681,15 @@ def check_velocity_obstacle_collision(robot, robot_index):
     current_location = get_robot_property_value('Location', robot_index)
     next_location = get_robot_property_value('NextLocation', robot_index)
     
-    for other_robot in robots:
+    for other_robot, other_robot_index, other_pos in find_robots_near(robot_pos, 3000):
         if other_robot != robot:
-            other_robot_index = get_robot_index(other_robot.Name)
-            other_pos = getRobotPosition(other_robot)
             other_vehicle = robot_states[other_robot_index]['vehicle'] if other_robot_index in robot_states else None
             
             if not other_vehicle:
                 continue
                 
             # Calculate relative position and velocity
-            rel_pos = vector_subtract(other_pos, robot_pos)
-            distance = vector_length(rel_pos)
+            distance = get_robot_distance(robot_index, other_robot_index)
             
             # Skip if robots are far apart
             if distance > 3000:
@@ -1619,12 +2702,8 @@ def check_velocity_obstacle_collision(robot, robot_index):
             if not self_direction or not other_direction:
                 continue
             
-            # Calculate future positions
-            self_future_pos = vector_add(robot_pos, vector_multiply(self_direction, 800 * prediction_time))
-            other_future_pos = vector_add(other_pos, vector_multiply(other_direction, 800 * prediction_time))
-            
             # Check if future collision is predicted
-            future_distance = vector_length(vector_subtract(self_future_pos, other_future_pos))
+            future_distance = get_future_robot_distance(robot_index, other_robot_index, 800 * prediction_time)
             collision_threshold = robot_radius * 2 + 200  # Safety margin
             
             if future_distance < collision_threshold:
@@ -1654,12 +2733,12 @@ def calculate_coordinated_side_by_side_offset(robot, robot_index, pathway, partn
     pathway_pos = pathway.WorldPositionMatrix.P
     pathway_N = pathway.WorldPositionMatrix.N
     direction = normalize_vector(pathway_N)
-    perpendicular = vcVector.new(-direction.Y, direction.X, 0)
+    perpendicular = Vec3(-direction.Y, direction.X, 0)
     
     # Find the partner robot
-    partner_robot = next((r for r in robots if get_robot_index(r.Name) == partner_index), None)
+    partner_robot = find_robot_by_index(partner_index)
     if not partner_robot:
-        return vcVector.new(0, 0, 0)
+        return Vec3(0, 0, 0)
     
     partner_pos = getRobotPosition(partner_robot)
     
@@ -1694,12 +2773,10 @@ def calculate_coordinated_side_by_side_offset(robot, robot_index, pathway, partn
     
     # Check if we're in an intersection area (multiple pathways nearby)
     nearby_pathways = 0
-    for other_pathway in app.Components:
-        if (other_pathway.Name.startswith('Pathway Area') or 
-            other_pathway.Name.startswith('Idle Location')):
-            pathway_distance = vector_length(vector_subtract(robot_pos, other_pathway.WorldPositionMatrix.P))
-            if pathway_distance < 3000:  # Within intersection zone
-                nearby_pathways += 1
+    for other_pathway in get_pathway_components():
+        pathway_distance = vector_distance(robot_pos, other_pathway.WorldPositionMatrix.P)
+        if pathway_distance < 3000:  # Within intersection zone
+            nearby_pathways += 1
     
     # Increase offset in intersection areas
     intersection_multiplier = 1.5 if nearby_pathways > 2 else 1.0
@@ -1724,16 +2801,16 @@ def calculate_in_place_side_by_side_offset(robot, robot_index, pathway):
     pathway_pos = pathway.WorldPositionMatrix.P
     pathway_N = pathway.WorldPositionMatrix.N
     direction = normalize_vector(pathway_N)
-    perpendicular = vcVector.new(-direction.Y, direction.X, 0)
+    perpendicular = Vec3(-direction.Y, direction.X, 0)
     
     # Find the partner robot that triggered this side-by-side conversion
     partner_index = robot_states[robot_index].get('side_by_side_partner')
     if not partner_index:
-        return vcVector.new(0, 0, 0)
+        return Vec3(0, 0, 0)
     
-    partner_robot = next((r for r in robots if get_robot_index(r.Name) == partner_index), None)
+    partner_robot = find_robot_by_index(partner_index)
     if not partner_robot:
-        return vcVector.new(0, 0, 0)
+        return Vec3(0, 0, 0)
     
     partner_pos = getRobotPosition(partner_robot)
     
@@ -1773,8 +2850,8 @@ def check_bypass_possibility(robot, robot_index, stationary_robot, stationary_ro
         return False
     
     # Calculate perpendicular directions for left/right bypass
-    perp_right = vcVector.new(-movement_direction.Y, movement_direction.X, 0)
-    perp_left = vcVector.new(movement_direction.Y, -movement_direction.X, 0)
+    perp_right = Vec3(-movement_direction.Y, movement_direction.X, 0)
+    perp_left = Vec3(movement_direction.Y, -movement_direction.X, 0)
     
     # Check both left and right bypass routes
     for bypass_direction in [perp_right, perp_left]:
@@ -1784,10 +2861,9 @@ def check_bypass_possibility(robot, robot_index, stationary_robot, stationary_ro
         
         # Check if bypass point is clear of other robots
         bypass_clear = True
-        for other_robot in robots:
+        for other_robot, other_robot_index, other_pos in find_robots_near(bypass_point, robot_radius * 2):
             if other_robot != robot and other_robot != stationary_robot:
-                other_pos = getRobotPosition(other_robot)
-                distance_to_bypass = vector_length(vector_subtract(other_pos, bypass_point))
+                distance_to_bypass = vector_distance(other_pos, bypass_point)
                 
                 if distance_to_bypass < robot_radius * 2:
                     bypass_clear = False
@@ -1796,7 +2872,7 @@ def check_bypass_possibility(robot, robot_index, stationary_robot, stationary_ro
         # Check if there's enough space around the stationary robot
         if bypass_clear:
             # Calculate distance from bypass point to stationary robot
-            distance_to_stationary = vector_length(vector_subtract(stationary_pos, bypass_point))
+            distance_to_stationary = vector_distance(stationary_pos, bypass_point)
             
             if distance_to_stationary > robot_radius * 2:
                 return True  # Bypass is possible
@@ -1806,20 +2882,20 @@ def check_bypass_possibility(robot, robot_index, stationary_robot, stationary_ro
 def calculate_bypass_offset(robot, robot_index, stationary_robot_index):
     """Calculate the lateral offset needed to bypass a stationary robot"""
     robot_pos = getRobotPosition(robot)
-    stationary_robot = next((r for r in robots if get_robot_index(r.Name) == stationary_robot_index), None)
+    stationary_robot = find_robot_by_index(stationary_robot_index)
     
     if not stationary_robot:
-        return vcVector.new(0, 0, 0)
+        return Vec3(0, 0, 0)
     
     stationary_pos = getRobotPosition(stationary_robot)
     movement_direction = get_movement_direction(robot, robot_index)
     
     if not movement_direction:
-        return vcVector.new(0, 0, 0)
+        return Vec3(0, 0, 0)
     
     # Calculate which side to bypass (choose the side with more space)
-    perp_right = vcVector.new(-movement_direction.Y, movement_direction.X, 0)
-    perp_left = vcVector.new(movement_direction.Y, -movement_direction.X, 0)
+    perp_right = Vec3(-movement_direction.Y, movement_direction.X, 0)
+    perp_left = Vec3(movement_direction.Y, -movement_direction.X, 0)
     
     # Check which side has more clearance
     right_clearance = check_side_clearance(robot_pos, perp_right, robot_index)
@@ -1839,11 +2915,11 @@ def check_side_clearance(position, direction, robot_index):
     """Check how much clearance is available in a given direction"""
     clearance = 5000  # Start with maximum clearance
     
-    for other_robot in robots:
-        other_robot_index = get_robot_index(other_robot.Name)
+    # Robots further than this can neither lie in the 2000-wide corridor nor shorten the clearance
+    search_radius = math.hypot(clearance + 600, 2000)
+    
+    for other_robot, other_robot_index, other_pos in find_robots_near(position, search_radius):
         if other_robot_index != robot_index:
-            other_pos = getRobotPosition(other_robot)
-            
             # Project other robot position onto the direction vector
             relative_pos = vector_subtract(other_pos, position)
             projection = relative_pos.X * direction.X + relative_pos.Y * direction.Y
@@ -1860,18 +2936,24 @@ def check_side_clearance(position, direction, robot_index):
 
 def get_movement_direction(robot, robot_index):
     """Get robot's movement direction based on current and next locations"""
-    current_location = get_robot_property_value('Location', robot_index)
+    refresh_fleet_state()
+    row = fleet_state['rows'].get(robot_index)
+    if row is not None:
+        return get_fleet_directions()[row]
+    return calculate_movement_direction(read_robot_position(robot), robot_index)
+
+def calculate_movement_direction(robot_pos, robot_index):
+    """Unit vector from robot_pos toward the robot's NextLocation, or None"""
     next_location = get_robot_property_value('NextLocation', robot_index)
     
     if not next_location:
         return None
     
     # Find the next location component
-    next_component = app.findComponent(next_location)
+    next_component = find_component(next_location)
     if not next_component:
         return None
     
-    robot_pos = getRobotPosition(robot)
     next_pos = next_component.WorldPositionMatrix.P
     
     direction_vector = vector_subtract(next_pos, robot_pos)
@@ -1885,10 +2967,10 @@ def get_movement_direction(robot, robot_index):
 def get_distance_to_location(robot, location_name):
     """Calculate distance from robot to a specific location"""
     robot_pos = getRobotPosition(robot)
-    location_component = app.findComponent(location_name)
+    location_component = find_component(location_name)
     if location_component:
         location_pos = location_component.WorldPositionMatrix.P
-        return vector_length(vector_subtract(robot_pos, location_pos))
+        return vector_distance(robot_pos, location_pos)
     return float('inf')
 
 def apply_collision_avoidance_offset(robot, robot_index, other_robot, other_robot_index):
@@ -1909,7 +2991,7 @@ def apply_collision_avoidance_offset(robot, robot_index, other_robot, other_robo
     
     # Calculate perpendicular offset direction (right side)
     relative_direction = normalize_vector(relative_pos)
-    perpendicular_direction = vcVector.new(-relative_direction.Y, relative_direction.X, 0)
+    perpendicular_direction = Vec3(-relative_direction.Y, relative_direction.X, 0)
     
     # Determine which robot goes to which side based on priority/index
     self_priority = get_robot_property_value('Priority', robot_index)
@@ -1937,7 +3019,7 @@ def apply_collision_avoidance_offset(robot, robot_index, other_robot, other_robo
     # Apply the offset path immediately
     vehicle.clearMove()
     vehicle.MaxSpeed = 600  # Slightly slower for offset maneuver
-    vehicle.addControlPoint(offset_target)
+    vehicle.addControlPoint(to_vc_vector(offset_target))
     
     # Mark robot as using collision avoidance
     robot_states[robot_index]['using_avoidance_offset'] = True
@@ -1966,7 +3048,7 @@ def initiate_backup_maneuver(robot, robot_index):
     # Clear current movement and set backup movement
     vehicle.clearMove()
     vehicle.MaxSpeed = 400  # Slower speed for backup
-    vehicle.addControlPoint(backup_position)
+    vehicle.addControlPoint(to_vc_vector(backup_position))
     
     # Reset movement state to allow re-planning after backup
     robot_states[robot_index]['moving'] = False
@@ -2015,10 +3097,10 @@ def check_proximity(robot, robot_index):
     
     # Check if robot is approaching a conveyor (for speed reduction)
     if next_location and is_conveyor(next_location):
-        next_component = app.findComponent(next_location)
+        next_component = find_component(next_location)
         if next_component:
             next_pos = next_component.WorldPositionMatrix.P
-            distance_to_next = vector_length(vector_subtract(next_pos, robot_pos))
+            distance_to_next = vector_distance(next_pos, robot_pos)
             if distance_to_next < 3000:  # Approaching conveyor within 3000 units
                 approaching_conveyor = True
     
@@ -2036,10 +3118,10 @@ def check_proximity(robot, robot_index):
 
     # Check reservations when approaching pathway boundaries (with transition awareness)
     if next_location and not in_transition_zone:
-        next_component = app.findComponent(next_location)
+        next_component = find_component(next_location)
         if next_component:
             next_pos = next_component.WorldPositionMatrix.P
-            distance_to_next = vector_length(vector_subtract(next_pos, robot_pos))
+            distance_to_next = vector_distance(next_pos, robot_pos)
             
             if distance_to_next < 1200 and not is_pathway_available(next_location, robot_index):
                 should_stop = True
@@ -2049,15 +3131,14 @@ def check_proximity(robot, robot_index):
         robot_moving = robot_index in robot_states and robot_states[robot_index]['moving']
         
         # Detection zones with stricter head-on collision handling
-        early_detection_zone = 5000   # Increased for better early detection
+        early_detection_zone = EARLY_DETECTION_ZONE
         coordination_zone = 4000      # Increased for better coordination
         critical_zone = 2500 if not in_transition_zone else 3000  # Larger buffer in transition zones
         
-        for other_robot in robots:
+        # Only robots inside the early detection zone can trigger any of the cases below
+        for other_robot, other_robot_index, other_pos in find_robots_near(robot_pos, early_detection_zone):
             if other_robot != robot:
-                other_robot_index = get_robot_index(other_robot.Name)
-                other_pos = getRobotPosition(other_robot)
-                dist = vector_length(vector_subtract(robot_pos, other_pos))
+                dist = get_robot_distance(robot_index, other_robot_index)
                 other_moving = other_robot_index in robot_states and robot_states[other_robot_index]['moving']
                 
                 if robot_moving and other_moving and dist < early_detection_zone:
@@ -2066,20 +3147,16 @@ def check_proximity(robot, robot_index):
                     other_direction = get_movement_direction(other_robot, other_robot_index)
                     
                     if self_direction and other_direction:
-                        # Calculate if robots are approaching each other
-                        relative_pos = vector_subtract(other_pos, robot_pos)
-                        
                         # Check if this robot is moving toward the other robot
-                        self_approaching = (relative_pos.X * self_direction.X + relative_pos.Y * self_direction.Y) > 0
+                        self_approaching = is_robot_approaching(robot_index, other_robot_index)
                         
                         # Check if other robot is moving toward this robot
-                        other_to_self = vector_subtract(robot_pos, other_pos)
-                        other_approaching = (other_to_self.X * other_direction.X + other_to_self.Y * other_direction.Y) > 0
+                        other_approaching = is_robot_approaching(other_robot_index, robot_index)
                         
                         # CRITICAL: Enhanced head-on collision detection
                         if self_approaching and other_approaching:
                             # Calculate angle between movement directions (head-on detection)
-                            dot_product = self_direction.X * other_direction.X + self_direction.Y * other_direction.Y
+                            dot_product = get_heading_dot(robot_index, other_robot_index)
                             
                             # If robots are moving in nearly opposite directions (head-on collision)
                             if dot_product < -0.5:  # Strong opposite direction indicator
@@ -2153,8 +3230,7 @@ def check_proximity(robot, robot_index):
                 elif robot_moving and not other_moving and dist < 2500:
                     self_direction = get_movement_direction(robot, robot_index)
                     if self_direction:
-                        relative_pos = vector_subtract(other_pos, robot_pos)
-                        approaching = (relative_pos.X * self_direction.X + relative_pos.Y * self_direction.Y) > 0
+                        approaching = is_robot_approaching(robot_index, other_robot_index)
                         
                         if approaching:
                             if dist < critical_zone:
@@ -2191,14 +3267,21 @@ def reserve_planned_path(robot_index, planned_pathways):
     """Reserve planned path with shorter, more efficient timing"""
     robot_planned_paths[robot_index] = planned_pathways
     reservation_success = True
+    timed = planned_entry_times.pop(robot_index, {})
     
     # Try to reserve all pathways in the planned route
     for i, pathway in enumerate(planned_pathways):
         pathway_name = pathway.Name if hasattr(pathway, 'Name') else pathway
-        # Shorter reservation duration to reduce unnecessary blocking
-        reservation_duration = 5.0 + (i * 1.0)  # Reduced duration
+        if pathway_name in timed:
+            # Space-time plan: reserve the pathway from just before entering until just after leaving it
+            entry_time, exit_time, _ = timed[pathway_name]
+            reserved = reserve_interval(pathway_name, robot_index, entry_time - RESERVATION_MARGIN, exit_time + RESERVATION_MARGIN)
+        else:
+            # Shorter reservation duration to reduce unnecessary blocking
+            reservation_duration = 5.0 + (i * 1.0)  # Reduced duration
+            reserved = reserve_pathway(pathway_name, robot_index, reservation_duration)
         
-        if not reserve_pathway(pathway_name, robot_index, reservation_duration):
+        if not reserved:
             # Could not reserve pathway - path planning failed
             reservation_success = False
             break
@@ -2221,6 +3304,10 @@ def release_completed_reservations(robot_index):
             current_path_index = i
             break
     
+    # A robot running late keeps its current pathway reserved while no other robot needs it
+    if SPACE_TIME_PLANNING and current_path_index >= 0:
+        extend_reservation(current_location, robot_index, sim.SimTime + RESERVATION_MARGIN)
+    
     # Release reservations for passed pathways
     if current_path_index > 0:
         for i in range(current_path_index):
@@ -2228,11 +3315,35 @@ def release_completed_reservations(robot_index):
             pathway_name = pathway.Name if hasattr(pathway, 'Name') else pathway
             release_pathway_reservation(pathway_name, robot_index)
 
+def get_pathway_components():
+    """Pathway Area and Idle Location components, from the registry when the layout scripts have filled it"""
+    pathways = get_registered_components('pathway') + get_registered_components('idle')
+    if pathways:
+        return pathways
+    return [component for component in app.Components if component.Name.startswith('Pathway Area') or component.Name.startswith('Idle Location')]
+
+def get_product_components():
+    """Produced components, from the registry when the input conveyors have registered themselves"""
+    if get_registered_components('input_conveyor'):
+        return get_registered_components('product')
+    return [c for c in app.Components
+            if not is_conveyor(c.Name) and
+            not c.Name.startswith('Mobile Robot') and
+            not c.Name.startswith('Pathway') and
+            not c.Name.startswith('Idle') and
+            not c.Name.startswith('_Template') and
+            c.Name != 'Component1']
+
 def findAnyComponentOnInputConveyor(input_conveyor_name):
     """Find any produced component on the specified input conveyor that is not already attached to another robot"""
-    components = app.Components
+    # Conveyors with a product queue serve the oldest waiting product first
+    if has_product_queue(input_conveyor_name):
+        product = peek_product(input_conveyor_name)
+        return product.Name if product else None
+    
+    components = get_product_components()
     
-    target_conveyor = app.findComponent(input_conveyor_name)
+    target_conveyor = find_component(input_conveyor_name)
     if not target_conveyor:
         return None
     
@@ -2242,29 +3353,25 @@ def findAnyComponentOnInputConveyor(input_conveyor_name):
     closest_distance = float('inf')
     
     for c in components:
-        if (c.Name != input_conveyor_name and 
-            not c.Name.startswith('Mobile Robot') and 
-            not c.Name.startswith('Pathway') and 
-            not c.Name.startswith('Idle') and
-            not c.Name.startswith('_Template') and
-            c.Name != 'Component1'):
-            
-            component_pos = c.WorldPositionMatrix.P
-            distance = vector_length(vector_subtract(component_pos, conveyor_pos))
+        component_pos = c.WorldPositionMatrix.P
+        distance = vector_distance(component_pos, conveyor_pos)
+        
+        if distance < 8000:
+            # Check if component is already attached to another robot
+            attached_to_prop = c.getProperty('AttachedToRobot')
+            if attached_to_prop and attached_to_prop.Value and attached_to_prop.Value.strip() != '':
+                continue  # Skip components already attached to robots
             
-            if distance < 8000:
-                # Check if component is already attached to another robot
-                attached_to_prop = c.getProperty('AttachedToRobot')
-                if attached_to_prop and attached_to_prop.Value and attached_to_prop.Value.strip() != '':
-                    continue  # Skip components already attached to robots
-                
-                if distance < closest_distance:
-                    closest_distance = distance
-                    closest_component = c.Name
+            if distance < closest_distance:
+                closest_distance = distance
+                closest_component = c.Name
     
     return closest_component
 
 def findComponentNameByProductType(product_type):
+    products = get_components_by_product_type(product_type)
+    if products:
+        return products[0].Name
     components = app.Components
     for c in components:
         product_type_prop = c.getProperty('ProductType')
@@ -2273,7 +3380,7 @@ def findComponentNameByProductType(product_type):
     return None
 
 def attachComponentToRobot(component_name, robot):
-    component = app.findComponent(component_name)
+    component = find_component(component_name)
     if component and robot:
         # Check if component is already attached to another robot (not this robot)
         attached_to_prop = component.getProperty('AttachedToRobot')
@@ -2306,7 +3413,7 @@ def attachComponentToRobot(component_name, robot):
     return False
 
 def relocateComponentOnConveyor(component_name, conveyor, robot):
-    component = app.findComponent(component_name)
+    component = find_component(component_name)
     if component:
         # No need to detach from root feature since we're not using root feature attachment
         
@@ -2324,12 +3431,13 @@ def relocateComponentOnConveyor(component_name, conveyor, robot):
         
         component.PositionMatrix = new_pos
         component.rebuild()
+        deliver_product(conveyor.Name, component, sim.SimTime)
 
 def updateCarriedComponentPosition(robot, robot_index):
     """Update the position of any component carried by this robot"""
     carried_product_name = get_robot_property_value('CarriedProduct', robot_index)
     if carried_product_name and carried_product_name.strip() != '':
-        component = app.findComponent(carried_product_name)
+        component = find_component(carried_product_name)
         if component:
             # Check if this component is actually attached to this robot
             attached_to_prop = component.getProperty('AttachedToRobot')
@@ -2342,7 +3450,7 @@ def updateCarriedComponentPosition(robot, robot_index):
                 # Use robot's orientation to calculate proper offset
                 robot_direction = normalize_vector(robot_matrix.N)
                 offset_pos = vector_subtract(robot_matrix.P, vector_multiply(robot_direction, 600))
-                offset_pos = vector_add(offset_pos, vcVector.new(0, 0, 200))
+                offset_pos = vector_add(offset_pos, Vec3(0, 0, 200))
                 
                 # Set position and copy robot's orientation
                 offset_matrix.translateAbs(offset_pos.X, offset_pos.Y, offset_pos.Z)
@@ -2354,100 +3462,251 @@ def updateCarriedComponentPosition(robot, robot_index):
 def distance(p1, p2):
     return ((p1['X'] - p2['X'])**2 + (p1['Y'] - p2['Y'])**2)**0.5
 
+def reserve_interval(pathway_name, robot_index, start_time, end_time):
+    """Reserve a pathway for a robot from start_time to end_time, replacing the robot's earlier interval on it"""
+    if not is_interval_free(pathway_name, robot_index, start_time, end_time):
+        return False  # Pathway is reserved by another robot during the interval
+    intervals = [interval for interval in pathway_reservations.get(pathway_name, ()) if interval[2] != robot_index]
+    intervals.append((start_time, end_time, robot_index))
+    intervals.sort()
+    pathway_reservations[pathway_name] = intervals
+    return True
+
+def is_interval_free(pathway_name, robot_index, start_time, end_time, constraints=None):
+    """Check that no other robot, or planning constraint, holds the pathway between start_time and end_time"""
+    intervals = pathway_reservations.get(pathway_name)
+    if intervals:
+        # Remove expired reservations
+        current_time = sim.SimTime
+        if any(end <= current_time for _, end, _ in intervals):
+            intervals = [interval for interval in intervals if interval[1] > current_time]
+            pathway_reservations[pathway_name] = intervals
+    if constraints and pathway_name in constraints:
+        intervals = (intervals or []) + constraints[pathway_name]
+    if not intervals:
+        return True
+    
+    for reserved_start, reserved_end, reserved_robot in intervals:
+        if reserved_robot != robot_index and reserved_start <= end_time and start_time < reserved_end:
+            return False
+    return True
+
+def earliest_free_time(pathway_name, robot_index, after, duration, constraints=None):
+    """Earliest start at or after `after` of a window of `duration` seconds no other robot, or planning constraint, holds the pathway in"""
+    start_time = after
+    intervals = pathway_reservations.get(pathway_name, ())
+    if constraints and pathway_name in constraints:
+        intervals = sorted(list(intervals) + constraints[pathway_name], key=lambda interval: interval[0])
+    for reserved_start, reserved_end, reserved_robot in intervals:
+        if reserved_robot == robot_index or reserved_end <= start_time:
+            continue
+        if reserved_start > start_time + duration:
+            # Intervals are sorted by start, so none of the later ones overlaps the window either
+            break
+        start_time = reserved_end + INTERVAL_TOLERANCE
+    return start_time
+
+def extend_reservation(pathway_name, robot_index, end_time):
+    """Keep a late robot's pathway reserved until end_time if no other robot needs it"""
+    for reserved_start, reserved_end, reserved_robot in pathway_reservations.get(pathway_name, ()):
+        if reserved_robot == robot_index:
+            if reserved_end < end_time and is_interval_free(pathway_name, robot_index, reserved_end, end_time):
+                reserve_interval(pathway_name, robot_index, reserved_start, end_time)
+            return
+
 def reserve_pathway(pathway_name, robot_index, duration=3.0):
     """Reserve a pathway for a robot - shorter duration to reduce blocking"""
     current_time = sim.SimTime
-    if pathway_name not in pathway_reservations:
-        pathway_reservations[pathway_name] = {}
-    
-    # Check if pathway is available
-    for reserved_robot, expiry_time in list(pathway_reservations[pathway_name].items()):
-        if expiry_time > current_time and reserved_robot != robot_index:
-            return False  # Pathway is reserved by another robot
-        elif expiry_time <= current_time:
-            # Remove expired reservations
-            del pathway_reservations[pathway_name][reserved_robot]
-    
-    # Reserve the pathway with shorter duration
-    pathway_reservations[pathway_name][robot_index] = current_time + duration
-    return True
+    return reserve_interval(pathway_name, robot_index, current_time, current_time + duration)
 
 def release_pathway_reservation(pathway_name, robot_index):
     """Release a pathway reservation when robot moves to next segment"""
-    if pathway_name in pathway_reservations and robot_index in pathway_reservations[pathway_name]:
-        del pathway_reservations[pathway_name][robot_index]
+    intervals = pathway_reservations.get(pathway_name)
+    if intervals:
+        pathway_reservations[pathway_name] = [interval for interval in intervals if interval[2] != robot_index]
 
 def is_pathway_available(pathway_name, robot_index):
     """Check if pathway is available for reservation"""
     current_time = sim.SimTime
-    if pathway_name not in pathway_reservations:
-        return True
-    
-    for reserved_robot, expiry_time in list(pathway_reservations[pathway_name].items()):
-        if expiry_time > current_time and reserved_robot != robot_index:
-            return False
-        elif expiry_time <= current_time:
-            # Clean up expired reservations
-            del pathway_reservations[pathway_name][reserved_robot]
-    
-    return True
+    return is_interval_free(pathway_name, robot_index, current_time, current_time)
+
+def get_layout_version():
+    """Return the combined LayoutVersion of all layout templates"""
+    version = []
+    for template_name in layout_template_names:
+        version_prop = layout_version_props.get(template_name)
+        if not version_prop:
+            template = find_component(template_name)
+            version_prop = template.getProperty('LayoutVersion') if template else None
+            if version_prop:
+                layout_version_props[template_name] = version_prop
+        version.append(version_prop.Value if version_prop else 0)
+    return tuple(version)
+
+def discover_pathways():
+    """Read all Pathway Area and Idle Location components into pathway dicts for planning"""
+    pathways = get_pathway_components()
+    pathways_dict = []
+    for p in pathways:
+        length1 = p.getProperty('Length1').Value if p.getProperty('Length1') else 0
+        length2 = p.getProperty('Length2').Value if p.getProperty('Length2') else 0
+        width1 = p.getProperty('Width1').Value if p.getProperty('Width1') else 0
+        width2 = p.getProperty('Width2').Value if p.getProperty('Width2') else 0
+        area_length = (length1 + length2) / 2 if (length1 or length2) else 500
+        area_width = (width1 + width2) / 2 if (width1 or width2) else 500
+        pathways_dict.append({
+            "Name": p.Name,
+            "X": p.WorldPositionMatrix.P.X,
+            "Y": p.WorldPositionMatrix.P.Y,
+            "Rz": math.degrees(math.atan2(p.WorldPositionMatrix.N.Y, p.WorldPositionMatrix.N.X)),
+            "AreaLength": area_length,
+            "AreaWidth": area_width
+        })
+    return pathways_dict
+
+def discover_conveyors():
+    """Return conveyor names and a name -> component lookup for all conveyors in the layout"""
+    registered = get_registered_components('input_conveyor') + get_registered_components('output_conveyor')
+    if not registered:
+        registered = [c for c in app.Components if is_conveyor(c.Name)]
+    conveyor_components = [c.Name for c in registered]
+    conveyors = dict((c.Name, c) for c in registered)
+    return conveyor_components, conveyors
+
+def get_pathway_grid_cell(x, y):
+    """Grid cell of a position; cells are one connection distance wide"""
+    return (int(math.floor(x / PATHWAY_CONNECTION_DISTANCE)), int(math.floor(y / PATHWAY_CONNECTION_DISTANCE)))
+
+def find_connected_pathways(point):
+    """Return the graph pathways within connection distance of a point (3x3 grid cells)"""
+    cell_x, cell_y = get_pathway_grid_cell(point['X'], point['Y'])
+    connected = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for p in pathway_grid.get((cell_x + dx, cell_y + dy), ()):
+                if p['Name'] != point['Name'] and distance(point, p) <= PATHWAY_CONNECTION_DISTANCE:
+                    connected.append(p)
+    # Keep layout order so A* explores neighbours in the same order as a full scan
+    connected.sort(key=lambda p: pathway_order[p['Name']])
+    return connected
+
+def build_pathway_graph(pathways_dict, layout_version=None):
+    """Precompute per-pathway neighbour lists so A* expansions cost O(degree) instead of O(pathways)"""
+    global pathway_neighbors, pathway_grid, pathway_order, pathway_graph_version, pathway_nodes
+    
+    pathway_order = {}
+    pathway_grid = {}
+    pathway_nodes = {}
+    for i, p in enumerate(pathways_dict):
+        pathway_order[p['Name']] = i
+        pathway_nodes[p['Name']] = p
+        pathway_grid.setdefault(get_pathway_grid_cell(p['X'], p['Y']), []).append(p)
+    
+    pathway_neighbors = {}
+    for p in pathways_dict:
+        pathway_neighbors[p['Name']] = find_connected_pathways(p)
+    
+    pathway_graph_version = layout_version
+    
+    # Transitions and routes of the previous layout can not be reused
+    transition_table.clear()
+    route_cache.clear()
+    if PRECOMPUTE_TRANSITIONS:
+        precompute_transition_table()
+
+def find_route_anchor(point):
+    """Nearest graph pathway within connection distance of a point off the graph, or None"""
+    connected = find_connected_pathways(point)
+    if not connected:
+        return None
+    return min(connected, key=lambda p: distance(point, p))
+
+def get_cached_route(key):
+    """Cached route for a (start pathway, goal) key, marked as most recently used; the caller counts hits and misses"""
+    route = route_cache.pop(key, None)
+    if route is not None:
+        route_cache[key] = route
+    return route
 
-def find_shortest_path_with_reservations(start, goal, pathways, robot_index):
+def store_cached_route(key, route):
+    route_cache[key] = route
+    while len(route_cache) > ROUTE_CACHE_SIZE:
+        route_cache.popitem(last=False)
+
+def get_route_cache_hit_rate():
+    lookups = planner_stats['cache_hits'] + planner_stats['cache_misses']
+    return planner_stats['cache_hits'] / float(lookups) if lookups else 0.0
+
+def find_shortest_path_with_reservations(start, goal, pathways, robot_index, constraints=None, batch=False):
     """Enhanced pathfinding with collision-aware reservation system and conflict prediction"""
+    # constraints: pathway_name -> [(start_time, end_time, None)] the space-time plan must also keep clear
+    # batch: a plan of solve_batch_routes, searched in full and kept out of the query and route cache counters
     def heuristic(a, b):
         return distance(a, b)
 
+    # Nodes outside the precomputed graph (robot start, conveyor goal) are connected on the fly
+    extra_nodes = [p for p in pathways if p['Name'] not in pathway_neighbors]
+
+    def get_connected(current):
+        if current['Name'] in pathway_neighbors:
+            connected = pathway_neighbors[current['Name']]
+        else:
+            connected = find_connected_pathways(current)
+        if extra_nodes:
+            connected = connected + [p for p in extra_nodes
+                                     if p['Name'] != current['Name'] and distance(current, p) <= PATHWAY_CONNECTION_DISTANCE]
+        return connected
+
+    def is_blocked(p):
+        # Check if pathway can be reserved
+        if not is_pathway_available(p['Name'], robot_index):
+            return True
+        # PROACTIVE: Also check if other robots are planning to use this pathway
+        for other_robot_index, planned_path in robot_planned_paths.items():
+            if other_robot_index != robot_index:
+                for planned_pathway in planned_path:
+                    planned_name = planned_pathway.Name if hasattr(planned_pathway, 'Name') else planned_pathway
+                    if planned_name == p['Name']:
+                        # Check timing - if other robot will be here soon, avoid
+                        other_robot = find_robot_by_index(other_robot_index)
+                        if other_robot:
+                            other_pos = getRobotPosition(other_robot)
+                            pathway_pos = {'X': p['X'], 'Y': p['Y']}
+                            distance_to_pathway = distance(
+                                {'X': other_pos.X, 'Y': other_pos.Y}, 
+                                pathway_pos
+                            )
+                            # If other robot is close to this pathway, avoid conflict
+                            if distance_to_pathway < 2000:
+                                return True
+        return False
+
     def get_neighbors(current):
-        neighbors = []
-        for p in pathways:
-            if p != current and distance(current, p) <= 12000:
-                # Check if pathway can be reserved
-                if is_pathway_available(p['Name'], robot_index):
-                    # PROACTIVE: Also check if other robots are planning to use this pathway
-                    conflict_predicted = False
-                    
-                    # Check if other robots have this pathway in their planned paths
-                    for other_robot_index, planned_path in robot_planned_paths.items():
-                        if other_robot_index != robot_index:
-                            for planned_pathway in planned_path:
-                                planned_name = planned_pathway.Name if hasattr(planned_pathway, 'Name') else planned_pathway
-                                if planned_name == p['Name']:
-                                    # Check timing - if other robot will be here soon, avoid
-                                    other_robot = next((r for r in robots if get_robot_index(r.Name) == other_robot_index), None)
-                                    if other_robot:
-                                        other_pos = getRobotPosition(other_robot)
-                                        pathway_pos = {'X': p['X'], 'Y': p['Y']}
-                                        distance_to_pathway = distance(
-                                            {'X': other_pos.X, 'Y': other_pos.Y}, 
-                                            pathway_pos
-                                        )
-                                        # If other robot is close to this pathway, avoid conflict
-                                        if distance_to_pathway < 2000:
-                                            conflict_predicted = True
-                                            break
-                    
-                    if not conflict_predicted:
-                        neighbors.append(p)
-        return neighbors
+        return [p for p in get_connected(current) if not is_blocked(p)]
+
+    def is_contested(p):
+        # Another robot is heading for this pathway next
+        for other_robot in robots:
+            other_robot_index = get_index_of_robot(other_robot)
+            if other_robot_index != robot_index and get_robot_property_value('NextLocation', other_robot_index) == p['Name']:
+                return True
+        return False
+
+    def is_route_node_clear(p):
+        # The goal is only checked for reservations, like the full search does
+        return not is_blocked(p) and (p['Name'] == goal['Name'] or not is_contested(p))
 
     def calculate_path_cost(current, neighbor):
         """Calculate cost with collision avoidance factors"""
         base_cost = distance(current, neighbor)
         
         # Add penalty for pathways with high robot density
-        density_penalty = 0
-        neighbor_pos = {'X': neighbor['X'], 'Y': neighbor['Y']}
-        
-        for robot in robots:
-            robot_pos = getRobotPosition(robot)
-            robot_dict_pos = {'X': robot_pos.X, 'Y': robot_pos.Y}
-            if distance(neighbor_pos, robot_dict_pos) < 2000:
-                density_penalty += 500  # Penalty for crowded areas
+        density_penalty = 500 * count_robots_near_point(neighbor['X'], neighbor['Y'], 2000)  # Penalty for crowded areas
         
         # Add penalty for pathways that other robots are targeting
         target_penalty = 0
         for other_robot in robots:
-            other_robot_index = get_robot_index(other_robot.Name)
+            other_robot_index = get_index_of_robot(other_robot)
             if other_robot_index != robot_index:
                 other_next_location = get_robot_property_value('NextLocation', other_robot_index)
                 if other_next_location == neighbor['Name']:
@@ -2455,80 +3714,307 @@ def find_shortest_path_with_reservations(start, goal, pathways, robot_index):
         
         return base_cost + density_penalty + target_penalty
 
-    open_set = []
-    heapq.heappush(open_set, (0, start))
-    came_from = {}
-    g_score = {start['Name']: 0}
-    f_score = {start['Name']: heuristic(start, goal)}
+    def search(origin, target, neighbors_of, cost_of):
+        # Push order breaks f-score ties so the heap never compares pathway dicts
+        push_order = itertools.count()
+        open_set = []
+        heapq.heappush(open_set, (0, next(push_order), origin))
+        came_from = {}
+        g_score = {origin['Name']: 0}
+        f_score = {origin['Name']: heuristic(origin, target)}
+
+        while open_set:
+            current = heapq.heappop(open_set)[2]
+            planner_stats['expansions'] += 1
+
+            if current['Name'] == target['Name']:
+                path = []
+                while current['Name'] in came_from:
+                    path.append(current)
+                    current = came_from[current['Name']]
+                path.append(origin)
+                return path[::-1]
+
+            for neighbor in neighbors_of(current):
+                tentative_g_score = g_score[current['Name']] + cost_of(current, neighbor)
+
+                if neighbor['Name'] not in g_score or tentative_g_score < g_score[neighbor['Name']]:
+                    came_from[neighbor['Name']] = current
+                    g_score[neighbor['Name']] = tentative_g_score
+                    f_score[neighbor['Name']] = g_score[neighbor['Name']] + heuristic(neighbor, target)
+                    heapq.heappush(open_set, (f_score[neighbor['Name']], next(push_order), neighbor))
 
-    while open_set:
-        current = heapq.heappop(open_set)[1]
-
-        if current['Name'] == goal['Name']:
-            path = []
-            while current['Name'] in came_from:
-                path.append(current)
-                current = came_from[current['Name']]
-            path.append(start)
-            return path[::-1]
-
-        for neighbor in get_neighbors(current):
-            tentative_g_score = g_score[current['Name']] + calculate_path_cost(current, neighbor)
+        return None
 
-            if neighbor['Name'] not in g_score or tentative_g_score < g_score[neighbor['Name']]:
-                came_from[neighbor['Name']] = current
-                g_score[neighbor['Name']] = tentative_g_score
-                f_score[neighbor['Name']] = g_score[neighbor['Name']] + heuristic(neighbor, goal)
-                heapq.heappush(open_set, (f_score[neighbor['Name']], neighbor))
+    def schedule_entry(current, neighbor, current_entry):
+        # Earliest time to enter neighbor when the robot entered current at current_entry, waiting in current if needed
+        arrival = current_entry + distance(current, neighbor) / PLANNING_SPEED
+        # The goal is checked for everything reserve_planned_path reserves: its hold time and the margin after it
+        hold = GOAL_HOLD_TIME + RESERVATION_MARGIN if neighbor['Name'] == goal['Name'] else RESERVATION_MARGIN
+        entry = earliest_free_time(neighbor['Name'], robot_index, arrival - RESERVATION_MARGIN, RESERVATION_MARGIN + hold,
+                                   constraints) + RESERVATION_MARGIN
+        if entry - arrival > MAX_WAIT_TIME:
+            return None
+        # The robot holds current while it waits and until it has left
+        if not is_interval_free(current['Name'], robot_index, current_entry, entry + RESERVATION_MARGIN, constraints):
+            return None
+        return entry
+
+    def search_space_time(origin, target):
+        # A* over entry times: each pathway is expanded once, at the earliest time the robot can enter it
+        push_order = itertools.count()
+        entry_time = {origin['Name']: sim.SimTime}
+        open_set = []
+        heapq.heappush(open_set, (sim.SimTime + heuristic(origin, target) / PLANNING_SPEED, next(push_order), origin))
+        came_from = {}
+        closed = set()
+
+        while open_set:
+            current = heapq.heappop(open_set)[2]
+            if current['Name'] in closed:
+                continue
+            closed.add(current['Name'])
+            planner_stats['expansions'] += 1
+
+            if current['Name'] == target['Name']:
+                path = []
+                while current['Name'] in came_from:
+                    path.append(current)
+                    current = came_from[current['Name']]
+                path.append(origin)
+                path = path[::-1]
+                return path, [entry_time[p['Name']] for p in path]
+
+            for neighbor in get_connected(current):
+                if neighbor['Name'] in closed:
+                    continue
+                entry = schedule_entry(current, neighbor, entry_time[current['Name']])
+                if entry is not None and (neighbor['Name'] not in entry_time or entry < entry_time[neighbor['Name']]):
+                    came_from[neighbor['Name']] = current
+                    entry_time[neighbor['Name']] = entry
+                    heapq.heappush(open_set, (entry + heuristic(neighbor, target) / PLANNING_SPEED, next(push_order), neighbor))
+
+        return None, None
+
+    def schedule_route(path):
+        # Entry times along a fixed route, or None if a pathway on it stays busy too long
+        times = [sim.SimTime]
+        for k in range(1, len(path)):
+            entry = schedule_entry(path[k - 1], path[k], times[-1])
+            if entry is None:
+                return None
+            times.append(entry)
+        return times
+
+    def record_entry_times(path, times):
+        # Entry and exit time per pathway for reserve_planned_path; pathways entered after a wait also hold the robot until then
+        timed = {}
+        for k in range(1, len(path)):
+            exit_time = times[k + 1] if k + 1 < len(path) else times[k] + GOAL_HOLD_TIME
+            hold_until = 0.0
+            if times[k] - times[k - 1] - distance(path[k - 1], path[k]) / PLANNING_SPEED > 1e-6:
+                hold_until = times[k]
+                planner_stats['planned_waits'] += 1
+            timed[path[k]['Name']] = (times[k], exit_time, hold_until)
+        planned_entry_times[robot_index] = timed
+
+    def full_search():
+        if not SPACE_TIME_PLANNING:
+            return search(start, goal, get_neighbors, calculate_path_cost)
+        path, times = search_space_time(start, goal)
+        if path:
+            record_entry_times(path, times)
+        return path
+
+    planned_entry_times.pop(robot_index, None)
+    if batch:
+        # Conflict-Based Search re-plans robots many times per batch; it counts its own work in batch_nodes
+        return full_search()
+    planner_stats['queries'] += 1
+    if ROUTE_CACHE_SIZE <= 0:
+        return full_search()
+
+    # Static-cost route from the pathway the robot starts on, shared by every trip between the same places
+    anchor = start if start['Name'] in pathway_neighbors else find_route_anchor(start)
+    if anchor is None:
+        return full_search()
+    key = (anchor['Name'], goal['Name'])
+    route = get_cached_route(key)
+    cached = route is not None
+    if not cached:
+        static_path = search(anchor, goal, get_connected, distance)
+        if static_path is None:
+            planner_stats['cache_misses'] += 1
+            return full_search()
+        route = [p['Name'] for p in static_path]
+        store_cached_route(key, route)
+
+    def use_route(path):
+        # Only a route that came out of the cache and is returned counts as a hit
+        planner_stats['cache_hits' if cached and path else 'cache_misses'] += 1
+        return path
+
+    nodes = dict((p['Name'], p) for p in extra_nodes)
+    nodes[goal['Name']] = goal
+    path = [start] + [pathway_nodes.get(name) or nodes[name] for name in route if name != start['Name']]
+
+    # Leave the start for the furthest route pathway it connects to directly
+    for i in range(len(path) - 1, 1, -1):
+        if distance(start, path[i]) <= PATHWAY_CONNECTION_DISTANCE:
+            path = [start] + path[i:]
+            break
 
+    # Space-time planning validates the route by timing it; waits replace detours
+    if SPACE_TIME_PLANNING:
+        times = schedule_route(path)
+        if times is not None:
+            record_entry_times(path, times)
+            return use_route(path)
+    else:
+        # Reservations and congestion only validate the route; its blocked stretches are found before any search
+        stretches = []
+        i = 1
+        while i < len(path):
+            if is_route_node_clear(path[i]):
+                i += 1
+                continue
+            rejoin = i + 1
+            while rejoin < len(path) and not is_route_node_clear(path[rejoin]):
+                rejoin += 1
+            if rejoin >= len(path):
+                # The goal itself is blocked, a full search would not reach it either
+                return use_route(None)
+            stretches.append((i, rejoin))
+            i = rejoin + 1
+        if len(stretches) <= ROUTE_REPAIR_LIMIT:
+            # Blocked stretches get a local detour, repaired from the goal back so earlier indices stay valid
+            for i, rejoin in reversed(stretches):
+                detour = search(path[i - 1], path[rejoin], get_neighbors, calculate_path_cost)
+                if detour is None:
+                    # No full search on top of the detours; the robot plans again in a later tick
+                    return use_route(None)
+                planner_stats['route_repairs'] += 1
+                path = path[:i - 1] + detour + path[rejoin + 1:]
+            return use_route(path)
+
+    # Too many blocked stretches or no timing within MAX_WAIT_TIME: plan the whole route instead
+    planner_stats['cache_misses'] += 1
+    planner_stats['route_fallbacks'] += 1
+    return full_search()
+
+def get_route_occupancy(timed):
+    """Interval reserve_planned_path reserves on each graph pathway of a space-time plan"""
+    return dict((pathway_name, (entry_time - RESERVATION_MARGIN, exit_time + RESERVATION_MARGIN))
+                for pathway_name, (entry_time, exit_time, _) in timed.items() if pathway_name in pathway_nodes)
+
+def find_route_conflict(solutions):
+    """Earliest pathway two planned robots would occupy at once, as one (robot_index, pathway_name, interval to avoid) per robot"""
+    earliest = None
+    robot_indices = sorted(solutions)
+    for position, robot_index in enumerate(robot_indices):
+        occupancy = solutions[robot_index]['occupancy']
+        for other_index in robot_indices[position + 1:]:
+            other_occupancy = solutions[other_index]['occupancy']
+            for pathway_name, interval in sorted(occupancy.items()):
+                other_interval = other_occupancy.get(pathway_name)
+                # Touching intervals count too: reserve_interval refuses them in one of the two orders
+                if other_interval and interval[0] <= other_interval[1] and other_interval[0] <= interval[1]:
+                    conflict_time = max(interval[0], other_interval[0])
+                    if earliest is None or conflict_time < earliest[0]:
+                        earliest = (conflict_time, robot_index, other_index, pathway_name, interval, other_interval)
+    if earliest is None:
+        return None
+    _, robot_index, other_index, pathway_name, interval, other_interval = earliest
+    return [(robot_index, pathway_name, other_interval), (other_index, pathway_name, interval)]
+
+def solve_batch_routes(requests):
+    """Conflict-Based Search over the space-time planner: conflict-free routes for robot_index -> (start, goal, pathways), or None"""
+    deadline = wall_clock() + CBS_TIME_LIMIT
+
+    def plan(robot_index, constraints):
+        start, goal, pathways = requests[robot_index]
+        path = find_shortest_path_with_reservations(start, goal, pathways, robot_index, constraints, batch=True)
+        timed = planned_entry_times.pop(robot_index, {})
+        if not path:
+            return None
+        arrival = timed[goal['Name']][0] if goal['Name'] in timed else sim.SimTime
+        return {'path': path, 'timed': timed, 'occupancy': get_route_occupancy(timed), 'cost': arrival - sim.SimTime}
+
+    def sum_of_costs(solutions):
+        return sum(solution['cost'] for solution in solutions.values())
+
+    # Root: every robot planned on its own; robots without any route are left to the caller
+    solutions = {}
+    for robot_index in sorted(requests):
+        solution = plan(robot_index, {})
+        if solution is not None:
+            solutions[robot_index] = solution
+    root = {'constraints': dict((robot_index, {}) for robot_index in solutions), 'solutions': solutions}
+
+    push_order = itertools.count()
+    open_set = [(sum_of_costs(solutions), next(push_order), root)]
+    expanded = 0
+    while open_set:
+        node = heapq.heappop(open_set)[2]
+        conflict = find_route_conflict(node['solutions'])
+        if conflict is None:
+            return node['solutions']
+        if expanded >= CBS_MAX_NODES or wall_clock() > deadline:
+            return None
+        expanded += 1
+        planner_stats['batch_nodes'] += 1
+
+        # Branch: one of the two robots keeps out of the pathway while the other holds it
+        for robot_index, pathway_name, interval in conflict:
+            constraints = dict(node['constraints'][robot_index])
+            constraints[pathway_name] = constraints.get(pathway_name, []) + [
+                (interval[0] - INTERVAL_TOLERANCE, interval[1] + INTERVAL_TOLERANCE, None)]
+            solution = plan(robot_index, constraints)
+            if solution is None:
+                continue
+            child = {'constraints': dict(node['constraints']), 'solutions': dict(node['solutions'])}
+            child['constraints'][robot_index] = constraints
+            child['solutions'][robot_index] = solution
+            heapq.heappush(open_set, (sum_of_costs(child['solutions']), next(push_order), child))
     return None
 
 def OnRun():
     global robots, robot_states, comp, app, sim
 
-    # Wait for RobotQuantity to be set
-    for i in range(50):  # 5 seconds max
-        robot_quantity_prop = comp.getProperty('RobotQuantity')
-        if robot_quantity_prop and robot_quantity_prop.Value > 0:
-            clone_robots()
-            break
-        delay(0.1)
-    
+    # Clone robots requested before the run; later RobotQuantity changes clone through OnChanged
+    robot_quantity_prop = comp.getProperty('RobotQuantity')
+    if robot_quantity_prop and robot_quantity_prop.Value > 0 and not robots:
+        clone_robots()
+
+    # Readiness barrier: passes as soon as pathways, idle locations and conveyors are all built
+    readiness_metrics['run_start'] = sim.SimTime
+    wait_for_layout(READINESS_TIMEOUT)
+    # Robots cloned by a RobotQuantity that arrives a little later still join the run
     if not robots:
+        wait_for_layout(ROBOT_QUANTITY_TIMEOUT, ('robot',))
+    if not robots:
+        # No tick will flush renders, so render what is pending and render later requests at once
+        set_render_flush_loop(False)
         return
+    record_readiness_metric('layout_ready', 'LayoutReadyTime')
+    if CBS_PLANNING and not SPACE_TIME_PLANNING:
+        # Batch planning finds conflicts in the entry times of space-time plans; without them it is skipped
+        print("CBS_PLANNING is ignored without SPACE_TIME_PLANNING; queued robots are planned one by one")
 
-    delay(2)
-
-    # Fetch all pathways from the 3D world
-    all_components = app.Components
-    pathways = [component for component in all_components if component.Name.startswith('Pathway Area') or component.Name.startswith('Idle Location')]
-    pathways_dict = []
-    for p in pathways:
-        length1 = p.getProperty('Length1').Value if p.getProperty('Length1') else 0
-        length2 = p.getProperty('Length2').Value if p.getProperty('Length2') else 0
-        width1 = p.getProperty('Width1').Value if p.getProperty('Width1') else 0
-        width2 = p.getProperty('Width2').Value if p.getProperty('Width2') else 0
-        area_length = (length1 + length2) / 2 if (length1 or length2) else 500
-        area_width = (width1 + width2) / 2 if (width1 or width2) else 500
-        pathways_dict.append({
-            "Name": p.Name,
-            "X": p.WorldPositionMatrix.P.X,
-            "Y": p.WorldPositionMatrix.P.Y,
-            "Rz": math.degrees(math.atan2(p.WorldPositionMatrix.N.Y, p.WorldPositionMatrix.N.X)),
-            "AreaLength": area_length,
-            "AreaWidth": area_width
-        })
+    # Fetch all pathways from the 3D world and build the adjacency graph once
+    layout_version = get_layout_version()
+    pathways_dict = discover_pathways()
+    build_pathway_graph(pathways_dict, layout_version)
 
     # Dynamically find all conveyor components by checking if their names contain 'conveyor' (case-insensitive)
-    conveyor_components = [comp.Name for comp in app.Components if 'conveyor' in comp.Name.lower()]
-    conveyors = {name: app.findComponent(name) for name in conveyor_components}
+    conveyor_components, conveyors = discover_conveyors()
     
 
 
     # Initialize per-robot states
     robot_states = {}
     for robot in robots:
-        robot_index = get_robot_index(robot.Name)
+        robot_index = get_index_of_robot(robot)
         robot_states[robot_index] = {
             'current_pathway_index': 0,
             'vehicle': robot.findBehaviour("Vehicle"),
@@ -2537,84 +4023,25 @@ def OnRun():
             'elapsed_time': 0.0,
             'total_move_time': 0.0,
             'pathways': [],
+            'hold_until': [],
             'conveyor_destination': None,
             'using_avoidance_offset': False
         }
 
     while True:
-        for robot in robots:
-            robot_index = get_robot_index(robot.Name)
-            vehicle = robot_states[robot_index]['vehicle']
-
-            if not robot_states[robot_index]['moving']:
-                robot_pos = getRobotPosition(robot)
-                start_pathway = {
-                    "Name": "Robot Start",
-                    "X": robot_pos.X,
-                    "Y": robot_pos.Y,
-                    "Rz": 0,
-                    "AreaLength": 0,
-                    "AreaWidth": 0
-                }
-
-                goal_pathway_name = get_robot_property_value('Target', robot_index)
-
-                if not goal_pathway_name:
-                    continue
-                
-
+        tick_started = wall_clock()
 
-                if goal_pathway_name in conveyor_components:
-                    conveyor = conveyors[goal_pathway_name]
-                    if conveyor:
-                        goal_pathway = {
-                            "Name": goal_pathway_name,
-                            "X": conveyor.WorldPositionMatrix.P.X,
-                            "Y": conveyor.WorldPositionMatrix.P.Y,
-                            "Rz": 0,
-                            "AreaLength": conveyor.getProperty('ConveyorLength').Value if conveyor.getProperty('ConveyorLength') else 0,
-                            "AreaWidth": conveyor.getProperty('ConveyorWidth').Value if conveyor.getProperty('ConveyorWidth') else 0
-                        }
-                    else:
-                        continue
-                else:
-                    goal_pathway = next((p for p in pathways_dict if p['Name'] == goal_pathway_name), None)
-
-                if not goal_pathway:
-                    continue
-
-                # Use reservation-based pathfinding
-                shortest_path = find_shortest_path_with_reservations(start_pathway, goal_pathway, pathways_dict + [goal_pathway], robot_index)
-
-                if shortest_path:
-                    # Separate pathways from conveyors - conveyors are destinations, not pathways to traverse
-                    pathways_robot = [app.findComponent(p['Name']) for p in shortest_path[1:] if p['Name'] not in conveyor_components]
-                    conveyor_destination = None
-                    
-                    if goal_pathway_name in conveyor_components:
-                        conveyor_destination = conveyors[goal_pathway_name]
+        # Rebuild pathways and graph only when a layout script has rebuilt its clones
+        layout_version = get_layout_version()
+        if layout_version != pathway_graph_version:
+            pathways_dict = discover_pathways()
+            build_pathway_graph(pathways_dict, layout_version)
+            conveyor_components, conveyors = discover_conveyors()
 
-                    # Try to reserve the pathway portion only (excluding conveyor destination)
-                    if reserve_planned_path(robot_index, pathways_robot):
-                        # Clear location when starting new journey (robot is no longer "at" previous conveyor)
-                        set_robot_property('Location', '', robot_index)
-                        set_robot_property('NextLocation', '', robot_index)
-                        
-                        robot_states[robot_index]['pathways'] = pathways_robot
-                        robot_states[robot_index]['conveyor_destination'] = conveyor_destination
-                        robot_states[robot_index]['current_pathway_index'] = 0
-                        robot_states[robot_index]['moving'] = True
-                        robot_states[robot_index]['vehicle_initialized'] = False  # Reset vehicle for new journey
-                    else:
-                        # Path reservation failed - robot will wait and try again
-                        set_robot_property('Stop', True, robot_index)
-                        # Clear any previous conveyor destination
-                        robot_states[robot_index]['conveyor_destination'] = None
-                else:
-                    # No path found - robot will wait
-                    set_robot_property('Stop', True, robot_index)
-                    # Clear any previous conveyor destination
-                    robot_states[robot_index]['conveyor_destination'] = None
+        # Motion and safety work runs for every robot on every tick, before any planning
+        for robot in robots:
+            robot_index = get_index_of_robot(robot)
+            vehicle = robot_states[robot_index]['vehicle']
 
             move_robot_incremental(robot, vehicle, robot_index, robot_states[robot_index])
             
@@ -2625,81 +4052,285 @@ def OnRun():
             release_completed_reservations(robot_index)
 
             # Handle pickup and drop-off with proximity-based detection
-            goal_pathway_name = get_robot_property_value('Target', robot_index)
-            robot_pos = getRobotPosition(robot)
+            handle_conveyor_interaction(robot, robot_index, conveyor_components, conveyors)
+
+        # Idle robots with a target queue for planning; the queue is drained round-robin in what is left of the tick budget
+        for robot in robots:
+            robot_index = get_index_of_robot(robot)
+            if needs_route(robot_index) and robot_index not in planning_queued:
+                planning_queue.append(robot_index)
+                planning_queued.add(robot_index)
+        drain_planning_queue(tick_started, pathways_dict, conveyor_components, conveyors)
+
+        # End of tick: apply this iteration's property writes and any coalesced render before yielding
+        flush_robot_writes()
+        flush_render()
+        tick_time = wall_clock() - tick_started
+        record_tick(tick_time)
+        if PROFILING_ENABLED:
+            record_profile_sample(PROFILE_TICK_NAME, tick_time)
+            publish_profile_stats()
+        delay(TICK_INTERVAL)
+
+def needs_route(robot_index):
+    """An idle robot with a target plans a route"""
+    return not robot_states[robot_index]['moving'] and bool(get_robot_property_value('Target', robot_index))
+
+def drain_planning_queue(tick_started, pathways_dict, conveyor_components, conveyors):
+    """Plan queued robots in order until the queue is empty or PLANNING_TICK_BUDGET of the tick is used"""
+    # The budget counts from the start of the tick, so the motion work that ran first is already spent
+    deadline = tick_started + PLANNING_TICK_BUDGET
+    planned = 0
+    # Batch planning needs the entry times of space-time plans to find conflicts
+    if CBS_PLANNING and SPACE_TIME_PLANNING:
+        planned = plan_batch_routes(pathways_dict, conveyor_components, conveyors)
+    while planning_queue:
+        # At least one robot plans per tick so a slow planner still makes progress
+        if planned and wall_clock() >= deadline:
+            break
+        robot_index = planning_queue.popleft()
+        planning_queued.discard(robot_index)
+        planning_deferred.discard(robot_index)
+        robot = find_robot_by_index(robot_index)
+        if robot is None or robot_index not in robot_states or not needs_route(robot_index):
+            continue
+        plan_robot_route(robot, robot_index, pathways_dict, conveyor_components, conveyors)
+        planned += 1
+    # A plan counts as deferred once, however many ticks the robot then waits
+    for robot_index in planning_queue:
+        if robot_index not in planning_deferred:
+            planning_deferred.add(robot_index)
+            scheduler_stats['deferred_plans'] += 1
+
+def record_tick(tick_time):
+    """Count the tick, its overrun of TICK_INTERVAL and publish the scheduler properties that changed"""
+    scheduler_stats['ticks'] += 1
+    if tick_time > TICK_INTERVAL:
+        scheduler_stats['overruns'] += 1
+    scheduler_stats['max_tick_ms'] = max(scheduler_stats['max_tick_ms'], tick_time * 1000.0)
+    set_metric_property(VC_INTEGER, 'TickOverruns', scheduler_stats['overruns'])
+    set_metric_property(VC_INTEGER, 'DeferredPlans', scheduler_stats['deferred_plans'])
+    set_metric_property(VC_INTEGER, 'PlanningQueueLength', len(planning_queue))
+    set_metric_property(VC_REAL, 'MaxTickMs', scheduler_stats['max_tick_ms'])
+    set_metric_property(VC_REAL, 'RouteCacheHitRate', get_route_cache_hit_rate())
+
+def reset_scheduler():
+    """Empty the planning queue and zero the scheduler counters and their properties"""
+    planning_queue.clear()
+    planning_queued.clear()
+    planning_deferred.clear()
+    for name in scheduler_stats:
+        scheduler_stats[name] = 0
+    for prop_name, prop in metric_properties.items():
+        if prop_name in SCHEDULER_PROPERTY_NAMES:
+            prop.Value = 0
+
+def plan_robot_route(robot, robot_index, pathways_dict, conveyor_components, conveyors):
+    """Plan and reserve a route from the robot's position to its Target; on failure the robot stops and waits"""
+    endpoints = get_route_endpoints(robot, robot_index, pathways_dict, conveyor_components, conveyors)
+    if endpoints is None:
+        return
+    start_pathway, goal_pathway, pathways = endpoints
+
+    # Use reservation-based pathfinding
+    shortest_path = find_shortest_path_with_reservations(start_pathway, goal_pathway, pathways, robot_index)
+    start_route(robot_index, shortest_path, goal_pathway['Name'], conveyor_components, conveyors)
+
+def plan_batch_routes(pathways_dict, conveyor_components, conveyors):
+    """Plan up to CBS_MAX_ROBOTS queued robots together; returns the number of robots planned"""
+    batch = []
+    while planning_queue and len(batch) < CBS_MAX_ROBOTS:
+        robot_index = planning_queue.popleft()
+        planning_queued.discard(robot_index)
+        planning_deferred.discard(robot_index)
+        robot = find_robot_by_index(robot_index)
+        if robot is not None and robot_index in robot_states and needs_route(robot_index):
+            batch.append((robot, robot_index))
+
+    requests = {}
+    for robot, robot_index in batch:
+        endpoints = get_route_endpoints(robot, robot_index, pathways_dict, conveyor_components, conveyors)
+        if endpoints is not None:
+            requests[robot_index] = endpoints
+
+    solutions = {}
+    if len(requests) > 1:
+        planner_stats['batches'] += 1
+        solutions = solve_batch_routes(requests)
+        if solutions is None:
+            # Search limit reached: plan the batch one by one in queue order as without batch planning
+            planner_stats['batch_fallbacks'] += 1
+            solutions = {}
+
+    for robot, robot_index in batch:
+        if robot_index in solutions:
+            planned_entry_times[robot_index] = solutions[robot_index]['timed']
+            start_route(robot_index, solutions[robot_index]['path'], requests[robot_index][1]['Name'], conveyor_components, conveyors)
+    # Robots without a joint route, e.g. those no route was found for, plan on their own against the batch's reservations
+    for robot, robot_index in batch:
+        if robot_index not in solutions:
+            plan_robot_route(robot, robot_index, pathways_dict, conveyor_components, conveyors)
+    return len(batch)
+
+def get_route_endpoints(robot, robot_index, pathways_dict, conveyor_components, conveyors):
+    """Start and goal pathway dicts of the robot's route to its Target and the pathways to search, or None"""
+    robot_pos = getRobotPosition(robot)
+    start_pathway = {
+        "Name": "Robot Start",
+        "X": robot_pos.X,
+        "Y": robot_pos.Y,
+        "Rz": 0,
+        "AreaLength": 0,
+        "AreaWidth": 0
+    }
+
+    goal_pathway_name = get_robot_property_value('Target', robot_index)
+
+    if not goal_pathway_name:
+        return None
+    
+
+
+    if goal_pathway_name in conveyor_components:
+        conveyor = conveyors[goal_pathway_name]
+        if conveyor:
+            goal_pathway = {
+                "Name": goal_pathway_name,
+                "X": conveyor.WorldPositionMatrix.P.X,
+                "Y": conveyor.WorldPositionMatrix.P.Y,
+                "Rz": 0,
+                "AreaLength": conveyor.getProperty('ConveyorLength').Value if conveyor.getProperty('ConveyorLength') else 0,
+                "AreaWidth": conveyor.getProperty('ConveyorWidth').Value if conveyor.getProperty('ConveyorWidth') else 0
+            }
+        else:
+            return None
+    else:
+        goal_pathway = next((p for p in pathways_dict if p['Name'] == goal_pathway_name), None)
+
+    if not goal_pathway:
+        return None
+
+    return start_pathway, goal_pathway, pathways_dict + [goal_pathway]
+
+def start_route(robot_index, shortest_path, goal_pathway_name, conveyor_components, conveyors):
+    """Reserve a planned route and set the robot moving along it; without a route the robot stops and waits"""
+    if shortest_path:
+        # Separate pathways from conveyors - conveyors are destinations, not pathways to traverse
+        pathways_robot = [find_component(p['Name']) for p in shortest_path[1:] if p['Name'] not in conveyor_components]
+        conveyor_destination = None
+        
+        if goal_pathway_name in conveyor_components:
+            conveyor_destination = conveyors[goal_pathway_name]
+
+        # Planned waits: times before which the robot may not enter each pathway
+        timed = planned_entry_times.get(robot_index, {})
+        hold_until = [timed[p.Name][2] if p.Name in timed else 0.0 for p in pathways_robot]
+
+        # Try to reserve the pathway portion only (excluding conveyor destination)
+        if reserve_planned_path(robot_index, pathways_robot):
+            # Clear location when starting new journey (robot is no longer "at" previous conveyor)
+            set_robot_property('Location', '', robot_index)
+            set_robot_property('NextLocation', '', robot_index)
             
-            # Only handle conveyor interactions when robot has reached conveyor destination
-            # (not while still moving through pathways)
-            robot_moving = robot_states[robot_index]['moving']
-            conveyor_destination = robot_states[robot_index].get('conveyor_destination')
-            current_location = get_robot_property_value('Location', robot_index)
+            robot_states[robot_index]['pathways'] = pathways_robot
+            robot_states[robot_index]['hold_until'] = hold_until
+            robot_states[robot_index]['conveyor_destination'] = conveyor_destination
+            robot_states[robot_index]['current_pathway_index'] = 0
+            robot_states[robot_index]['moving'] = True
+            robot_states[robot_index]['vehicle_initialized'] = False  # Reset vehicle for new journey
+            record_readiness_metric('first_move', 'TimeToFirstMove')
+        else:
+            # Path reservation failed - robot will wait and try again
+            set_robot_property('Stop', True, robot_index)
+            # Clear any previous conveyor destination
+            robot_states[robot_index]['conveyor_destination'] = None
+    else:
+        # No path found - robot will wait
+        set_robot_property('Stop', True, robot_index)
+        # Clear any previous conveyor destination
+        robot_states[robot_index]['conveyor_destination'] = None
+
+def handle_conveyor_interaction(robot, robot_index, conveyor_components, conveyors):
+    """Handle pickup and drop-off with proximity-based detection once a robot is at its target conveyor"""
+    goal_pathway_name = get_robot_property_value('Target', robot_index)
+    robot_pos = getRobotPosition(robot)
+    
+    # Only handle conveyor interactions when robot has reached conveyor destination
+    # (not while still moving through pathways)
+    robot_moving = robot_states[robot_index]['moving']
+    current_location = get_robot_property_value('Location', robot_index)
+    
+    # Update robot location when near target conveyors for OPC-UA (immediate update)
+    if goal_pathway_name and goal_pathway_name in conveyor_components:
+        target_conveyor = conveyors.get(goal_pathway_name)
+        if target_conveyor:
+            conveyor_pos = target_conveyor.WorldPositionMatrix.P
+            distance_to_conveyor = vector_distance(robot_pos, conveyor_pos)
             
-            # Update robot location when near target conveyors for OPC-UA (immediate update)
-            if goal_pathway_name and goal_pathway_name in conveyor_components:
-                target_conveyor = conveyors.get(goal_pathway_name)
-                if target_conveyor:
-                    conveyor_pos = target_conveyor.WorldPositionMatrix.P
-                    distance_to_conveyor = vector_length(vector_subtract(robot_pos, conveyor_pos))
-                    
-                    # Set location when robot is close to conveyor (for OPC-UA monitoring)
-                    if distance_to_conveyor < 1500:
-                        if current_location != goal_pathway_name:
-                            set_robot_property('Location', goal_pathway_name, robot_index)
-                            set_robot_property('NextLocation', '', robot_index)
-
-            # Only handle component pickup/drop-off when robot is at conveyor destination (not moving)
-            if not robot_moving and current_location in conveyor_components:
-                if is_input_conveyor(goal_pathway_name):
-                    # Check if robot is at the target conveyor (for pickup)
-                    target_conveyor = conveyors.get(goal_pathway_name)
-                    carried_product = get_robot_property_value('CarriedProduct', robot_index)
-                    
-                    # Check if robot is not already carrying something and is at the right conveyor
-                    if target_conveyor and (not carried_product or carried_product == '') and current_location == goal_pathway_name:
-                        conveyor_pos = target_conveyor.WorldPositionMatrix.P
-                        distance_to_conveyor = vector_length(vector_subtract(robot_pos, conveyor_pos))
-                        
-                        if distance_to_conveyor < 2000:  # Within pickup range at destination
-                            # Find any produced component on this input conveyor, regardless of product type
-                            component_name = findAnyComponentOnInputConveyor(goal_pathway_name)
-                            if component_name:
-                                # Double-check that no other robot is currently carrying this component
-                                component = app.findComponent(component_name)
-                                if component:
-                                    attached_to_prop = component.getProperty('AttachedToRobot')
-                                    if not attached_to_prop or not attached_to_prop.Value or attached_to_prop.Value.strip() == '':
-                                        # Try to attach the component
-                                        if attachComponentToRobot(component_name, robot):
-                                            # Don't set CarryingProduct here - let OPC-UA handle it
-                                            set_robot_property('CarriedProduct', component_name, robot_index)
-                                
-                elif is_output_conveyor(goal_pathway_name):
-                    # Check if robot is at the target conveyor (for drop-off)
-                    target_conveyor = conveyors.get(goal_pathway_name)
-                    
-                    # Check if robot should drop off and is at the right conveyor
-                    carrying_product = get_robot_property_value('CarryingProduct', robot_index)
-                    carried_product_name = get_robot_property_value('CarriedProduct', robot_index)
-                    is_actually_carrying = carrying_product or (carried_product_name and carried_product_name != '')
-                    
-                    if target_conveyor and is_actually_carrying and current_location == goal_pathway_name:
-                        conveyor_pos = target_conveyor.WorldPositionMatrix.P
-                        distance_to_conveyor = vector_length(vector_subtract(robot_pos, conveyor_pos))
+            # Set location when robot is close to conveyor (for OPC-UA monitoring)
+            if distance_to_conveyor < 1500:
+                if current_location != goal_pathway_name:
+                    set_robot_property('Location', goal_pathway_name, robot_index)
+                    set_robot_property('NextLocation', '', robot_index)
+
+    # Only handle component pickup/drop-off when robot is at conveyor destination (not moving)
+    if not robot_moving and current_location in conveyor_components:
+        if is_input_conveyor(goal_pathway_name):
+            # Check if robot is at the target conveyor (for pickup)
+            target_conveyor = conveyors.get(goal_pathway_name)
+            carried_product = get_robot_property_value('CarriedProduct', robot_index)
+            
+            # Check if robot is not already carrying something and is at the right conveyor
+            if target_conveyor and (not carried_product or carried_product == '') and current_location == goal_pathway_name:
+                conveyor_pos = target_conveyor.WorldPositionMatrix.P
+                distance_to_conveyor = vector_distance(robot_pos, conveyor_pos)
+                
+                if distance_to_conveyor < 2000:  # Within pickup range at destination
+                    # Find any produced component on this input conveyor, regardless of product type
+                    component_name = findAnyComponentOnInputConveyor(goal_pathway_name)
+                    if component_name:
+                        # Double-check that no other robot is currently carrying this component
+                        component = find_component(component_name)
+                        if component:
+                            attached_to_prop = component.getProperty('AttachedToRobot')
+                            if not attached_to_prop or not attached_to_prop.Value or attached_to_prop.Value.strip() == '':
+                                # Try to attach the component
+                                if attachComponentToRobot(component_name, robot):
+                                    pop_product(goal_pathway_name, component)
+                                    # Don't set CarryingProduct here - let OPC-UA handle it
+                                    set_robot_property('CarriedProduct', component_name, robot_index)
                         
-                        if distance_to_conveyor < 2000:  # Within drop-off range at destination
-                            carried_product = get_robot_property_value('CarriedProduct', robot_index)
-                            if carried_product and carried_product.strip() != '':
-                                relocateComponentOnConveyor(carried_product, target_conveyor, robot)
-                                # Don't set CarryingProduct to False here - let OPC-UA handle it
-                                set_robot_property('CarriedProduct', '', robot_index)
-                                set_robot_property('Target', '', robot_index)
-                                # Don't clear location immediately - keep robot "at conveyor" for OPC-UA monitoring
-                                # Location will be cleared when robot gets new target and starts moving
-                                set_robot_property('NextLocation', '', robot_index)
+        elif is_output_conveyor(goal_pathway_name):
+            # Check if robot is at the target conveyor (for drop-off)
+            target_conveyor = conveyors.get(goal_pathway_name)
+            
+            # Check if robot should drop off and is at the right conveyor
+            carrying_product = get_robot_property_value('CarryingProduct', robot_index)
+            carried_product_name = get_robot_property_value('CarriedProduct', robot_index)
+            is_actually_carrying = carrying_product or (carried_product_name and carried_product_name != '')
+            
+            if target_conveyor and is_actually_carrying and current_location == goal_pathway_name:
+                conveyor_pos = target_conveyor.WorldPositionMatrix.P
+                distance_to_conveyor = vector_distance(robot_pos, conveyor_pos)
                 
+                if distance_to_conveyor < 2000:  # Within drop-off range at destination
+                    carried_product = get_robot_property_value('CarriedProduct', robot_index)
+                    if carried_product and carried_product.strip() != '':
+                        relocateComponentOnConveyor(carried_product, target_conveyor, robot)
+                        # Don't set CarryingProduct to False here - let OPC-UA handle it
+                        set_robot_property('CarriedProduct', '', robot_index)
+                        set_robot_property('Target', '', robot_index)
+                        # Don't clear location immediately - keep robot "at conveyor" for OPC-UA monitoring
+                        # Location will be cleared when robot gets new target and starts moving
+                        set_robot_property('NextLocation', '', robot_index)
 
-
-        delay(0.1)
+def is_entry_held(robot_state, robot_index, index):
+    """Pathway `index` of the journey is one the space-time plan waits for, and another robot still holds it"""
+    hold_until = robot_state.get('hold_until')
+    if not hold_until or index >= len(hold_until) or not hold_until[index]:
+        return False
+    # Enter as soon as the pathway is free instead of holding until the planned time
+    return not is_pathway_available(robot_state['pathways'][index].Name, robot_index)
 
 def move_robot_incremental(robot, vehicle, robot_index, robot_state):
     """Smooth robot movement - prevents teleporting and freezing"""
@@ -2709,6 +4340,10 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
     pathways = robot_state['pathways']
     i = robot_state['current_pathway_index']
 
+    # Planned wait before the first pathway of the journey
+    if i == 0 and pathways and not robot_state['vehicle_initialized'] and is_entry_held(robot_state, robot_index, 0):
+        return
+
     if i >= len(pathways):
         # Robot has completed all pathways - now handle conveyor destination if exists
         conveyor_destination = robot_state.get('conveyor_destination')
@@ -2716,7 +4351,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
             # Move to conveyor destination
             conveyor_pos = conveyor_destination.WorldPositionMatrix.P
             robot_pos = getRobotPosition(robot)
-            distance_to_conveyor = vector_length(vector_subtract(robot_pos, conveyor_pos))
+            distance_to_conveyor = vector_distance(robot_pos, conveyor_pos)
             
             # Check if robot is close enough to the conveyor
             if distance_to_conveyor < 1500:  # Within conveyor reach
@@ -2745,7 +4380,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                         # Use the correct vehicle movement method
                         vehicle.clearMove()
                         vehicle.MaxSpeed = 800
-                        vehicle.addControlPoint(adjusted_target)
+                        vehicle.addControlPoint(to_vc_vector(adjusted_target))
                         robot_state['vehicle_initialized'] = True
                 
                 # Periodically recalculate collision avoidance for conveyor movement
@@ -2766,7 +4401,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                         robot_state['stuck_timer'] = 0
                     else:
                         # Check if robot has moved
-                        prev_distance = vector_length(vector_subtract(robot_pos, robot_state['prev_pos']))
+                        prev_distance = vector_distance(robot_pos, robot_state['prev_pos'])
                         if prev_distance < 50:  # Robot hasn't moved much
                             robot_state['stuck_timer'] = robot_state.get('stuck_timer', 0) + 0.1
                             if robot_state['stuck_timer'] > 2.0:  # Stuck for 2 seconds
@@ -2792,39 +4427,18 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
     robot_pos = getRobotPosition(robot)
 
     def is_point_in_pathway(point, pathway):
-        pos = pathway.WorldPositionMatrix.P
-        N = pathway.WorldPositionMatrix.N
-        direction = normalize_vector(N)
-        
-        length1 = pathway.getProperty('Length1').Value if pathway.getProperty('Length1') else 0
-        length2 = pathway.getProperty('Length2').Value if pathway.getProperty('Length2') else 0
-        width1 = pathway.getProperty('Width1').Value if pathway.getProperty('Width1') else 0
-        width2 = pathway.getProperty('Width2').Value if pathway.getProperty('Width2') else 0
-        
-        if is_conveyor(pathway.Name):
-            conveyor_length = pathway.getProperty('ConveyorLength').Value if pathway.getProperty('ConveyorLength') else 0
-            length1 = length2 = conveyor_length / 2
-            width1 = width2 = pathway.getProperty('ConveyorWidth').Value if pathway.getProperty('ConveyorWidth') else 0
-
-        start_point = vector_subtract(pos, vector_multiply(direction, length1))
-        end_point = vector_add(pos, vector_multiply(direction, length2))
-        
-        perp_direction = vcVector.new(-direction.Y, direction.X, 0)
+        geometry = get_pathway_geometry(pathway)
+        direction = geometry['direction']
+        start_point = geometry['start_center']
+        end_point = geometry['end_center']
+        perp_direction = geometry['perpendicular']
         
         rel_vector = vector_subtract(point, start_point)
-        along_path = vector_length(vcVector.new(
-            rel_vector.X * direction.X + rel_vector.Y * direction.Y,
-            0,
-            0
-        ))
-        across_path = abs(vector_length(vcVector.new(
-            rel_vector.X * perp_direction.X + rel_vector.Y * perp_direction.Y,
-            0,
-            0
-        )))
-        
-        total_length = vector_length(vector_subtract(end_point, start_point))
-        max_width = max(width1, width2)
+        along_path = abs(rel_vector.X * direction.X + rel_vector.Y * direction.Y)
+        across_path = abs(rel_vector.X * perp_direction.X + rel_vector.Y * perp_direction.Y)
+        
+        total_length = vector_distance(end_point, start_point)
+        max_width = max(geometry['width1'], geometry['width2'])
         
         return 0 <= along_path <= total_length and across_path <= max_width/2
 
@@ -2839,22 +4453,11 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
         
         # For pathway-to-pathway transitions, use smart exit points
         # IMPORTANT: Only transition if robot is near the EXIT point of current pathway
-        curr_pos = current_pathway.WorldPositionMatrix.P
-        curr_length1 = current_pathway.getProperty('Length1').Value if current_pathway.getProperty('Length1') else 0
-        curr_length2 = current_pathway.getProperty('Length2').Value if current_pathway.getProperty('Length2') else 0
-        
-        if is_conveyor(current_pathway.Name):
-            conveyor_length = current_pathway.getProperty('ConveyorLength').Value if current_pathway.getProperty('ConveyorLength') else 0
-            curr_length1 = curr_length2 = conveyor_length / 2
-
-        curr_N = current_pathway.WorldPositionMatrix.N
-        curr_direction = normalize_vector(curr_N)
-        
         # Calculate the planned exit point for this pathway
         planned_exit_point, _ = calculate_smart_entry_exit_points(robot_pos, current_pathway, next_pathway)
         
         # Only allow transition if robot is VERY close to the planned exit point
-        distance_to_exit = vector_length(vector_subtract(robot_pos, planned_exit_point))
+        distance_to_exit = vector_distance(robot_pos, planned_exit_point)
         
         # Strict transition criteria - robot must be at the exit point
         if distance_to_exit < 800:  # Must be within 800 units of exit point
@@ -2866,6 +4469,9 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
         
         # ONLY transition if robot has reached the proper exit point
         if can_transition_direct and distance_to_exit < 800:
+            if is_entry_held(robot_state, robot_index, i + 1):
+                # Planned wait: stay at the exit until the next pathway is free
+                return
             set_robot_property('Location', next_pathway.Name, robot_index)
             if i + 2 < len(pathways):
                 set_robot_property('NextLocation', pathways[i + 2].Name, robot_index)
@@ -2890,33 +4496,24 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
             # Robot must traverse the COMPLETE pathway before transitioning to conveyor
             
             # Calculate if robot has reached the END of the current pathway
-            curr_pos = current_pathway.WorldPositionMatrix.P
-            curr_length1 = current_pathway.getProperty('Length1').Value if current_pathway.getProperty('Length1') else 0
-            curr_length2 = current_pathway.getProperty('Length2').Value if current_pathway.getProperty('Length2') else 0
-            
-            if is_conveyor(current_pathway.Name):
-                conveyor_length = current_pathway.getProperty('ConveyorLength').Value if current_pathway.getProperty('ConveyorLength') else 0
-                curr_length1 = curr_length2 = conveyor_length / 2
-
-            curr_N = current_pathway.WorldPositionMatrix.N
-            curr_direction = normalize_vector(curr_N)
+            curr_geometry = get_pathway_geometry(current_pathway)
             
             # Calculate both ends of the pathway
-            start_point = vector_subtract(curr_pos, vector_multiply(curr_direction, curr_length1))
-            end_point = vector_add(curr_pos, vector_multiply(curr_direction, curr_length2))
+            start_point = curr_geometry['start_center']
+            end_point = curr_geometry['end_center']
             
             # Check distance to both ends to see which one robot should reach
-            distance_to_start = vector_length(vector_subtract(robot_pos, start_point))
-            distance_to_end = vector_length(vector_subtract(robot_pos, end_point))
+            distance_to_start = vector_distance(robot_pos, start_point)
+            distance_to_end = vector_distance(robot_pos, end_point)
             
             # Determine which end the robot should reach based on conveyor position
             conveyor_pos = conveyor_destination.WorldPositionMatrix.P
-            distance_start_to_conveyor = vector_length(vector_subtract(conveyor_pos, start_point))
-            distance_end_to_conveyor = vector_length(vector_subtract(conveyor_pos, end_point))
+            distance_start_to_conveyor = vector_distance(conveyor_pos, start_point)
+            distance_end_to_conveyor = vector_distance(conveyor_pos, end_point)
             
             # Robot should reach the end that's closer to the conveyor
             target_end = start_point if distance_start_to_conveyor < distance_end_to_conveyor else end_point
-            distance_to_target_end = vector_length(vector_subtract(robot_pos, target_end))
+            distance_to_target_end = vector_distance(robot_pos, target_end)
             
             # Only transition to conveyor mode when robot has reached the appropriate end
             if distance_to_target_end < 600:  # Within 600 units of pathway end
@@ -2935,6 +4532,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
         robot_state['stop_start_time'] = 0
     
     current_time = sim.SimTime
+    stop_overridden = False
     
     if should_stop:
         if robot_state['stop_start_time'] == 0:
@@ -2950,11 +4548,13 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                 robot_state['stop_start_time'] = 0
                 robot_state['vehicle_initialized'] = False  # Force re-initialization with offset
                 should_stop = False  # Allow coordinated movement
+                stop_overridden = True
             elif stop_duration > 0.8:  # Reduced from 1.0 second - faster recovery
                 # Force movement to prevent permanent freezing
                 should_stop = False
                 robot_state['stop_start_time'] = 0
                 robot_state['consecutive_stops'] = 0
+                stop_overridden = True
             
         # Apply stop with speed reduction instead of complete halt for coordination scenarios
         if should_stop and vehicle:
@@ -2990,24 +4590,14 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
             # Robot must complete the ENTIRE pathway using traditional traversal
             # Do NOT optimize toward conveyor - complete the pathway first!
             
-            pos = current_pathway.WorldPositionMatrix.P
-            length1 = current_pathway.getProperty('Length1').Value if current_pathway.getProperty('Length1') else 0
-            length2 = current_pathway.getProperty('Length2').Value if current_pathway.getProperty('Length2') else 0
-
-            if is_conveyor(current_pathway.Name):
-                conveyor_length = current_pathway.getProperty('ConveyorLength').Value if current_pathway.getProperty('ConveyorLength') else 0
-                length1 = length2 = conveyor_length / 2
-
-            N = current_pathway.WorldPositionMatrix.N
-            direction_vector = normalize_vector(N)
-
-            start_point = vector_subtract(pos, vector_multiply(direction_vector, length1))
-            end_point = vector_add(pos, vector_multiply(direction_vector, length2))
+            geometry = get_pathway_geometry(current_pathway)
+            start_point = geometry['start_center']
+            end_point = geometry['end_center']
             
             # Determine which end is closer to the conveyor destination
             conveyor_pos = conveyor_destination.WorldPositionMatrix.P
-            distance_start_to_conveyor = vector_length(vector_subtract(conveyor_pos, start_point))
-            distance_end_to_conveyor = vector_length(vector_subtract(conveyor_pos, end_point))
+            distance_start_to_conveyor = vector_distance(conveyor_pos, start_point)
+            distance_end_to_conveyor = vector_distance(conveyor_pos, end_point)
             
             # Target the end that's closer to conveyor
             target_end = start_point if distance_start_to_conveyor < distance_end_to_conveyor else end_point
@@ -3017,11 +4607,11 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
             pathway_points = []
             for j in range(num_points + 1):
                 t = j / num_points
-                interp_vector = vector_add(start_point, vector_multiply(vector_subtract(end_point, start_point), t))
+                interp_vector = vector_lerp(start_point, end_point, t)
                 pathway_points.append(interp_vector)
 
             # Find closest point to robot's current position
-            closest_point = min(pathway_points, key=lambda p: vector_length(vector_subtract(p, robot_pos)))
+            closest_point = min(pathway_points, key=lambda p: vector_distance(p, robot_pos))
             closest_index = pathway_points.index(closest_point)
             
             # Create control points to traverse toward the target end
@@ -3033,7 +4623,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                 control_points = list(reversed(pathway_points[:closest_index + 1]))
             
             # Ensure we have the target end as final point
-            if control_points and vector_length(vector_subtract(control_points[-1], target_end)) > 100:
+            if control_points and vector_distance(control_points[-1], target_end) > 100:
                 control_points.append(target_end)
             elif not control_points:
                 control_points = [target_end]
@@ -3055,9 +4645,9 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                 if intermediate_points:
                     # Check if intermediate points provide a shorter or smoother path
                     for intermediate in intermediate_points:
-                        distance_via_intermediate = (vector_length(vector_subtract(intermediate, robot_pos)) + 
-                                                   vector_length(vector_subtract(exit_point, intermediate)))
-                        direct_distance = vector_length(vector_subtract(exit_point, robot_pos))
+                        distance_via_intermediate = (vector_distance(intermediate, robot_pos) + 
+                                                   vector_distance(exit_point, intermediate))
+                        direct_distance = vector_distance(exit_point, robot_pos)
                         
                         # Use intermediate point if it's not much longer and provides better navigation
                         if distance_via_intermediate < direct_distance * 1.2:  # Allow 20% longer path for smoother movement
@@ -3067,8 +4657,8 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                 
             else:
                 # Robot needs to enter pathway first
-                distance_to_entry = vector_length(vector_subtract(robot_pos, entry_point))
-                distance_to_exit = vector_length(vector_subtract(robot_pos, exit_point))
+                distance_to_entry = vector_distance(robot_pos, entry_point)
+                distance_to_exit = vector_distance(robot_pos, exit_point)
                 
                 # Smart entry decision
                 if distance_to_exit < distance_to_entry * 0.7:  # If much closer to exit, go directly
@@ -3087,7 +4677,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
             if not filtered_points:
                 filtered_points.append(point)
             else:
-                distance_to_last = vector_length(vector_subtract(point, filtered_points[-1]))
+                distance_to_last = vector_distance(point, filtered_points[-1])
                 if distance_to_last > min_distance_between_points:
                     filtered_points.append(point)
         
@@ -3106,7 +4696,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
             control_points = optimized_points
 
         # Handle coordinated side-by-side movement - STABLE ASSIGNMENT (no zigzag)
-        lateral_offset = vcVector.new(0, 0, 0)
+        lateral_offset = Vec3(0, 0, 0)
         
         # Check if robot is in coordinated side-by-side mode
         if robot_index in robot_states and robot_states[robot_index].get('coordinate_side_by_side', False):
@@ -3138,22 +4728,23 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                 if current_time - coordination_start_time < min_coordination_time:
                     coordination_complete = False
                 else:
+                    # Check for intersection areas, where the safe distance is increased further
+                    # (does not depend on the other robot, so it is counted once on first use)
+                    nearby_pathways = None
+                    
                     # Check distance to all other robots - INCREASED DISTANCE THRESHOLD
                     for other_robot in robots:
                         if other_robot != robot:
-                            other_robot_index = get_robot_index(other_robot.Name)
-                            other_pos = getRobotPosition(other_robot)
-                            dist = vector_length(vector_subtract(robot_pos, other_pos))
+                            other_robot_index = get_index_of_robot(other_robot)
+                            dist = get_robot_distance(robot_index, other_robot_index)
                             
                             # Extended safe distance especially in intersection areas
                             safe_distance = 4500  # Increased from 3500
                             
-                            # Check for intersection areas and increase safe distance further
-                            nearby_pathways = 0
-                            for other_pathway in app.Components:
-                                if (other_pathway.Name.startswith('Pathway Area') or 
-                                    other_pathway.Name.startswith('Idle Location')):
-                                    pathway_distance = vector_length(vector_subtract(robot_pos, other_pathway.WorldPositionMatrix.P))
+                            if nearby_pathways is None:
+                                nearby_pathways = 0
+                                for other_pathway in get_pathway_components():
+                                    pathway_distance = vector_distance(robot_pos, other_pathway.WorldPositionMatrix.P)
                                     if pathway_distance < 3000:  # Within intersection zone
                                         nearby_pathways += 1
                             
@@ -3172,7 +4763,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                             
                             if self_direction and other_direction:
                                 # Calculate angle between directions
-                                dot_product = self_direction.X * other_direction.X + self_direction.Y * other_direction.Y
+                                dot_product = get_heading_dot(robot_index, other_robot_index)
                                 # If robots are still moving towards each other (dot < 0), maintain coordination
                                 if dot_product < -0.3 and dist < safe_distance * 1.2:  # 20% larger buffer for opposing movements
                                     coordination_complete = False
@@ -3185,7 +4776,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                         del robot_states[robot_index]['stable_offset']
                     if 'coordination_start_time' in robot_states[robot_index]:
                         del robot_states[robot_index]['coordination_start_time']
-                    lateral_offset = vcVector.new(0, 0, 0)  # Return to center only when safe
+                    lateral_offset = Vec3(0, 0, 0)  # Return to center only when safe
         
         # Check for bypass scenarios (only if not in coordination)
         elif robot_index in robot_states and 'bypass_target' in robot_states[robot_index]:
@@ -3215,7 +4806,7 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
 
         # Add control points after setting all properties
         for point in offset_control_points:
-            vehicle.addControlPoint(point)
+            vehicle.addControlPoint(to_vc_vector(point))
 
         set_robot_property('Location', current_pathway.Name, robot_index)
         if i + 1 < len(pathways):
@@ -3229,9 +4820,9 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
 
     # Progress through movement smoothly
     if robot_state['elapsed_time'] < robot_state['total_move_time']:
-        # Check for stops but don't freeze permanently
+        # Check for stops but don't freeze permanently; a stop overridden above must not halt the robot again
         current_should_stop = get_robot_property_value('Stop', robot_index)
-        if current_should_stop and robot_state['stop_start_time'] == 0:
+        if current_should_stop and robot_state['stop_start_time'] == 0 and not stop_overridden:
             if vehicle:
                 # Clear move to avoid interpolation errors when stopping
                 vehicle.clearMove()
@@ -3239,6 +4830,9 @@ def move_robot_incremental(robot, vehicle, robot_index, robot_state):
                 robot_state['vehicle_initialized'] = False
             return
         robot_state['elapsed_time'] += 0.1
+    elif is_entry_held(robot_state, robot_index, i + 1):
+        # Planned wait: stay at the end of this pathway until the next one is free
+        return
     else:
         robot_state['current_pathway_index'] += 1
         robot_state['vehicle_initialized'] = False
@@ -3261,7 +4855,7 @@ def OnSimulationUpdate(time):
     OnSimulationUpdate.last_update = current_time
     
     for robot in robots:
-        robot_index = get_robot_index(robot.Name)
+        robot_index = get_index_of_robot(robot)
         robot_pos = getRobotPosition(robot)
         if robot_index in robot_states:
             vehicle = robot_states[robot_index]['vehicle']
@@ -3270,6 +4864,8 @@ def OnSimulationUpdate(time):
         
         # Apply collision detection less frequently
         check_proximity(robot, robot_index)
+    
+    flush_robot_writes()
 
 def OnReset():
     global robots, robot_states, cloned_robots, pathway_reservations, robot_planned_paths
@@ -3283,9 +4879,9 @@ def OnReset():
         # No need to detach wagons since we're not using vehicle wagon system
         pass
     
-    # Clear AttachedToRobot property from all components
+    # Clear AttachedToRobot property from all produced components
     try:
-        for component in app.Components:
+        for component in get_product_components():
             attached_to_prop = component.getProperty('AttachedToRobot')
             if attached_to_prop:
                 attached_to_prop.Value = ''
@@ -3299,11 +4895,22 @@ def OnReset():
 
     # Clear robots and states
     robots = []
+    register_robots()
+    clear_layout_built('robot')
+    set_render_flush_loop(False)
+    for name in readiness_metrics:
+        readiness_metrics[name] = None
     robot_states = {}
     
     # Clear reservation system
     pathway_reservations = {}
     robot_planned_paths = {}
+    planned_entry_times.clear()
+    for name in planner_stats:
+        planner_stats[name] = 0
+    route_cache.clear()
+    reset_profile_stats()
+    reset_scheduler()
 
     # Delete cloned robots
     for robot in cloned_robots:
@@ -3312,6 +4919,8 @@ def OnReset():
     cloned_robots = []
 
     # Reset properties for each robot
+    reset_robot_snapshot()
+    invalidate_robot_spatial_index()
     for i in range(1, min(robot_quantity, MAX_ROBOTS) + 1):
         for prop_name in property_names:
             unique_prop_name = '{0}{1}'.format(prop_name, i)
@@ -0,0 +1,463 @@
+"""
+Tests for the headless simulation: a short run of the template layout with
+scripted agents must keep its delivery count and timing, and the optional
+features (output sink, profiling, space-time and CBS planning) and shared
+helpers (payload cache, product pool, layout diffs) keep their behaviour.
+"""
+
+import os
+import sys
+import json
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'VCSimulation'))
+
+from HeadlessRuntime import HeadlessRuntime, LAYOUT_FILES
+from PathfindingBenchmark import BenchmarkScene, generate_layout
+
+LAYOUT_DIRECTORY = os.path.join(HERE, os.pardir, 'MultiAgentSystem')
+ROBOT_TEMPLATE_NAME = '_Template_Mobile_Robot_Resource'
+PATHWAY_TEMPLATE_NAME = '_Template_Pathway_Area'
+OUTPUT_TEMPLATE_NAME = '_Template_OutputConveyor'
+INPUT_TEMPLATE_NAME = '_Template_InputConveyor'
+PRODUCT_TEMPLATE_NAME = 'Component1'
+INPUT_CONVEYORS = ('InputConveyor', 'InputConveyor #2')
+OUTPUT_CONVEYORS = ('OutputConveyor #1', 'OutputConveyor #2')
+
+ROBOT_QUANTITY = 4
+DURATION = 1200.0
+AGENT_INTERVAL = 1.0  # simulated seconds between two passes of the scripted agents
+
+
+def script_namespace(runtime, component_name):
+    """Module globals of the script on a template component"""
+    return [c for c in runtime.contexts if c.component.Name == component_name][0].namespace
+
+
+def start_runtime(settings=None):
+    """Started HeadlessRuntime; settings maps a template name to module-level values of its script to override"""
+    runtime = HeadlessRuntime()
+    runtime.load_configuration()
+    runtime.start()
+    for component_name, values in (settings or {}).items():
+        script_namespace(runtime, component_name).update(values)
+    return runtime
+
+
+def run_deliveries(robot_quantity=ROBOT_QUANTITY, duration=DURATION, settings=None, runtime=None):
+    """Run the template layout with agents that fetch from an input and deliver to an output; returns delivery times
+
+    settings is passed to start_runtime; a runtime passed in instead is left running for the caller to inspect and stop
+    """
+    own_runtime = runtime is None
+    if own_runtime:
+        runtime = start_runtime(settings)
+    # Plan every queued robot in its tick, so the result does not depend on the speed of the machine
+    script_namespace(runtime, ROBOT_TEMPLATE_NAME)['PLANNING_TICK_BUDGET'] = 1.0e9
+    runtime.run(duration=0.05)
+    runtime.load_layout(LAYOUT_DIRECTORY, robot_quantity)
+
+    phases = dict((robot_index, 'fetch') for robot_index in range(1, robot_quantity + 1))
+    deliveries = []
+    try:
+        for robot_index in phases:
+            runtime.write(ROBOT_TEMPLATE_NAME, 'Target{0}'.format(robot_index), INPUT_CONVEYORS[robot_index % 2])
+        while runtime.sim_time < duration:
+            runtime.run(duration=AGENT_INTERVAL)
+            for robot_index in sorted(phases):
+                target = runtime.read(ROBOT_TEMPLATE_NAME, 'Target{0}'.format(robot_index))
+                carried = runtime.read(ROBOT_TEMPLATE_NAME, 'CarriedProduct{0}'.format(robot_index))
+                if phases[robot_index] == 'fetch' and carried:
+                    runtime.write(ROBOT_TEMPLATE_NAME, 'CarryingProduct{0}'.format(robot_index), True)
+                    runtime.write(ROBOT_TEMPLATE_NAME, 'Target{0}'.format(robot_index), OUTPUT_CONVEYORS[robot_index % 2])
+                    phases[robot_index] = 'deliver'
+                elif phases[robot_index] == 'deliver' and not carried and not target:
+                    deliveries.append(runtime.sim_time)
+                    runtime.write(ROBOT_TEMPLATE_NAME, 'CarryingProduct{0}'.format(robot_index), False)
+                    runtime.write(ROBOT_TEMPLATE_NAME, 'Target{0}'.format(robot_index), INPUT_CONVEYORS[robot_index % 2])
+                    phases[robot_index] = 'fetch'
+    finally:
+        if own_runtime:
+            runtime.stop()
+    return deliveries
+
+# Reference run: 8 deliveries in 1200 s, the first at 414 s (418 s on Python 2, where dict order breaks ties differently)
+EXPECTED_DELIVERIES = 8
+EXPECTED_FIRST_DELIVERY = 414.0
+DELIVERY_TIME_TOLERANCE = 15.0
+
+
+class HeadlessSimulationTest(unittest.TestCase):
+
+    def test_delivery_count_and_timing(self):
+        deliveries = run_deliveries()
+        self.assertEqual(len(deliveries), EXPECTED_DELIVERIES)
+        self.assertAlmostEqual(deliveries[0], EXPECTED_FIRST_DELIVERY, delta=DELIVERY_TIME_TOLERANCE)
+        self.assertEqual(deliveries, sorted(deliveries))
+
+    def test_space_time_planning_keeps_throughput(self):
+        deliveries = run_deliveries(settings={ROBOT_TEMPLATE_NAME: {'SPACE_TIME_PLANNING': True}})
+        self.assertGreaterEqual(len(deliveries), EXPECTED_DELIVERIES)
+        self.assertAlmostEqual(deliveries[0], EXPECTED_FIRST_DELIVERY, delta=DELIVERY_TIME_TOLERANCE)
+
+    def test_cbs_planning_keeps_throughput(self):
+        deliveries = run_deliveries(settings={ROBOT_TEMPLATE_NAME: {'SPACE_TIME_PLANNING': True, 'CBS_PLANNING': True}})
+        self.assertGreaterEqual(len(deliveries), EXPECTED_DELIVERIES)
+
+    def assertNoSharedIntervals(self, occupancy):
+        """occupancy: robot_index -> {pathway_name: (start, end)}; no two robots may hold a pathway at once"""
+        robot_indices = sorted(occupancy)
+        for position, robot_index in enumerate(robot_indices):
+            for other_index in robot_indices[position + 1:]:
+                for pathway_name, (start, end) in occupancy[robot_index].items():
+                    if pathway_name in occupancy[other_index]:
+                        other_start, other_end = occupancy[other_index][pathway_name]
+                        self.assertTrue(end < other_start or other_end < start,
+                                        '{0} held by robots {1} and {2}'.format(pathway_name, robot_index, other_index))
+
+    def test_cbs_batch_routes_do_not_overlap(self):
+        # Two destinations for six robots make their plans collide, so the constraint tree has to branch
+        scene = BenchmarkScene(40, 6, 0.0, seed=4, destinations=2)
+        try:
+            script = scene.robot_script
+            script['SPACE_TIME_PLANNING'] = True
+            # Only the node limit ends the search, so the result does not depend on the speed of the machine
+            script['CBS_TIME_LIMIT'] = 1.0e9
+            requests = scene.new_batch()
+            solutions = script['solve_batch_routes'](requests)
+            self.assertIsNotNone(solutions)
+            self.assertEqual(sorted(solutions), sorted(requests))
+            self.assertGreater(script['planner_stats']['batch_nodes'], 0)
+            self.assertIsNone(script['find_route_conflict'](solutions))
+            self.assertNoSharedIntervals(dict((robot_index, solution['occupancy']) for robot_index, solution in solutions.items()))
+            for robot_index, solution in solutions.items():
+                self.assertEqual(solution['path'][-1]['Name'], requests[robot_index][1]['Name'])
+            # Re-plans of the constraint tree are not route queries and do not touch the route cache
+            self.assertEqual(script['planner_stats']['queries'], 0)
+            self.assertEqual(script['planner_stats']['cache_hits'] + script['planner_stats']['cache_misses'], 0)
+        finally:
+            scene.close()
+
+    def test_cbs_plans_targets_written_in_one_tick(self):
+        runtime = start_runtime({ROBOT_TEMPLATE_NAME: {'PLANNING_TICK_BUDGET': 1.0e9, 'SPACE_TIME_PLANNING': True,
+                                                       'CBS_PLANNING': True}})
+        robot_script = script_namespace(runtime, ROBOT_TEMPLATE_NAME)
+        try:
+            runtime.run(duration=0.05)
+            runtime.load_layout(LAYOUT_DIRECTORY, ROBOT_QUANTITY)
+            for robot_index in range(1, ROBOT_QUANTITY + 1):
+                runtime.write(ROBOT_TEMPLATE_NAME, 'Target{0}'.format(robot_index), OUTPUT_CONVEYORS[robot_index % 2])
+            runtime.run(duration=0.5)
+            stats = robot_script['planner_stats']
+            self.assertEqual(stats['batches'], 1)
+            self.assertEqual(stats['batch_fallbacks'], 0)
+            self.assertEqual(stats['queries'], 0)
+            occupancy = dict((robot_index, {}) for robot_index in range(1, ROBOT_QUANTITY + 1))
+            for pathway_name, intervals in robot_script['pathway_reservations'].items():
+                for start, end, robot_index in intervals:
+                    occupancy[robot_index][pathway_name] = (start, end)
+            self.assertNoSharedIntervals(occupancy)
+            for robot_index in range(1, ROBOT_QUANTITY + 1):
+                self.assertTrue(robot_script['robot_states'][robot_index]['moving'])
+                self.assertTrue(occupancy[robot_index])
+        finally:
+            runtime.stop()
+
+    def test_readiness_barrier_passes_when_layout_arrives(self):
+        runtime = start_runtime()
+        try:
+            runtime.run(duration=0.05)
+            runtime.load_layout(LAYOUT_DIRECTORY, ROBOT_QUANTITY)
+            runtime.run(duration=1.0)
+            self.assertAlmostEqual(runtime.read(ROBOT_TEMPLATE_NAME, 'LayoutReadyTime'), 0.05, places=6)
+        finally:
+            runtime.stop()
+
+    def test_readiness_barrier_passes_without_idle_locations(self):
+        runtime = start_runtime()
+        try:
+            runtime.run(duration=0.05)
+            # No idleProperties: robots start from InitialPositions and must not wait out READINESS_TIMEOUT
+            for component_name, prop_name, file_name in LAYOUT_FILES:
+                if prop_name != 'idleProperties':
+                    with open(os.path.join(LAYOUT_DIRECTORY, file_name)) as handle:
+                        runtime.write(component_name, prop_name, handle.read())
+            runtime.write(ROBOT_TEMPLATE_NAME, 'RobotQuantity', ROBOT_QUANTITY)
+            runtime.write(ROBOT_TEMPLATE_NAME, 'Target1', INPUT_CONVEYORS[0])
+            runtime.run(duration=5.0)
+            self.assertAlmostEqual(runtime.read(ROBOT_TEMPLATE_NAME, 'LayoutReadyTime'), 0.05, places=6)
+            self.assertLess(runtime.read(ROBOT_TEMPLATE_NAME, 'TimeToFirstMove'), 1.0)
+        finally:
+            runtime.stop()
+
+    def test_layout_edits_render_while_stopped(self):
+        runtime = start_runtime()
+        try:
+            runtime.run(duration=0.05)
+            runtime.load_layout(LAYOUT_DIRECTORY, ROBOT_QUANTITY)
+            runtime.run(duration=1.0)
+            self.assertEqual(runtime.app.render_count, 1)
+            runtime.reset()
+            # No tick is left to flush a held or throttled render, so every edit renders at once
+            layout = generate_layout(8)
+            runtime.write(PATHWAY_TEMPLATE_NAME, 'pathwayProperties', json.dumps(layout))
+            self.assertEqual(runtime.app.render_count, 2)
+            layout[0]['X'] += 500.0
+            runtime.write(PATHWAY_TEMPLATE_NAME, 'pathwayProperties', json.dumps(layout))
+            self.assertEqual(runtime.app.render_count, 3)
+        finally:
+            runtime.stop()
+
+
+class OutputSinkTest(unittest.TestCase):
+
+    def test_sink_counts_deliveries_without_renaming(self):
+        runtime = start_runtime({OUTPUT_TEMPLATE_NAME: {'OUTPUT_SINK_ENABLED': True, 'OUTPUT_SINK_DWELL_TIME': 1.0}})
+        output_script = script_namespace(runtime, OUTPUT_TEMPLATE_NAME)
+        consume_product = output_script['consume_product']
+        consumed = []
+
+        def recording_consume_product(conveyor, product, current_time):
+            name = product.Name
+            consume_product(conveyor, product, current_time)
+            consumed.append((conveyor.Name, name, product.Name, product.Visible,
+                             product.getProperty('ProductType').Value, current_time))
+
+        output_script['consume_product'] = recording_consume_product
+        try:
+            deliveries = run_deliveries(runtime=runtime)
+            # Let the last delivery dwell and be consumed
+            runtime.run(duration=5.0)
+            self.assertEqual(len(deliveries), EXPECTED_DELIVERIES)
+            self.assertEqual(len(consumed), len(deliveries))
+            for conveyor_name, name_before, name_after, visible, product_type, current_time in consumed:
+                self.assertEqual(name_after, name_before)
+                self.assertFalse(visible)
+
+            last_time = consumed[-1][-1]
+            self.assertEqual(runtime.read(OUTPUT_TEMPLATE_NAME, 'DeliveredCount'), len(consumed))
+            self.assertAlmostEqual(runtime.read(OUTPUT_TEMPLATE_NAME, 'ThroughputPerHour'),
+                                   len(consumed) * 3600.0 / last_time, places=6)
+            for product_type in set(entry[4] for entry in consumed):
+                count = len([entry for entry in consumed if entry[4] == product_type])
+                self.assertEqual(runtime.read(OUTPUT_TEMPLATE_NAME, 'Delivered' + product_type), count)
+            for conveyor_name in OUTPUT_CONVEYORS:
+                count = len([entry for entry in consumed if entry[0] == conveyor_name])
+                self.assertEqual(runtime.read(conveyor_name, 'DeliveredCount') or 0, count)
+        finally:
+            runtime.stop()
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def test_profiling_publishes_calls_and_histograms(self):
+        runtime = start_runtime({ROBOT_TEMPLATE_NAME: {'PROFILING_ENABLED': True}})
+        robot_script = script_namespace(runtime, ROBOT_TEMPLATE_NAME)
+        # OnStart has already run with profiling off, so wrap the functions here
+        robot_script['enable_profiling']()
+        bounds = robot_script['PROFILE_HISTOGRAM_BOUNDS']
+        try:
+            run_deliveries(duration=60.0, runtime=runtime)
+            for function_name in robot_script['PROFILED_FUNCTIONS']:
+                self.assertTrue(hasattr(robot_script[function_name], 'profiled_function'))
+            for name in ('Tick', 'MoveRobot', 'PathPlanning', 'PickupDropoff'):
+                calls = runtime.read(ROBOT_TEMPLATE_NAME, 'Profile{0}Calls'.format(name))
+                total = runtime.read(ROBOT_TEMPLATE_NAME, 'Profile{0}TotalMs'.format(name))
+                maximum = runtime.read(ROBOT_TEMPLATE_NAME, 'Profile{0}MaxMs'.format(name))
+                histogram = runtime.read(ROBOT_TEMPLATE_NAME, 'Profile{0}Histogram'.format(name))
+                self.assertGreater(calls, 0, name)
+                counts = [int(count) for count in histogram.split(',')]
+                self.assertEqual(len(counts), len(bounds) + 1)
+                self.assertEqual(sum(counts), calls)
+                self.assertGreater(maximum, 0.0)
+                self.assertLessEqual(maximum, total)
+        finally:
+            runtime.stop()
+
+    def test_profiling_off_leaves_functions_unwrapped(self):
+        runtime = start_runtime()
+        robot_script = script_namespace(runtime, ROBOT_TEMPLATE_NAME)
+        try:
+            run_deliveries(duration=30.0, runtime=runtime)
+            for function_name in robot_script['PROFILED_FUNCTIONS']:
+                self.assertFalse(hasattr(robot_script[function_name], 'profiled_function'))
+            self.assertEqual(robot_script['profile_stats'], {})
+            self.assertIsNone(runtime.read(ROBOT_TEMPLATE_NAME, 'ProfileTickCalls'))
+        finally:
+            runtime.stop()
+
+
+class SpaceTimePlanningTest(unittest.TestCase):
+
+    def setUp(self):
+        # Pathway Area, #2, #3 and #4 form a row; #4 is only reachable through #3
+        self.scene = BenchmarkScene(8, 1, 0.0)
+        self.script = self.scene.robot_script
+        self.start = self.scene.pathways_by_name['Pathway Area']
+        self.goal = self.scene.pathways_by_name['Pathway Area #4']
+        self.scene.park_robot(1, self.start)
+        self.now = self.scene.runtime.sim_time
+        self.assertTrue(self.script['reserve_interval']('Pathway Area #3', 99, self.now, self.now + 40.0))
+
+    def tearDown(self):
+        self.scene.close()
+
+    def plan(self):
+        return self.script['find_shortest_path_with_reservations'](self.start, self.goal, self.scene.pathways, 1)
+
+    def test_legacy_planning_finds_no_route_through_a_held_pathway(self):
+        self.assertIsNone(self.plan())
+
+    def test_space_time_planning_waits_for_a_held_pathway(self):
+        script = self.script
+        script['SPACE_TIME_PLANNING'] = True
+        path = self.plan()
+        self.assertEqual([p['Name'] for p in path],
+                         ['Pathway Area', 'Pathway Area #2', 'Pathway Area #3', 'Pathway Area #4'])
+        timed = script['planned_entry_times'][1]
+        margin = script['RESERVATION_MARGIN']
+        entry, exit_time, hold_until = timed['Pathway Area #3']
+        self.assertGreaterEqual(entry - margin, self.now + 40.0)
+        self.assertEqual(hold_until, entry)
+        self.assertEqual(script['planner_stats']['planned_waits'], 1)
+        # The robot waits in #2 until it may enter #3, and stays on the goal for GOAL_HOLD_TIME
+        self.assertEqual(timed['Pathway Area #2'][1], entry)
+        self.assertEqual(timed['Pathway Area #2'][2], 0.0)
+        self.assertEqual(exit_time, timed['Pathway Area #4'][0])
+        self.assertAlmostEqual(timed['Pathway Area #4'][1], timed['Pathway Area #4'][0] + script['GOAL_HOLD_TIME'])
+        # The plan can be reserved next to the interval it waited for
+        self.assertTrue(self.scene.reserve(1, path, timed))
+        intervals = script['pathway_reservations']['Pathway Area #3']
+        self.assertEqual(sorted(robot_index for start, end, robot_index in intervals), [1, 99])
+        held, reserved = sorted(intervals, key=lambda interval: interval[0])
+        self.assertEqual(held[2], 99)
+        self.assertLessEqual(held[1], reserved[0])
+
+
+class SharedRuntimeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.runtime = start_runtime()
+        self.shared = script_namespace(self.runtime, PATHWAY_TEMPLATE_NAME)
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def count_parses(self):
+        parse_payload = self.shared['parse_payload']
+        parsed = []
+
+        def counting_parse_payload(text):
+            parsed.append(text)
+            return parse_payload(text)
+
+        self.shared['parse_payload'] = counting_parse_payload
+        return parsed
+
+    def test_decode_payload_parses_each_content_once(self):
+        decode_payload = self.shared['decode_payload']
+        parsed = self.count_parses()
+        text = '[{"Name": "Decoded", "X": 1.0,},]'
+        first = decode_payload(text)
+        self.assertEqual(first, [{'Name': 'Decoded', 'X': 1.0}])
+        first[0]['X'] = 2.0
+        first.append({})
+        self.assertEqual(decode_payload(text), [{'Name': 'Decoded', 'X': 1.0}])
+        self.assertEqual(parsed, [text])
+        self.assertIsNone(decode_payload(''))
+        self.assertIsNone(decode_payload('[{"Name": '))
+
+    def test_decode_payload_evicts_least_recently_used(self):
+        decode_payload = self.shared['decode_payload']
+        self.shared['PAYLOAD_CACHE_SIZE'] = 2
+        parsed = self.count_parses()
+        payloads = ['[{"Name": "Payload %s"}]' % key for key in 'abc']
+        for text in (payloads[0], payloads[1], payloads[0], payloads[2]):
+            decode_payload(text)
+        self.assertEqual(parsed, [payloads[0], payloads[1], payloads[2]])
+        decode_payload(payloads[0])
+        decode_payload(payloads[1])
+        self.assertEqual(parsed, [payloads[0], payloads[1], payloads[2], payloads[1]])
+
+    def test_product_pool_reuses_registered_products_once_ready(self):
+        shared = self.shared
+        shared['clear_product_pool']()
+        products = []
+        for number in range(1, 5):
+            product = self.runtime.find(PRODUCT_TEMPLATE_NAME).clone()
+            product.Name = 'Pooled_{0}'.format(number)
+            products.append(product)
+        for product in products[:3]:
+            shared['register_component'](product, 'product')
+        for ready_time, product in zip((5.0, 10.0, 15.0, 20.0), products):
+            shared['retire_product'](product, ready_time)
+        # Only registered products enter the pool
+        self.assertEqual(len(shared['shared'].product_pool), 3)
+
+        self.assertIsNone(shared['take_retired_product'](4.0))
+        self.assertIs(shared['take_retired_product'](5.0), products[0])
+        # A product removed from the scene since it was delivered is skipped
+        shared['unregister_component'](products[1].Name)
+        self.assertIsNone(shared['take_retired_product'](12.0))
+        self.assertEqual(shared['evict_retired_products'](1), [])
+        self.assertEqual(shared['evict_retired_products'](0), [products[2]])
+        self.assertIsNone(shared['take_retired_product'](100.0))
+
+
+class LayoutUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.runtime = start_runtime()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def write_layout(self, layout):
+        self.runtime.write(PATHWAY_TEMPLATE_NAME, 'pathwayProperties', json.dumps(layout))
+        return self.runtime.read(PATHWAY_TEMPLATE_NAME, 'LayoutVersion')
+
+    def test_pathway_updates_diff_by_name(self):
+        runtime = self.runtime
+        layout = generate_layout(8)
+        version = self.write_layout(layout)
+        clones = dict((p['Name'], runtime.find(p['Name'])) for p in layout)
+
+        # Identical content changes nothing
+        self.assertEqual(self.write_layout(layout), version)
+
+        layout[1]['X'] += 500.0
+        layout[2]['AreaLength'] = 3000
+        removed = layout.pop(3)
+        self.assertEqual(self.write_layout(layout), version + 1)
+        self.assertIsNone(runtime.find(removed['Name']))
+        for props in layout:
+            clone = runtime.find(props['Name'])
+            self.assertIs(clone, clones[props['Name']])
+            self.assertAlmostEqual(clone.PositionMatrix.P.X, props['X'])
+            self.assertAlmostEqual(clone.PositionMatrix.P.Y, props['Y'])
+            self.assertEqual(clone.AreaLength, props['AreaLength'])
+            self.assertEqual(clone.AreaWidth, props['AreaWidth'])
+
+    def test_input_conveyor_updates_keep_unchanged_conveyors(self):
+        runtime = self.runtime
+        runtime.run(duration=0.05)
+        runtime.load_layout(LAYOUT_DIRECTORY, ROBOT_QUANTITY)
+        runtime.run(duration=170.0)
+        conveyors = dict((name, runtime.find(name)) for name in INPUT_CONVEYORS)
+        clone_counts = dict((name, runtime.read(name, 'CloneCount')) for name in INPUT_CONVEYORS)
+        self.assertGreater(clone_counts[INPUT_CONVEYORS[0]], 0)
+
+        with open(os.path.join(LAYOUT_DIRECTORY, 'inputconveyorProperties.json')) as handle:
+            layout = json.load(handle)
+        layout[1]['ProductionInterval'] = '80'
+        runtime.write(INPUT_TEMPLATE_NAME, 'inputconveyorProperties', json.dumps(layout))
+        for name in INPUT_CONVEYORS:
+            self.assertIs(runtime.find(name), conveyors[name])
+            self.assertEqual(runtime.read(name, 'CloneCount'), clone_counts[name])
+        self.assertEqual(runtime.read(INPUT_CONVEYORS[0], 'CloneTimeInterval'), 160.0)
+        self.assertEqual(runtime.read(INPUT_CONVEYORS[1], 'CloneTimeInterval'), 80.0)
+
+
+if __name__ == '__main__':
+    unittest.main()